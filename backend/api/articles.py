@@ -2,12 +2,23 @@
 文章管理 API
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from typing import Optional
+from urllib.parse import quote
+import os
 from core.storage import Storage
+from core.job_queue import job_queue
+from core.job_state import job_states
+from core.rate_limit import admission
+from core.tracing import expand_trace, to_otlp
+from core.renderer import FORMATS, COMPRESSORS, COMPRESS_MIN_BYTES, content_hash, render, render_encoded
 
 router = APIRouter()
 
+# 下载分块大小（字节）
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(64 * 1024)))
+
 # 全局存储实例
 storage = Storage()
 
@@ -16,29 +27,38 @@ storage = Storage()
 async def get_articles_list(
     page: int = 1,
     limit: int = 20,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
     """
     获取文章列表
 
-    - **page**: 页码
-    - **limit**: 每页数量
+    - **page**: 页码（兼容旧接口，优先使用 cursor）
+    - **limit**: 每页数量（最多 100）
     - **status**: 状态筛选（可选）
+    - **cursor**: 上一页返回的 next_cursor
     """
     try:
-        articles = await storage.list_articles(
-            page=page,
+        limit = max(1, min(limit, 100))
+
+        result = await storage.list_articles(
             limit=limit,
-            status=status
+            status=status,
+            cursor=cursor,
+            page=page
         )
+        total = await storage.count_articles(status=status)
 
         return {
-            "articles": articles,
+            "articles": result["articles"],
             "page": page,
             "limit": limit,
-            "total": len(articles)
+            "total": total,
+            "next_cursor": result["next_cursor"]
         }
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -64,16 +84,108 @@ async def get_article_detail(article_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/articles/{article_id}/trace")
+async def get_article_trace(article_id: str, format: str = "timeline"):
+    """
+    获取最近一次生成的链路追踪
+
+    - **article_id**: 文章 ID
+    - **format**: timeline（span 列表）/ otlp（OTLP/JSON）
+    """
+    try:
+        if format not in ("timeline", "otlp"):
+            raise HTTPException(status_code=400, detail=f"不支持的格式: {format}")
+
+        metadata = await storage.get_metadata(article_id)
+
+        if metadata is None:
+            raise HTTPException(status_code=404, detail="文章不存在")
+        if not metadata.get("trace"):
+            raise HTTPException(status_code=404, detail="暂无追踪记录（生成尚未结束）")
+
+        if format == "otlp":
+            return to_otlp(metadata["trace"])
+        return {"article_id": article_id, **expand_trace(metadata["trace"])}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/articles/{article_id}/retry")
+async def retry_article(article_id: str):
+    """
+    重试失败的文章
+
+    已完成阶段的检查点会保留，重试从最后完成的阶段继续
+
+    - **article_id**: 文章 ID
+    """
+    try:
+        article = await storage.get_status(article_id)
+
+        if not article:
+            raise HTTPException(status_code=404, detail="文章不存在")
+
+        if article["status"] != "failed":
+            raise HTTPException(status_code=409, detail="只有生成失败的文章可以重试")
+
+        counts = await job_queue.counts()
+        retry_after = admission.check_capacity(counts["queued"] + counts["running"])
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="生成任务繁忙，请稍后再试",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+        # 重置文章和重新排队在同一事务中，排队失败时文章保持 failed
+        # 已有任务记录时沿用原参数（formats、use_cache 等），以下默认值只用于旧文章
+        requeued = await job_queue.requeue(article_id, {
+            "topic": article["topic"],
+            "tier": article["tier"],
+            "formats": ["markdown", "pdf"],
+            "use_cache": True
+        })
+        if requeued is None:
+            raise HTTPException(status_code=409, detail="只有生成失败的文章可以重试")
+        if not requeued:
+            raise HTTPException(status_code=409, detail="任务仍在收尾，请稍后再试")
+
+        state = await storage.get_status(article_id)
+        if state:
+            job_states.track(state)
+
+        return {
+            "article_id": article_id,
+            "message": "已重新排队，将从最后完成的阶段继续"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/articles/{article_id}/download/{format}")
-async def download_article(article_id: str, format: str):
+async def download_article(
+    article_id: str,
+    format: str,
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+):
     """
     下载文章
 
+    返回文件本身（而不是 JSON 包装），支持 gzip/br 压缩和 ETag 协商缓存
+
     - **article_id**: 文章 ID
     - **format**: 格式 (pdf, markdown, html, xiaohongshu)
     """
     try:
-        article = await storage.get_article(article_id)
+        # 只读状态、主题和内容哈希，协商缓存命中时不读取、不解码内容
+        article = await storage.get_download_info(article_id)
 
         if not article:
             raise HTTPException(status_code=404, detail="文章不存在")
@@ -81,36 +193,111 @@ async def download_article(article_id: str, format: str):
         if article["status"] != "completed":
             raise HTTPException(status_code=400, detail="文章尚未生成完成")
 
-        content = article.get("content", {})
-
-        if format == "markdown":
-            return {
-                "filename": f'{article["topic"]}.md',
-                "content": content.get("markdown", ""),
-                "content_type": "text/markdown"
-            }
-        elif format == "pdf":
-            return {
-                "filename": f'{article["topic"]}.pdf',
-                "url": content.get("pdf_url", ""),
-                "content_type": "application/pdf"
-            }
-        elif format == "html":
-            return {
-                "filename": f'{article["topic"]}.html',
-                "content": content.get("html", ""),
-                "content_type": "text/html"
-            }
-        elif format == "xiaohongshu":
-            return {
-                "filename": f'{article["topic"]}_xiaohongshu.txt',
-                "content": content.get("xiaohongshu", ""),
-                "content_type": "text/plain"
-            }
-        else:
+        if format not in FORMATS:
             raise HTTPException(status_code=400, detail="不支持的格式")
 
+        suffix, content_type = FORMATS[format]
+        filename = f'{article["topic"]}{suffix}'
+
+        content = None
+        digest = article["content_hash"]
+        if digest is None:
+            # 内容哈希还没有回填的旧文章
+            content = await storage.get_content(article_id) or {}
+            digest = content_hash(content)
+
+        headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+        # PDF 本身已压缩不再压缩；文本格式太小时不压缩，客户端可能持有任一表示的 ETag
+        encoding = "identity" if format == "pdf" else _negotiate_encoding(accept_encoding)
+        for candidate in dict.fromkeys((encoding, "identity")):
+            etag = _etag(digest, format, candidate)
+            if _etag_matches(if_none_match, etag):
+                headers["ETag"] = etag
+                return Response(status_code=304, headers=headers)
+
+        if content is None:
+            content = await storage.get_content(article_id) or {}
+
+        if format == "pdf":
+            # 直接从磁盘缓存发送
+            headers["ETag"] = _etag(digest, format, "identity")
+            path = await render(article_id, format, content)
+            return FileResponse(path, media_type=content_type, filename=filename, headers=headers)
+
+        # 首次下载时渲染，之后命中缓存；太小的内容不值得压缩
+        body = await render_encoded(article_id, format, content)
+        if len(body) < COMPRESS_MIN_BYTES:
+            encoding = "identity"
+        headers["ETag"] = _etag(digest, format, encoding)
+
+        if encoding != "identity":
+            body = await render_encoded(article_id, format, content, encoding)
+            headers["Content-Encoding"] = encoding
+
+        headers["Content-Length"] = str(len(body))
+        headers["Content-Disposition"] = _content_disposition(filename)
+        return StreamingResponse(
+            _iter_chunks(body),
+            media_type=content_type,
+            headers=headers
+        )
+
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _negotiate_encoding(accept_encoding: Optional[str]) -> str:
+    """按 Accept-Encoding 选择压缩方式（优先 br，其次 gzip）"""
+    if not accept_encoding:
+        return "identity"
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token.strip().lower()] = q
+
+    for encoding in COMPRESSORS:
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def _etag(digest: str, fmt: str, encoding: str) -> str:
+    """强 ETag：内容哈希 + 格式 + 压缩方式（不同压缩是不同的表示）"""
+    if encoding == "identity":
+        return f'"{digest[:32]}-{fmt}"'
+    return f'"{digest[:32]}-{fmt}-{encoding}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 弱比较"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def _content_disposition(filename: str) -> str:
+    """附件文件名，非 ASCII 按 RFC 5987 编码"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+async def _iter_chunks(body: bytes):
+    """分块发送响应体"""
+    for start in range(0, len(body), DOWNLOAD_CHUNK_SIZE):
+        yield body[start:start + DOWNLOAD_CHUNK_SIZE]
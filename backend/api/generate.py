@@ -2,17 +2,40 @@
 文章生成 API
 """
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request, Header
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
+import os
+import time
 import uuid
 from datetime import datetime
 
-from core.aiwriter import AIWriter
-from core.storage import Storage
+from core.aiwriter import get_ai_writer
+from core.storage import Storage, LeaseLostError
+from core.events import event_bus
+from core.job_queue import job_queue
+from core.pipeline import Pipeline, Stage
+from core.job_state import job_states
+from core.rate_limit import admission, client_ip, client_fingerprint, rate_limit_key
+from core.dedup import request_dedup, request_hash, idempotency_key, flight_key, SINGLE_FLIGHT_ENABLED
+from core.http_client import is_transient
+from core.tracing import start_trace, span, current_span, export_trace
 
 router = APIRouter()
 
+# 配图是否与写作并行（基于主题和调研摘要投机生成）
+SPECULATIVE_IMAGES = os.getenv("SPECULATIVE_IMAGES", "true").lower() == "true"
+
+# 阶段遇到临时错误（超时、连接错误、429/5xx）时的重试次数和首次退避秒数
+STAGE_RETRIES = int(os.getenv("STAGE_RETRIES", "2"))
+STAGE_RETRY_BACKOFF = float(os.getenv("STAGE_RETRY_BACKOFF", "2.0"))
+
+# 写作中部分内容推送给订阅者的最小间隔（秒），前端生成页实时显示
+PARTIAL_EVENT_INTERVAL = float(os.getenv("PARTIAL_EVENT_INTERVAL", "2.0"))
+
+# 完成后保存检查点的阶段（integrate 的结果随 complete 一起提交）
+CHECKPOINT_STAGES = {"research", "write", "images"}
+
 # 全局存储实例
 storage = Storage()
 
@@ -22,6 +45,7 @@ class GenerateRequest(BaseModel):
     topic: str
     tier: str = "B"
     formats: List[str] = ["markdown", "pdf"]
+    no_cache: bool = False  # 跳过生成缓存，强制重新生成
 
 
 class GenerateResponse(BaseModel):
@@ -33,7 +57,8 @@ class GenerateResponse(BaseModel):
 @router.post("/generate", response_model=GenerateResponse)
 async def generate_article(
     request: GenerateRequest,
-    background_tasks: BackgroundTasks
+    http_request: Request,
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     创建文章生成任务
@@ -41,6 +66,9 @@ async def generate_article(
     - **topic**: 文章主题
     - **tier**: 字数档位 (A/B/C/D)
     - **formats**: 输出格式列表
+
+    带 Idempotency-Key 的重复请求返回原任务；相同主题/档位/格式正在生成时合并到该任务。
+    超过全局在途上限或客户端限流时返回 429（带 Retry-After）
     """
     try:
         # 生成文章 ID
@@ -54,6 +82,41 @@ async def generate_article(
         if not all(f in valid_formats for f in request.formats):
             raise HTTPException(status_code=400, detail="Invalid format")
 
+        digest = request_hash(request.topic, request.tier, request.formats)
+        idem_key = idempotency_key(idempotency_key_header) if idempotency_key_header else None
+        flight = flight_key(digest) if SINGLE_FLIGHT_ENABLED else None
+
+        # 幂等重放：直接返回原任务
+        if idem_key:
+            existing = await request_dedup.lookup(idem_key)
+            if existing:
+                return _replay(existing, digest)
+
+        # 单飞：相同请求正在生成时合并到已有任务（不占用准入额度）
+        if flight:
+            existing = await request_dedup.lookup(flight)
+            if existing:
+                return await _attach(existing[0], idem_key, digest)
+
+        # 准入控制：先看全局容量（不消耗客户端令牌），再按客户端限流
+        ip_address = client_ip(http_request)
+        counts = await job_queue.counts()
+        retry_after = admission.check_capacity(counts["queued"] + counts["running"])
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="生成任务繁忙，请稍后再试",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+        retry_after = await admission.check_client(rate_limit_key(http_request))
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="请求过于频繁，请稍后再试",
+                headers={"Retry-After": str(retry_after)}
+            )
+
         # 创建文章记录
         article_data = {
             "id": article_id,
@@ -64,112 +127,257 @@ async def generate_article(
             "progress": 0,
             "created_at": datetime.now().isoformat(),
             "completed_at": None,
-            "error": None
+            "error": None,
+            "ip_address": ip_address,
+            "user_fingerprint": client_fingerprint(http_request)
         }
 
-        await storage.create_article(article_id, article_data)
-
-        # 添加后台任务
-        background_tasks.add_task(
-            process_article_generation,
-            article_id,
-            request.topic,
-            request.tier,
-            request.formats
-        )
+        initial_state = await storage.create_article(article_id, article_data)
+
+        # 占用去重键；并发的相同请求只有一个能占用成功，其余删除自己的记录并合并过去
+        if flight:
+            owner, _ = await request_dedup.claim(flight, article_id, digest)
+            if owner != article_id:
+                await storage.delete_article(article_id)
+                return await _attach(owner, idem_key, digest)
+        if idem_key:
+            owner, owner_hash = await request_dedup.claim(idem_key, article_id, digest)
+            if owner != article_id:
+                await storage.delete_article(article_id)
+                if flight:
+                    await request_dedup.release(flight, article_id)
+                return _replay((owner, owner_hash), digest)
+
+        job_states.track(initial_state)
+
+        # 加入持久化任务队列，由 worker 池执行
+        try:
+            await job_queue.enqueue(article_id, {
+                "topic": request.topic,
+                "tier": request.tier,
+                "formats": request.formats,
+                "use_cache": not request.no_cache
+            })
+        except Exception as e:
+            # 标记失败，让单飞键失效，后续相同请求可以重新创建
+            # （任务没有进入队列，不存在租约，直接更新即可）
+            await storage.update_status(article_id, status="failed", error=str(e))
+            job_states.update(article_id, status="failed", error=str(e))
+            raise
 
         return GenerateResponse(
             article_id=article_id,
             message="文章生成任务已创建"
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def process_article_generation(
-    article_id: str,
-    topic: str,
-    tier: str,
-    formats: list
-):
-    """
-    后台处理文章生成
-    """
-    try:
-        # 更新状态：开始调研
-        await storage.update_status(
-            article_id,
-            status="researching",
-            progress=10
-        )
-
-        # 初始化 AI Writer
-        ai_writer = AIWriter()
-
-        # 执行调研
-        research_result = await ai_writer.research(topic)
+def _replay(existing: tuple, digest: str) -> GenerateResponse:
+    """幂等重放：返回幂等键对应的原任务"""
+    article_id, original_hash = existing
+    if original_hash and original_hash != digest:
+        raise HTTPException(status_code=422, detail="Idempotency-Key 已用于不同的请求")
+    return GenerateResponse(article_id=article_id, message="文章生成任务已创建")
 
-        # 更新状态：调研完成，开始写作
-        await storage.update_status(
-            article_id,
-            status="writing",
-            progress=40
-        )
 
-        # 生成文章内容
-        content_result = await ai_writer.write(
-            topic=topic,
-            tier=tier,
-            research_data=research_result
-        )
+async def _attach(owner: str, idem_key: Optional[str], digest: str) -> GenerateResponse:
+    """合并到已有的在途任务（带幂等键时同时登记，重放返回同一任务）"""
+    if idem_key:
+        return _replay(await request_dedup.claim(idem_key, owner, digest), digest)
+    print(f"🔗 Attached duplicate request to article {owner}")
+    return GenerateResponse(article_id=owner, message="相同文章正在生成，已合并到现有任务")
 
-        # 更新状态：写作完成，生成配图
-        await storage.update_status(
-            article_id,
-            status="generating_images",
-            progress=70
-        )
 
-        # 生成配图
-        images_result = await ai_writer.generate_images(
-            topic=topic,
-            content=content_result
-        )
+async def announce_status(article_id: str, **fields):
+    """更新内存状态表并推送给订阅者（数据库由任务工作单元负责）"""
+    job_states.update(article_id, **fields)
+    await event_bus.publish(article_id, {"id": article_id, **fields})
 
-        # 更新状态：整合内容
-        await storage.update_status(
-            article_id,
-            status="integrating",
-            progress=90
-        )
 
-        # 整合内容并生成最终文件
-        final_content = await ai_writer.integrate(
-            content=content_result,
-            images=images_result,
-            formats=formats
-        )
+async def announce_partial(article_id: str, title: str, markdown: str):
+    """推送写作中的部分内容（只走事件，写库由工作单元按 PARTIAL_SAVE_INTERVAL 节流）"""
+    await event_bus.publish(article_id, {
+        "id": article_id,
+        "content": {"title": title, "markdown": markdown, "partial": True}
+    })
 
-        # 保存文章内容
-        await storage.save_content(article_id, final_content)
 
-        # 更新状态：完成
-        await storage.update_status(
-            article_id,
-            status="completed",
-            progress=100,
-            completed_at=datetime.now().isoformat()
-        )
+def _trace_metadata(trace) -> Optional[Dict[str, Any]]:
+    """随最终写入保存的 trace（此时根 span 还没结束，按当前时刻截止）"""
+    if trace is None:
+        return None
+    return {"trace": trace.to_compact(closing=True)}
 
-        print(f"✅ Article {article_id} generation completed")
 
-    except Exception as e:
-        print(f"❌ Article {article_id} generation failed: {str(e)}")
+async def process_article_generation(
+    article_id: str,
+    topic: str,
+    tier: str,
+    formats: list,
+    use_cache: bool = True,
+    lease_owner: Optional[str] = None
+):
+    """
+    后台处理文章生成
 
-        # 更新状态：失败
-        await storage.update_status(
-            article_id,
-            status="failed",
-            error=str(e)
-        )
+    阶段依赖：research -> write -> integrate，images 只依赖 research，
+    （SPECULATIVE_IMAGES 开启时）在写作流式进行的同时生成配图。
+    整个任务使用一个工作单元：进度更新合并写入，内容与完成状态原子提交。
+    每个阶段完成后立即保存检查点，重试（手动或租约过期后重新排队）时跳过已完成的阶段。
+    失败时先写入失败状态和 trace，再抛出异常，由 worker 池把任务行标记为 failed。
+    """
+    failure: Optional[Exception] = None
+    try:
+        async with storage.job(article_id, lease_owner=lease_owner) as job:
+            with start_trace("generate_article", article_id=article_id, tier=tier, use_cache=use_cache) as trace:
+                try:
+                    # 本进程执行该任务，之后的状态更新都经过这里，查询可以直接走内存
+                    state = await storage.get_status(article_id)
+                    if state:
+                        job_states.track(state, owned=True)
+
+                    # 进程内共享的 AI Writer（路由统计和客户端跨任务复用）
+                    ai_writer = get_ai_writer()
+
+                    # 之前执行中断或失败时留下的检查点
+                    with span("db.load_checkpoints"):
+                        completed = await job.load_checkpoints()
+                    if completed:
+                        current_span().set_attribute("resumed", ",".join(sorted(completed)))
+                        print(f"⏩ Resuming article {article_id} after stages: {', '.join(sorted(completed))}")
+
+                    async def on_stage_done(name: str, result: Any):
+                        if name not in CHECKPOINT_STAGES:
+                            return
+                        try:
+                            with span(f"db.checkpoint.{name}"):
+                                await job.checkpoint(name, result)
+                        except LeaseLostError:
+                            raise
+                        except Exception as e:
+                            print(f"⚠️  Checkpoint {name} failed for article {article_id}: {e}")
+
+                    async def on_progress(status: str, progress: int, stages: Dict[str, str]):
+                        # 只记入工作单元，随下一次检查点/部分内容写入；实时状态走内存和事件
+                        await job.update_status(status=status, progress=progress)
+                        await announce_status(article_id, status=status, progress=progress, stages=stages)
+
+                    async def run_research(deps: Dict[str, Any]):
+                        return await ai_writer.research(topic)
+
+                    async def run_write(deps: Dict[str, Any]):
+                        # 流式写作：部分内容增量落库并推送，写作进度按已生成字数推进
+                        last_event = None
+
+                        async def on_partial(markdown: str, fraction: float):
+                            nonlocal last_event
+                            await pipeline.report("write", fraction)
+                            await job.save_partial(title=topic, markdown=markdown)
+                            now = time.monotonic()
+                            if last_event is None or now - last_event >= PARTIAL_EVENT_INTERVAL:
+                                last_event = now
+                                await announce_partial(article_id, topic, markdown)
+
+                        content_result = await ai_writer.write(
+                            topic=topic,
+                            tier=tier,
+                            research_data=deps["research"],
+                            on_partial=on_partial,
+                            use_cache=use_cache
+                        )
+
+                        # 记录生成缓存命中情况和实际使用的写作提供方
+                        job.update_metadata({
+                            "generation_cache": content_result.get("cache"),
+                            "provider": content_result.get("provider")
+                        })
+                        return content_result
+
+                    async def run_images(deps: Dict[str, Any]):
+                        if SPECULATIVE_IMAGES:
+                            # 投机执行：用主题和调研摘要作为配图上下文，不等正文
+                            context = {"markdown": ai_writer.image_context(topic, deps["research"])}
+                        else:
+                            context = deps["write"]
+                        return await ai_writer.generate_images(topic=topic, content=context, tier=tier)
+
+                    async def run_integrate(deps: Dict[str, Any]):
+                        return await ai_writer.integrate(
+                            content=deps["write"],
+                            images=deps["images"],
+                            formats=formats
+                        )
+
+                    pipeline = Pipeline(
+                        [
+                            Stage("research", run_research, weight=30, status="researching", retries=STAGE_RETRIES),
+                            Stage("write", run_write, deps=["research"], weight=30, status="writing", retries=STAGE_RETRIES),
+                            Stage(
+                                "images",
+                                run_images,
+                                deps=["research"] if SPECULATIVE_IMAGES else ["write"],
+                                weight=20,
+                                status="generating_images",
+                                retries=STAGE_RETRIES
+                            ),
+                            Stage("integrate", run_integrate, deps=["write", "images"], weight=10, status="integrating"),
+                        ],
+                        on_progress=on_progress,
+                        base_progress=10,
+                        completed=completed,
+                        on_stage_done=on_stage_done,
+                        is_transient=is_transient,
+                        retry_backoff=STAGE_RETRY_BACKOFF
+                    )
+
+                    results = await pipeline.run()
+
+                    # 保存内容并标记完成（同一事务）
+                    completed_at = datetime.utcnow()
+                    with span("db.complete"):
+                        await job.complete(
+                            results["integrate"],
+                            completed_at=completed_at,
+                            metadata=_trace_metadata(trace)
+                        )
+                    await announce_status(
+                        article_id,
+                        status="completed",
+                        progress=100,
+                        completed_at=completed_at.isoformat()
+                    )
+
+                    print(f"✅ Article {article_id} generation completed")
+
+                except Exception as e:
+                    print(f"❌ Article {article_id} generation failed: {str(e)}")
+                    current_span().record_error(e)
+                    failure = e
+                    if isinstance(e, LeaseLostError):
+                        # 任务已由其他 worker 接管，不再写入
+                        raise
+
+                    # 更新状态：失败
+                    await job.fail(str(e), metadata=_trace_metadata(trace))
+                    await announce_status(
+                        article_id,
+                        status="failed",
+                        error=str(e)
+                    )
+
+            # trace 已随最终写入保存，这里只导出结束后的完整版本
+            if trace is not None:
+                try:
+                    await export_trace(trace.to_compact())
+                except Exception as e:
+                    print(f"⚠️  Trace export failed for article {article_id}: {e}")
+    finally:
+        # 结束、失败或被取消后，状态查询不再依赖本进程的内存
+        job_states.disown(article_id)
+
+    if failure is not None:
+        raise failure
@@ -2,14 +2,106 @@
 状态查询 API
 """
 
-from fastapi import APIRouter, HTTPException
+import os
+import json
+import time
+import asyncio
+from typing import Dict, Any, Optional, AsyncIterator
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from core.storage import Storage
+from core.events import event_bus, TERMINAL_STATUSES
+from core.job_state import job_states
 
 router = APIRouter()
 
 # 全局存储实例
 storage = Storage()
 
+# SSE 心跳间隔（秒），防止代理断开空闲连接
+HEARTBEAT_INTERVAL = 15.0
+
+# 推送连接上没有事件时重新读取状态的间隔（秒）。
+# 事件总线在未启用 Redis 时只覆盖本进程，任务在其他进程执行时靠它推进和结束
+STATUS_RECHECK_INTERVAL = float(os.getenv("STATUS_RECHECK_INTERVAL", "5"))
+
+# 批量查询上限
+MAX_BATCH_IDS = 100
+
+
+async def _status_snapshot(article_id: str):
+    """读取当前状态快照：活跃任务走内存，否则只查状态列"""
+    state = job_states.get(article_id)
+    if state is not None:
+        return state
+
+    return await storage.get_status(article_id)
+
+
+def _changed(last: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    """状态或进度是否变化"""
+    return (current.get("status"), current.get("progress")) != (last.get("status"), last.get("progress"))
+
+
+async def _follow(
+    article_id: str,
+    queue: asyncio.Queue,
+    last: Dict[str, Any]
+) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    跟踪快照之后的状态变化，直到完成或失败
+
+    优先使用事件总线的事件；STATUS_RECHECK_INTERVAL 内没有事件时重新读取一次状态，
+    有变化就推送。文章被删除时结束。
+
+    Returns:
+        异步迭代器，产出状态事件；本轮没有变化时产出 None（SSE 用来发心跳）
+    """
+    while True:
+        try:
+            event = await asyncio.wait_for(queue.get(), timeout=STATUS_RECHECK_INTERVAL)
+        except asyncio.TimeoutError:
+            try:
+                event = await _status_snapshot(article_id)
+            except Exception as e:
+                print(f"⚠️  Status recheck failed for article {article_id}: {e}")
+                yield None
+                continue
+            if event is None:
+                return
+            if not _changed(last, event):
+                yield None
+                continue
+
+        last = {**last, **event}
+        yield event
+        if event.get("status") in TERMINAL_STATUSES:
+            return
+
+
+@router.get("/status")
+async def get_article_statuses(ids: str):
+    """
+    批量查询文章生成状态
+
+    - **ids**: 逗号分隔的文章 ID（最多 100 个），不存在的 ID 不会出现在结果中
+    """
+    article_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if len(article_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"最多查询 {MAX_BATCH_IDS} 个 ID")
+
+    try:
+        statuses = job_states.get_many(article_ids)
+        missing = [i for i in article_ids if i not in statuses]
+        statuses.update(await storage.get_statuses(missing))
+
+        return {
+            "statuses": [statuses[i] for i in article_ids if i in statuses]
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 
 @router.get("/status/{article_id}")
 async def get_article_status(article_id: str):
@@ -19,23 +111,95 @@ async def get_article_status(article_id: str):
     - **article_id**: 文章 ID
     """
     try:
-        article = await storage.get_article(article_id)
+        snapshot = await _status_snapshot(article_id)
 
-        if not article:
+        if not snapshot:
             raise HTTPException(status_code=404, detail="文章不存在")
 
-        return {
-            "id": article["id"],
-            "topic": article["topic"],
-            "tier": article["tier"],
-            "status": article["status"],
-            "progress": article["progress"],
-            "created_at": article["created_at"],
-            "completed_at": article.get("completed_at"),
-            "error": article.get("error")
-        }
+        return snapshot
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/status/{article_id}/events")
+async def stream_article_status(article_id: str):
+    """
+    通过 Server-Sent Events 推送文章生成状态
+
+    先发送一次当前状态快照，之后推送每次状态变化，直到完成或失败；
+    文章被删除时连接直接结束
+
+    - **article_id**: 文章 ID
+    """
+    # 先订阅再读快照，避免两者之间的事件丢失
+    queue = event_bus.add_subscriber(article_id)
+
+    try:
+        snapshot = await _status_snapshot(article_id)
+    except Exception as e:
+        event_bus.remove_subscriber(article_id, queue)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not snapshot:
+        event_bus.remove_subscriber(article_id, queue)
+        raise HTTPException(status_code=404, detail="文章不存在")
+
+    async def event_stream():
+        try:
+            yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+            if snapshot["status"] in TERMINAL_STATUSES:
+                return
+
+            last_sent = time.monotonic()
+            async for event in _follow(article_id, queue, snapshot):
+                if event is not None:
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            event_bus.remove_subscriber(article_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@router.websocket("/status/{article_id}/ws")
+async def websocket_article_status(websocket: WebSocket, article_id: str):
+    """
+    通过 WebSocket 推送文章生成状态
+
+    - **article_id**: 文章 ID
+    """
+    await websocket.accept()
+
+    try:
+        async with event_bus.subscribe(article_id) as queue:
+            snapshot = await _status_snapshot(article_id)
+            if not snapshot:
+                await websocket.close(code=4404, reason="文章不存在")
+                return
+
+            await websocket.send_json(snapshot)
+            if snapshot["status"] in TERMINAL_STATUSES:
+                await websocket.close()
+                return
+
+            async for event in _follow(article_id, queue, snapshot):
+                if event is not None:
+                    await websocket.send_json(event)
+
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        pass
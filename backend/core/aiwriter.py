@@ -5,54 +5,167 @@ AI Writer 核心逻辑
 
 import os
 import sys
-from typing import Dict, List, Any
-from anthropic import Anthropic
-import google.generativeai as genai
+import time
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Callable, Awaitable
 from dotenv import load_dotenv
 
+from .generation_cache import generation_cache, make_cache_key, GEN_CACHE_ENABLED
+from .research import build_default_engine
+from .provider_router import get_router
+from .tracing import span
+
 load_dotenv()
 
+# 配图配置
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", "60"))  # 单张图片超时（秒）
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "4"))  # 全局同时生成的图片数
+IMAGE_THREADS = int(os.getenv("IMAGE_THREADS", str(IMAGE_CONCURRENCY)))  # 同步客户端线程池大小
+
+# 各档位配图数量，格式 A:2,B:3,C:3,D:4
+IMAGE_COUNTS = {
+    tier: int(count)
+    for tier, count in (
+        item.split(":") for item in os.getenv("IMAGE_COUNTS", "A:2,B:3,C:3,D:4").split(",")
+    )
+}
+
+# 启动后在后台预加载图片 SDK（google.generativeai 导入约需 0.7s），首个任务不用等
+WARM_SDKS = os.getenv("WARM_SDKS", "true").lower() == "true"
+
+# 所有任务共享：限制图片并发，线程池只用于同步客户端
+_image_semaphore = asyncio.Semaphore(IMAGE_CONCURRENCY)
+_image_executor = ThreadPoolExecutor(max_workers=IMAGE_THREADS, thread_name_prefix="image")
+
+# 占位图颜色
+PLACEHOLDER_COLORS = ["00f5ff", "b000ff", "ff00aa"]
+
+
+def _placeholder_image(index: int, label: str = "KAFKA+Style") -> str:
+    """占位图 URL"""
+    color = PLACEHOLDER_COLORS[index % len(PLACEHOLDER_COLORS)]
+    return f"https://via.placeholder.com/1280x720/0a0a0f/{color}?text={label}+{index + 1}"
+
+
+async def _start_image_thread(func: Callable[[], Any], wait_timeout: float) -> "asyncio.Future":
+    """
+    占用图片信号量并在线程池中执行同步调用，线程开始执行后返回
+
+    线程无法被取消，信号量在线程结束时才释放（超时后的线程仍计入并发）；
+    调用方从返回时开始计调用超时，排队（等信号量和空闲线程）单独受 wait_timeout 限制，
+    卡住的调用占满所有名额时，后续图片按时放弃而不是一直等待
+
+    Args:
+        func: 同步调用
+        wait_timeout: 最多排队的秒数，超过抛出 asyncio.TimeoutError
+
+    Returns:
+        线程结果的 asyncio Future
+    """
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+
+    def run():
+        loop.call_soon_threadsafe(started.set)
+        return func()
+
+    def release(_):
+        try:
+            loop.call_soon_threadsafe(_image_semaphore.release)
+        except RuntimeError:
+            # 事件循环已关闭（进程退出中）
+            pass
+
+    async with asyncio.timeout(wait_timeout):
+        await _image_semaphore.acquire()
+        try:
+            future = _image_executor.submit(run)
+        except BaseException:
+            _image_semaphore.release()
+            raise
+        future.add_done_callback(release)
+
+        try:
+            await started.wait()
+        except asyncio.CancelledError:
+            # 还没开始执行时取消成功，名额由回调释放
+            future.cancel()
+            raise
+    return asyncio.wrap_future(future)
+
+
 # 添加现有 ai-writer 项目路径
 AIWRITER_PATH = os.path.join(os.path.dirname(__file__), "../../../ai-writer")
 sys.path.insert(0, AIWRITER_PATH)
 
-# 尝试导入 ai-writer 模块
-try:
-    from src.gemini_client import GeminiClient
-    GEMINI_AVAILABLE = True
-except ImportError as e:
-    print(f"⚠️  Warning: Could not import gemini_client: {e}")
-    GEMINI_AVAILABLE = False
+
+def _load_image_generator() -> Optional[Any]:
+    """
+    导入 ai-writer 的 GeminiClient 并初始化（较慢，在线程池中执行）
+
+    Returns:
+        图片生成客户端，不可用时返回 None（使用占位图）
+    """
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_api_key:
+        print("⚠️  GEMINI_API_KEY 未设置，图片生成功能将使用占位图")
+        return None
+
+    try:
+        import google.generativeai as genai
+        from src.gemini_client import GeminiClient
+    except ImportError as e:
+        print(f"⚠️  Gemini 模块未导入，图片生成功能将使用占位图: {e}")
+        return None
+
+    try:
+        genai.configure(api_key=gemini_api_key)
+        client = GeminiClient()
+        print("✅ Gemini 图片生成已启用")
+        return client
+    except Exception as e:
+        print(f"⚠️  Gemini 初始化失败: {e}")
+        return None
 
 
 class AIWriter:
-    """AI 写作系统"""
+    """
+    AI 写作系统
+
+    进程内共享一个实例（见 get_ai_writer）：写作路由、调研引擎跨任务复用，
+    图片 SDK 在首次配图或后台预热时才导入
+    """
 
     def __init__(self):
         """初始化"""
-        # 使用 GPT5 生成文章（最新最强大）
-        from .gpt5_writer import GPT5Writer
-        self.writer = GPT5Writer()
+        # 写作模型路由（默认 GPT5 优先，Gemini 备用）
+        self.writer = get_router()
 
-        # Gemini API（用于图片生成）- 可选功能
+        # 多源调研引擎
+        self.research_engine = build_default_engine()
+
+        # Gemini API（用于图片生成）- 可选功能，延迟加载
         self.image_generator = None
-        if GEMINI_AVAILABLE:
-            gemini_api_key = os.getenv("GEMINI_API_KEY")
-            if gemini_api_key:
-                try:
-                    genai.configure(api_key=gemini_api_key)
-                    self.image_generator = GeminiClient()
-                    print("✅ Gemini 图片生成已启用")
-                except Exception as e:
-                    print(f"⚠️  Gemini 初始化失败: {e}")
-            else:
-                print("⚠️  GEMINI_API_KEY 未设置，图片生成功能将使用占位图")
-        else:
-            print("⚠️  Gemini 模块未导入，图片生成功能将使用占位图")
+        self._image_loaded = False
+        self._image_lock = asyncio.Lock()
+
+    async def load_image_generator(self) -> Optional[Any]:
+        """首次调用时在线程池中加载图片生成客户端，之后直接复用"""
+        if not self._image_loaded:
+            async with self._image_lock:
+                if not self._image_loaded:
+                    loop = asyncio.get_running_loop()
+                    self.image_generator = await loop.run_in_executor(_image_executor, _load_image_generator)
+                    self._image_loaded = True
+        return self.image_generator
 
     async def research(self, topic: str) -> Dict[str, Any]:
         """
-        执行调研（简化版）
+        执行多源调研
+
+        各来源并发执行、各自限时，慢来源不会拖住流水线
 
         Args:
             topic: 文章主题
@@ -60,94 +173,193 @@ class AIWriter:
         Returns:
             调研结果
         """
-        # 简化版：直接返回基础调研信息
-        # 生产环境可以接入真实的搜索 API
         print(f"📚 调研主题: {topic}")
-
-        return {
-            "topic": topic,
-            "web_results": [
-                {"title": f"关于 {topic} 的研究", "url": "https://example.com", "snippet": "相关内容..."}
-            ],
-            "wechat_results": [],
-            "xiaohongshu_results": [],
-            "academic_results": []
-        }
+        with span("aiwriter.research") as research_span:
+            result = await self.research_engine.research(topic)
+            # 各来源状态和耗时，便于找出拖慢调研的来源
+            for source, info in result.get("sources", {}).items():
+                research_span.set_attribute(f"source.{source}", f"{info.get('status')} {info.get('elapsed')}s")
+            return result
 
     async def write(
         self,
         topic: str,
         tier: str,
-        research_data: Dict[str, Any]
+        research_data: Dict[str, Any],
+        on_partial: Optional[Callable[[str, float], Awaitable[None]]] = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         生成文章内容（使用 GPT5）
 
+        先按 (提示词, 模型, temperature, max_tokens) 查生成缓存，未命中才调用模型
+
         Args:
             topic: 文章主题
             tier: 字数档位
             research_data: 调研数据
+            on_partial: 流式生成时的部分内容回调 (markdown, 完成比例)
+            use_cache: 是否使用生成缓存（False 时跳过读取，仍会写入）
 
         Returns:
-            文章内容
+            文章内容（cache 字段记录缓存命中情况）
         """
-        print(f"✍️  GPT5 生成文章: {topic} ({tier}档)")
-        return await self.writer.generate_article(topic, tier, research_data)
+        with span("aiwriter.write", tier=tier) as write_span:
+            result = await self._write(topic, tier, research_data, on_partial, use_cache)
+            write_span.set_attributes(
+                cache_hit=result["cache"]["hit"],
+                provider=result.get("provider") or "",
+                words=result.get("word_count", 0)
+            )
+            return result
+
+    async def _write(
+        self,
+        topic: str,
+        tier: str,
+        research_data: Dict[str, Any],
+        on_partial: Optional[Callable[[str, float], Awaitable[None]]],
+        use_cache: bool
+    ) -> Dict[str, Any]:
+        """查缓存 -> 调用写作路由 -> 写缓存（只缓存首选提供方的结果）"""
+        cache_key = None
+        if GEN_CACHE_ENABLED:
+            prompt = self.writer.build_prompt(topic, tier, research_data)
+            cache_key = make_cache_key(
+                prompt,
+                self.writer.model,
+                self.writer.temperature,
+                self.writer.max_tokens
+            )
+
+            if use_cache:
+                try:
+                    cached = await generation_cache.get(cache_key)
+                except Exception as e:
+                    print(f"⚠️  Generation cache read error: {e}")
+                    cached = None
+
+                if cached is not None:
+                    print(f"⚡ 命中生成缓存: {topic} ({tier}档)")
+                    return {**cached, "cache": {"hit": True, "key": cache_key}}
+
+        print(f"✍️  生成文章: {topic} ({tier}档)")
+        result = await self.writer.generate_article(
+            topic, tier, research_data, on_partial=on_partial
+        )
+
+        # 缓存键按首选提供方的模型计算，故障转移到其他提供方的结果不能写在这个键下
+        if cache_key and result.get("provider") != self.writer.primary:
+            print(f"⏩ 结果来自备用提供方 {result.get('provider')}，不写生成缓存")
+            cache_key = None
+
+        if cache_key:
+            try:
+                await generation_cache.put(cache_key, self.writer.model, result)
+            except Exception as e:
+                print(f"⚠️  Generation cache write error: {e}")
+
+        return {**result, "cache": {"hit": False, "key": cache_key}}
+
+    def image_context(self, topic: str, research_data: Dict[str, Any]) -> str:
+        """在正文生成前，用主题和调研摘要拼出配图上下文"""
+        snippets = [topic]
+        for key in ("web_results", "wechat_results", "xiaohongshu_results", "academic_results"):
+            for item in research_data.get(key, []):
+                snippets.append(item.get("title", ""))
+                snippets.append(item.get("snippet", ""))
+        return "\n".join(s for s in snippets if s)[:500]
 
     async def generate_images(
         self,
         topic: str,
-        content: Dict[str, Any]
+        content: Dict[str, Any],
+        tier: Optional[str] = None
     ) -> List[str]:
         """
-        生成 KAFKA 风格配图
+        并发生成 KAFKA 风格配图
+
+        同步客户端放到有界线程池执行，不阻塞事件循环；
+        单张超时或失败时用占位图代替，不拖慢整篇文章。
 
         Args:
             topic: 文章主题
             content: 文章内容
+            tier: 字数档位（决定配图数量）
 
         Returns:
             图片 URL 列表
         """
-        print(f"🎨 生成配图: {topic}")
-
-        # 如果没有 Gemini Client，使用占位图
-        if not self.image_generator:
-            return [
-                f"https://via.placeholder.com/1280x720/0a0a0f/00f5ff?text=KAFKA+Style+1",
-                f"https://via.placeholder.com/1280x720/0a0a0f/b000ff?text=KAFKA+Style+2",
-                f"https://via.placeholder.com/1280x720/0a0a0f/ff00aa?text=KAFKA+Style+3"
-            ]
-
-        try:
-            # 尝试调用 Gemini 生成图片
-            markdown = content.get("markdown", "")
-            images = []
+        count = IMAGE_COUNTS.get(tier, 3)
+        print(f"🎨 生成配图: {topic} ({count} 张)")
+
+        with span("aiwriter.images", count=count) as images_span:
+            # 如果没有 Gemini Client，使用占位图
+            image_generator = await self.load_image_generator()
+            if not image_generator:
+                images_span.set_attribute("placeholder", True)
+                return [_placeholder_image(i) for i in range(count)]
+
+            generate = getattr(image_generator, "generate_kafka_image", None)
+            if generate is None:
+                images_span.set_attribute("placeholder", True)
+                return [_placeholder_image(i) for i in range(count)]
+
+            context = content.get("markdown", "")[:500]
+            results = await asyncio.gather(
+                *(self._generate_one_image(generate, i, topic, context) for i in range(count))
+            )
+            return list(results)
+
+    async def _generate_one_image(
+        self,
+        generate: Callable[..., Any],
+        index: int,
+        topic: str,
+        context: str
+    ) -> str:
+        """
+        生成单张图片（受全局信号量和超时约束）
 
-            for i in range(3):
-                try:
-                    # 假设 GeminiClient 有 generate_kafka_image 方法
-                    # 实际需要根据你的 GeminiClient 实现调整
-                    image_url = getattr(self.image_generator, 'generate_kafka_image', lambda **_: None)(
-                        topic=topic,
-                        context=markdown[:500]
-                    )
-                    if image_url:
-                        images.append(image_url)
-                    else:
-                        images.append(f"https://via.placeholder.com/1280x720/0a0a0f/00f5ff?text=Image+{i+1}")
-                except Exception as e:
-                    print(f"Image {i} generation error: {e}")
-                    images.append(f"https://via.placeholder.com/1280x720/0a0a0f/00f5ff?text=Image+{i+1}")
-
-            return images
-        except Exception as e:
-            print(f"Generate images error: {e}")
-            return [
-                f"https://via.placeholder.com/1280x720/0a0a0f/00f5ff?text=KAFKA+1",
-                f"https://via.placeholder.com/1280x720/0a0a0f/b000ff?text=KAFKA+2",
-                f"https://via.placeholder.com/1280x720/0a0a0f/ff00aa?text=KAFKA+3"
-            ]
+        排队和调用各自最多 IMAGE_TIMEOUT 秒，任一超时都用占位图代替
+        """
+        with span("aiwriter.image", index=index) as image_span:
+            # 排队时间（等信号量/线程）单独记录，区分排队和生成本身
+            queued = time.perf_counter()
+            try:
+                if inspect.iscoroutinefunction(generate):
+                    await asyncio.wait_for(_image_semaphore.acquire(), timeout=IMAGE_TIMEOUT)
+                    try:
+                        image_span.set_attribute("queue_ms", round((time.perf_counter() - queued) * 1000, 1))
+                        image_url = await asyncio.wait_for(
+                            generate(topic=topic, context=context), timeout=IMAGE_TIMEOUT
+                        )
+                    finally:
+                        _image_semaphore.release()
+                else:
+                    try:
+                        call = await _start_image_thread(
+                            lambda: generate(topic=topic, context=context), IMAGE_TIMEOUT
+                        )
+                    except asyncio.TimeoutError:
+                        print(f"Image {index} waited {IMAGE_TIMEOUT}s for a free slot, using placeholder")
+                        image_span.set_attributes(placeholder=True, queue_timeout=True)
+                        return _placeholder_image(index, "Image")
+                    image_span.set_attribute("queue_ms", round((time.perf_counter() - queued) * 1000, 1))
+                    image_url = await asyncio.wait_for(call, timeout=IMAGE_TIMEOUT)
+
+                if not image_url:
+                    image_span.set_attribute("placeholder", True)
+                return image_url or _placeholder_image(index, "Image")
+
+            except asyncio.TimeoutError:
+                print(f"Image {index} generation timed out after {IMAGE_TIMEOUT}s")
+                image_span.set_attributes(placeholder=True, timeout=True)
+            except Exception as e:
+                print(f"Image {index} generation error: {e}")
+                image_span.set_attributes(placeholder=True, error=str(e)[:200])
+
+            return _placeholder_image(index, "Image")
 
     async def integrate(
         self,
@@ -156,91 +368,81 @@ class AIWriter:
         formats: List[str]
     ) -> Dict[str, Any]:
         """
-        整合内容和图片，生成最终文件
+        整合内容和图片
+
+        只保存 Markdown 和图片；HTML、小红书、PDF 等格式在下载时按需渲染（见 core.renderer）
 
         Args:
             content: 文章内容
             images: 图片列表
-            formats: 输出格式
+            formats: 用户请求的输出格式（记录下来供前端展示下载入口）
 
         Returns:
             整合后的内容
         """
-        try:
-            # 在 Markdown 中插入图片
-            markdown = content.get("markdown", "")
-            title = content.get("title", "Untitled")
-
-            # 在标题后添加第一张图片
-            if images:
-                markdown = f"# {title}\n\n![配图]({images[0]})\n\n" + markdown
-
-            result = {
-                "title": title,
-                "markdown": markdown,
-                "images": images,
-                "html": "",
-                "pdf_url": "",
-                "xiaohongshu": ""
-            }
-
-            # 生成 HTML
-            if "html" in formats:
-                result["html"] = self._markdown_to_html(markdown)
-
-            # 生成小红书格式
-            if "xiaohongshu" in formats:
-                result["xiaohongshu"] = self._to_xiaohongshu_format(markdown, images)
-
-            # 生成 PDF（如果需要）
-            if "pdf" in formats:
-                result["pdf_url"] = await self._generate_pdf(markdown, title)
+        with span("aiwriter.integrate", images=len(images)):
+            return self._integrate(content, images, formats)
 
-            return result
+    def _integrate(
+        self,
+        content: Dict[str, Any],
+        images: List[str],
+        formats: List[str]
+    ) -> Dict[str, Any]:
+        """在 Markdown 中插入首图"""
+        # 在 Markdown 中插入图片
+        markdown = content.get("markdown", "")
+        title = content.get("title", "Untitled")
 
-        except Exception as e:
-            print(f"Integrate error: {e}")
-            return {
-                "title": content.get("title", "Untitled"),
-                "markdown": content.get("markdown", ""),
-                "images": images,
-                "html": "",
-                "pdf_url": "",
-                "xiaohongshu": ""
-            }
-
-    def _markdown_to_html(self, markdown: str) -> str:
-        """Markdown 转 HTML"""
-        try:
-            import markdown
-            return markdown.markdown(markdown)
-        except:
-            # 简单转换
-            replaced = markdown.replace('\n', '<br>')
-            return f"<div>{replaced}</div>"
-
-    def _to_xiaohongshu_format(self, markdown: str, images: List[str]) -> str:
-        """转换为小红书格式"""
-        # 移除 Markdown 语法
-        content = markdown
-        content = content.replace("#", "")
-        content = content.replace("*", "")
-        content = content.replace("```", "")
-
-        # 添加表情符号
-        content = "✨ " + content
-
-        # 添加图片链接
+        # 在标题后添加第一张图片（正文已有一级标题时插在它后面，不重复标题）
         if images:
-            content += "\n\n图片：\n" + "\n".join(images)
+            image = f"![配图]({images[0]})"
+            body = markdown.lstrip()
+            if body.startswith("# "):
+                heading, _, rest = body.partition("\n")
+                markdown = f"{heading}\n\n{image}\n\n{rest.lstrip()}"
+            else:
+                markdown = f"# {title}\n\n{image}\n\n" + markdown
+
+        return {
+            "title": title,
+            "markdown": markdown,
+            "images": images,
+            "formats": formats
+        }
+
+
+# 进程内共享的 AIWriter（lifespan 中初始化）
+_ai_writer: Optional[AIWriter] = None
+_warm_task: Optional[asyncio.Task] = None
+
+
+def get_ai_writer() -> AIWriter:
+    """获取全局 AIWriter，未初始化时立即创建"""
+    global _ai_writer
+    if _ai_writer is None:
+        _ai_writer = AIWriter()
+    return _ai_writer
+
+
+def init_ai_writer() -> AIWriter:
+    """
+    启动时初始化全局 AIWriter
 
-        # 添加话题标签
-        content += "\n\n#AI写作 #科技分享"
+    WARM_SDKS 开启时在后台预加载图片 SDK，不阻塞启动
+    """
+    global _warm_task
+    ai_writer = get_ai_writer()
+    if WARM_SDKS and _warm_task is None:
+        _warm_task = asyncio.create_task(ai_writer.load_image_generator())
+    return ai_writer
 
-        return content
 
-    async def _generate_pdf(self, markdown: str, title: str) -> str:
-        """生成 PDF（占位实现）"""
-        # TODO: 实现真实的 PDF 生成
-        # 可以使用 reportlab 或 weasyprint
-        return f"#PDF-{title}.pdf"  # 返回标识符而不是 URL
+async def close_ai_writer():
+    """关闭时取消未完成的预热，写入累积的生成缓存命中计数"""
+    global _warm_task
+    if _warm_task is not None:
+        _warm_task.cancel()
+        await asyncio.gather(_warm_task, return_exceptions=True)
+        _warm_task = None
+    await generation_cache.flush_hits()
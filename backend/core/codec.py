@@ -0,0 +1,214 @@
+"""
+JSON 列压缩编解码
+大字段（文章内容、调研数据、生成缓存）写库前压缩，读取时透明解压，兼容未压缩的旧行
+"""
+
+import os
+import json
+import zlib
+import base64
+import threading
+from typing import Any, Optional
+from sqlalchemy import JSON
+from sqlalchemy.types import TypeDecorator
+from dotenv import load_dotenv
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv()
+
+# 压缩算法：zstd / zlib / none（未安装 zstandard 时 zstd 退回 zlib）
+JSON_CODEC = os.getenv("JSON_CODEC", "zstd").lower()
+JSON_COMPRESS_LEVEL = int(os.getenv("JSON_COMPRESS_LEVEL", "6"))
+# 小于该大小（序列化后字节数）的值不压缩
+JSON_COMPRESS_MIN_BYTES = int(os.getenv("JSON_COMPRESS_MIN_BYTES", "512"))
+# 预训练的 zstd 字典（可选），用 python -m core.codec --train 生成
+JSON_ZSTD_DICT = os.getenv("JSON_ZSTD_DICT", "")
+
+# 压缩值的存储格式：zc1:<算法>:<字典 ID>:<base64>，作为 JSON 字符串存入原列
+PREFIX = "zc1:"
+
+
+class _ZstdState(threading.local):
+    """zstd 压缩器不是线程安全的，每个线程各持一份"""
+
+    def __init__(self):
+        self.dictionary = _load_dictionary()
+        self.compressor = None
+        self.decompressor = None
+
+
+def _load_dictionary() -> Optional["zstandard.ZstdCompressionDict"]:
+    if not JSON_ZSTD_DICT or zstandard is None:
+        return None
+    with open(JSON_ZSTD_DICT, "rb") as f:
+        return zstandard.ZstdCompressionDict(f.read())
+
+
+_zstd = _ZstdState()
+
+
+def _active_codec() -> str:
+    if JSON_CODEC == "zstd" and zstandard is None:
+        return "zlib"
+    return JSON_CODEC
+
+
+def _compress(codec: str, data: bytes) -> tuple:
+    """返回 (压缩数据, 字典 ID)"""
+    if codec == "zlib":
+        return zlib.compress(data, JSON_COMPRESS_LEVEL), 0
+    if _zstd.compressor is None:
+        _zstd.compressor = zstandard.ZstdCompressor(level=JSON_COMPRESS_LEVEL, dict_data=_zstd.dictionary)
+    dict_id = _zstd.dictionary.dict_id() if _zstd.dictionary is not None else 0
+    return _zstd.compressor.compress(data), dict_id
+
+
+def _decompress(codec: str, dict_id: int, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec != "zstd":
+        raise ValueError(f"未知的压缩算法: {codec}")
+    if zstandard is None:
+        raise RuntimeError("读取 zstd 压缩数据需要安装 zstandard")
+    if dict_id and (_zstd.dictionary is None or _zstd.dictionary.dict_id() != dict_id):
+        raise RuntimeError(f"缺少 zstd 字典 {dict_id}（检查 JSON_ZSTD_DICT）")
+    if _zstd.decompressor is None:
+        _zstd.decompressor = zstandard.ZstdDecompressor(dict_data=_zstd.dictionary)
+    return _zstd.decompressor.decompress(data)
+
+
+def encode_json(value: Any) -> Any:
+    """
+    压缩 JSON 值
+
+    Args:
+        value: 任意可 JSON 序列化的值
+
+    Returns:
+        压缩后的标记字符串；值太小或关闭压缩时原样返回
+    """
+    codec = _active_codec()
+    if value is None or codec == "none":
+        return value
+
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) < JSON_COMPRESS_MIN_BYTES:
+        return value
+
+    packed, dict_id = _compress(codec, raw)
+    return f"{PREFIX}{codec}:{dict_id}:{base64.b64encode(packed).decode('ascii')}"
+
+
+def decode_json(value: Any) -> Any:
+    """解压 JSON 值（未压缩的旧值原样返回）"""
+    if not is_compressed(value):
+        return value
+    codec, dict_id, payload = value[len(PREFIX):].split(":", 2)
+    raw = _decompress(codec, int(dict_id), base64.b64decode(payload))
+    return json.loads(raw)
+
+
+def is_compressed(value: Any) -> bool:
+    """是否为 encode_json 产生的压缩值"""
+    return isinstance(value, str) and value.startswith(PREFIX)
+
+
+class CompressedJSON(TypeDecorator):
+    """
+    透明压缩的 JSON 列
+
+    底层仍是 JSON 类型（压缩值作为 JSON 字符串存储），无需修改表结构；
+    读取时兼容旧的未压缩行
+    """
+
+    impl = JSON
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return encode_json(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_json(value)
+
+
+def train_dictionary(samples: list, size: int = 112 * 1024) -> bytes:
+    """
+    用样本训练 zstd 字典
+
+    Args:
+        samples: JSON 值列表
+        size: 字典大小（字节）
+
+    Returns:
+        字典内容
+    """
+    if zstandard is None:
+        raise RuntimeError("训练字典需要安装 zstandard")
+    encoded = [json.dumps(s, ensure_ascii=False, separators=(",", ":")).encode("utf-8") for s in samples]
+    return zstandard.train_dictionary(size, encoded).as_bytes()
+
+
+if __name__ == "__main__":
+    # 压缩效果基准：python -m core.codec [行数] [--train 字典路径]
+    import sys
+    import time
+    import asyncio
+    from sqlalchemy import select, cast, Text
+    from .database import ArticleContent, async_session
+
+    async def _load_rows(limit: int) -> list:
+        # 读原始列值，绕过类型解码
+        async with async_session() as session:
+            result = await session.execute(
+                select(cast(ArticleContent.content, Text), cast(ArticleContent.research_data, Text))
+                .limit(limit)
+            )
+            rows = []
+            for content, research in result.all():
+                for raw in (content, research):
+                    if raw and raw != "null":
+                        rows.append(decode_json(json.loads(raw)))
+            return rows
+
+    def _bench(rows: list):
+        raw_sizes = [len(json.dumps(r, ensure_ascii=False).encode("utf-8")) for r in rows]
+        print(f"📦 {len(rows)} values, raw {sum(raw_sizes)} bytes, avg {sum(raw_sizes) // max(len(rows), 1)} bytes")
+        codecs = ["zlib"] + (["zstd"] if zstandard is not None else [])
+        for codec in codecs:
+            global JSON_CODEC
+            JSON_CODEC = codec
+            start = time.perf_counter()
+            encoded = [encode_json(r) for r in rows]
+            encode_time = time.perf_counter() - start
+            start = time.perf_counter()
+            for e in encoded:
+                decode_json(e)
+            decode_time = time.perf_counter() - start
+            size = sum(len(json.dumps(e, ensure_ascii=False).encode("utf-8")) for e in encoded)
+            per_row = 1e6 / max(len(rows), 1)
+            print(
+                f"  {codec:5s} {size} bytes (×{sum(raw_sizes) / max(size, 1):.2f}), "
+                f"encode {encode_time * per_row:.0f}µs/row, decode {decode_time * per_row:.0f}µs/row"
+            )
+
+    args = sys.argv[1:]
+    train_path = None
+    if "--train" in args:
+        train_path = args[args.index("--train") + 1]
+        args = [a for a in args if a not in ("--train", train_path)]
+    limit = int(args[0]) if args else 1000
+
+    rows = asyncio.run(_load_rows(limit))
+    if not rows:
+        print("⚠️  No rows in article_contents")
+        sys.exit(0)
+
+    _bench(rows)
+    if train_path:
+        with open(train_path, "wb") as f:
+            f.write(train_dictionary(rows))
+        print(f"✅ Dictionary written to {train_path}, set JSON_ZSTD_DICT to use it")
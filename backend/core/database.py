@@ -3,14 +3,20 @@
 支持 SQLite（本地开发）和 PostgreSQL（生产环境）
 """
 
-from sqlalchemy import create_engine, Column, String, Integer, Text, DateTime, JSON
+from sqlalchemy import create_engine, Column, String, Integer, Text, DateTime, JSON, Index, ForeignKey, inspect, text
+from sqlalchemy import select, update, cast, or_, and_
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.sql import func
 import os
+import json
+import asyncio
 from datetime import datetime
 from typing import Optional
 
+from .codec import CompressedJSON, PREFIX, JSON_COMPRESS_MIN_BYTES, is_compressed
+from .metrics import instrument_engine
+
 # 数据库配置
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
@@ -24,6 +30,9 @@ engine = create_async_engine(
     future=True
 )
 
+# SQL 执行和连接占用计时（/metrics）
+instrument_engine(engine)
+
 # 创建 Session 工厂
 async_session = sessionmaker(
     engine,
@@ -36,7 +45,7 @@ Base = declarative_base()
 
 
 class Article(Base):
-    """文章表"""
+    """文章表（只保存任务状态和列表摘要，大字段在 article_contents）"""
     __tablename__ = "articles"
 
     id = Column(String, primary_key=True)
@@ -45,10 +54,12 @@ class Article(Base):
     status = Column(String(20), default="pending")
     progress = Column(Integer, default=0)
 
-    # 内容字段
-    content = Column(JSON, nullable=True)
-    research_data = Column(JSON, nullable=True)
-    extra_metadata = Column(JSON, nullable=True)  # metadata 是保留字，改名
+    # 列表摘要（完成时计算一次，画廊列表只查这些列）
+    title = Column(String(255), nullable=True)
+    excerpt = Column(Text, nullable=True)
+    cover_image = Column(String(1024), nullable=True)
+    # 最终内容的哈希（完成时计算），下载时不读内容即可回答 If-None-Match
+    content_hash = Column(String(64), nullable=True)
 
     # 时间戳
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -61,27 +72,246 @@ class Article(Base):
     ip_address = Column(String(45), nullable=True)
     user_fingerprint = Column(String(64), nullable=True)
 
-    def to_dict(self):
-        """转换为字典"""
+    __table_args__ = (
+        # 画廊：按状态筛选 + 时间倒序，以及 (created_at, id) 游标分页
+        Index("ix_articles_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_articles_created_at_id", "created_at", "id"),
+    )
+
+    def to_dict(self, contents: Optional["ArticleContent"] = None):
+        """转换为字典（contents 为空时内容字段返回 None）"""
         return {
             "id": self.id,
             "topic": self.topic,
             "tier": self.tier,
             "status": self.status,
             "progress": self.progress,
-            "content": self.content,
-            "research_data": self.research_data,
-            "metadata": self.extra_metadata,  # 对外接口仍使用 metadata
+            "content": contents.content if contents else None,
+            "research_data": contents.research_data if contents else None,
+            # 对外接口仍使用 metadata；trace 较大，通过 /articles/{id}/trace 单独获取
+            "metadata": {
+                key: value for key, value in (contents.extra_metadata or {}).items() if key != "trace"
+            } if contents else None,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
             "error": self.error
         }
 
 
+class ArticleContent(Base):
+    """文章内容表（大字段，按需加载）"""
+    __tablename__ = "article_contents"
+
+    article_id = Column(String, ForeignKey("articles.id", ondelete="CASCADE"), primary_key=True)
+
+    content = Column(CompressedJSON, nullable=True)
+    research_data = Column(CompressedJSON, nullable=True)
+    extra_metadata = Column(CompressedJSON, nullable=True)  # metadata 是保留字，改名；含 trace，压缩存储
+    # 各阶段检查点（write / images），失败重试时从最后完成的阶段继续；research 存在 research_data
+    checkpoints = Column(CompressedJSON, nullable=True)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Job(Base):
+    """生成任务队列表（与 articles 一一对应，id 即文章 ID）"""
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)
+    payload = Column(JSON, nullable=False)  # topic / tier / formats
+    status = Column(String(20), default="queued")  # queued / running / done / failed
+    attempts = Column(Integer, default=0)
+
+    # 租约：worker 认领后定期续约，过期即视为崩溃
+    lease_owner = Column(String(64), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+        Index("ix_jobs_status_lease_expires_at", "status", "lease_expires_at"),
+    )
+
+
+class GenerationCacheEntry(Base):
+    """生成结果缓存表（按提示词/模型/参数哈希寻址）"""
+    __tablename__ = "generation_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 hex
+    model = Column(String(64), nullable=False)
+    value = Column(CompressedJSON, nullable=False)
+    hit_count = Column(Integer, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_hit_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_generation_cache_expires_at", "expires_at"),
+        Index("ix_generation_cache_last_hit_at", "last_hit_at"),
+    )
+
+
+class RequestKey(Base):
+    """生成请求去重键：幂等键（idem:）和单飞键（flight:）"""
+
+    __tablename__ = "request_keys"
+
+    key = Column(String(128), primary_key=True)
+    article_id = Column(String, nullable=False)
+    request_hash = Column(String(64), nullable=True)  # 请求体哈希，检测幂等键被复用于不同请求
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_request_keys_expires_at", "expires_at"),
+    )
+
+
+# 已迁移到 article_contents 的旧列
+LEGACY_CONTENT_COLUMNS = ("content", "research_data", "extra_metadata")
+
+
+def _add_missing_columns(sync_conn):
+    """
+    为已有表补充新增的列和索引（create_all 不会修改已存在的表）
+
+    只处理可空列，SQLite 和 PostgreSQL 都支持 ADD COLUMN
+    """
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            print(f"🛠  Added column {table.name}.{column.name}")
+
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(sync_conn)
+                print(f"🛠  Created index {index.name}")
+
+
+def _migrate_legacy_content(sync_conn):
+    """
+    把旧版 articles 表中的大字段迁移到 article_contents
+
+    复制尚未迁移的行后删除旧列；数据库不支持 DROP COLUMN（SQLite < 3.35）时
+    清空旧列，让热表行重新变窄
+    """
+    inspector = inspect(sync_conn)
+    existing = {column["name"] for column in inspector.get_columns("articles")}
+    legacy = [name for name in LEGACY_CONTENT_COLUMNS if name in existing]
+    if not legacy:
+        return
+
+    columns = ", ".join(legacy)
+    result = sync_conn.execute(text(
+        f"INSERT INTO article_contents (article_id, {columns}, updated_at) "
+        f"SELECT id, {columns}, CURRENT_TIMESTAMP FROM articles "
+        f"WHERE id NOT IN (SELECT article_id FROM article_contents)"
+    ))
+    print(f"🛠  Migrated content of {result.rowcount} articles to article_contents")
+
+    for name in legacy:
+        try:
+            with sync_conn.begin_nested():
+                sync_conn.execute(text(f"ALTER TABLE articles DROP COLUMN {name}"))
+            print(f"🛠  Dropped column articles.{name}")
+        except Exception:
+            sync_conn.execute(text(f"UPDATE articles SET {name} = NULL"))
+            print(f"🛠  Cleared legacy column articles.{name}")
+
+
 async def init_db():
-    """初始化数据库（创建表）"""
+    """初始化数据库（创建表、补齐新增列和索引、迁移旧版内容字段）"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_migrate_legacy_content)
+
+
+# 压缩存储的 JSON 列：(模型, 主键列名, 列名)
+COMPRESSED_COLUMNS = (
+    (ArticleContent, "article_id", ("content", "research_data", "extra_metadata", "checkpoints")),
+    (GenerationCacheEntry, "key", ("value",)),
+)
+
+
+async def compress_legacy_json(batch_size: int = 100, pause: float = 0.05) -> int:
+    """
+    后台把未压缩的旧行重写为压缩格式
+
+    按主键分批推进，每批之间让出事件循环；只在列值未被改动时才覆盖，
+    不会和正在写入的任务冲突。读取本身兼容旧行，迁移中断也不影响服务
+
+    Returns:
+        重写的行数
+    """
+    rewritten = 0
+    try:
+        for model, key_name, names in COMPRESSED_COLUMNS:
+            key_column = getattr(model, key_name)
+            raw_columns = {name: cast(getattr(model, name), Text) for name in names}
+            last_key = ""
+            while True:
+                async with async_session() as session:
+                    # 直接读列的原始文本，绕过解码；太小不压缩的值在 SQL 中排除，重启时不再逐行重扫
+                    result = await session.execute(
+                        select(key_column, *raw_columns.values())
+                        .where(
+                            key_column > last_key,
+                            or_(*[
+                                and_(raw.notlike(f'"{PREFIX}%'), func.length(raw) >= JSON_COMPRESS_MIN_BYTES)
+                                for raw in raw_columns.values()
+                            ])
+                        )
+                        .order_by(key_column)
+                        .limit(batch_size)
+                    )
+                    rows = result.all()
+                    if not rows:
+                        break
+
+                    for key, *raws in rows:
+                        values = {}
+                        for name, raw in zip(names, raws):
+                            if raw is None or len(raw.encode("utf-8")) < JSON_COMPRESS_MIN_BYTES:
+                                continue
+                            value = json.loads(raw)
+                            if value is not None and not is_compressed(value):
+                                values[name] = (raw, value)
+                        if not values:
+                            continue
+
+                        result = await session.execute(
+                            update(model)
+                            .where(key_column == key, and_(*[raw_columns[name] == raw for name, (raw, _) in values.items()]))
+                            .values(**{name: value for name, (_, value) in values.items()})
+                        )
+                        rewritten += result.rowcount
+
+                    await session.commit()
+                    last_key = rows[-1][0]
+
+                await asyncio.sleep(pause)
+    except Exception as e:
+        print(f"⚠️  JSON compression stopped: {e}")
+
+    if rewritten:
+        print(f"🛠  Compressed {rewritten} legacy JSON rows")
+    return rewritten
 
 
 async def get_session() -> AsyncSession:
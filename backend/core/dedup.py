@@ -0,0 +1,174 @@
+"""
+生成请求去重
+Idempotency-Key 重放返回原任务；相同（规范化主题, 档位, 格式）的并发请求合并到同一个在途任务
+两类键都存数据库，进程重启后仍然有效
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from dotenv import load_dotenv
+
+from .database import RequestKey, Article, async_session
+from .events import TERMINAL_STATUSES
+from .generation_cache import normalize_prompt
+
+load_dotenv()
+
+# 幂等键保留时间
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# 是否合并相同的在途请求
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+DEDUP_PRUNE_EVERY = 100  # 每写入 N 个键清理一次过期键
+
+
+def request_hash(topic: str, tier: str, formats: List[str]) -> str:
+    """规范化请求的哈希：主题统一 Unicode/空白/大小写，格式去重排序"""
+    material = json.dumps(
+        {
+            "topic": normalize_prompt(topic).casefold(),
+            "tier": tier,
+            "formats": sorted(set(formats))
+        },
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def idempotency_key(header: str) -> str:
+    """幂等键（请求头可能很长，存哈希）"""
+    return "idem:" + hashlib.sha256(header.encode("utf-8")).hexdigest()
+
+
+def flight_key(digest: str) -> str:
+    """单飞键"""
+    return "flight:" + digest
+
+
+class RequestDeduplicator:
+    """基于 request_keys 表的去重"""
+
+    def __init__(self):
+        """初始化"""
+        self._writes = 0
+
+    async def lookup(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        查找仍然有效的键
+
+        幂等键在过期前有效；单飞键只在对应任务未结束时有效
+
+        Returns:
+            (article_id, request_hash)，无效返回 None
+        """
+        async with async_session() as session:
+            result = await session.execute(
+                select(RequestKey.article_id, RequestKey.request_hash, RequestKey.expires_at, Article.status)
+                .outerjoin(Article, Article.id == RequestKey.article_id)
+                .where(RequestKey.key == key)
+            )
+            row = result.first()
+
+        if row is None or not self._is_live(key, row.expires_at, row.status):
+            return None
+        return row.article_id, row.request_hash
+
+    async def claim(
+        self,
+        key: str,
+        article_id: str,
+        digest: Optional[str] = None
+    ) -> Tuple[str, Optional[str]]:
+        """
+        原子地把键指向 article_id
+
+        键不存在或已失效时占用成功；否则返回当前占用者。
+        并发请求由主键唯一约束裁决，失效键用带旧值条件的 UPDATE 抢占（CAS）
+
+        Returns:
+            (占用者 article_id, 占用者的 request_hash)
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(hours=IDEMPOTENCY_TTL_HOURS) if key.startswith("idem:") else None
+
+        while True:
+            try:
+                async with async_session() as session:
+                    session.add(RequestKey(
+                        key=key,
+                        article_id=article_id,
+                        request_hash=digest,
+                        created_at=now,
+                        expires_at=expires_at
+                    ))
+                    await session.commit()
+                await self._maybe_prune()
+                return article_id, digest
+            except IntegrityError:
+                pass
+
+            async with async_session() as session:
+                result = await session.execute(
+                    select(RequestKey.article_id, RequestKey.request_hash, RequestKey.expires_at, Article.status)
+                    .outerjoin(Article, Article.id == RequestKey.article_id)
+                    .where(RequestKey.key == key)
+                )
+                row = result.first()
+                if row is None:
+                    # 刚被清理，重新插入
+                    continue
+                if self._is_live(key, row.expires_at, row.status):
+                    return row.article_id, row.request_hash
+
+                taken = await session.execute(
+                    update(RequestKey)
+                    .where(RequestKey.key == key, RequestKey.article_id == row.article_id)
+                    .values(article_id=article_id, request_hash=digest, created_at=now, expires_at=expires_at)
+                )
+                await session.commit()
+                if taken.rowcount == 1:
+                    return article_id, digest
+
+    async def release(self, key: str, article_id: str):
+        """释放自己占用的键（任务没能创建时调用）"""
+        async with async_session() as session:
+            await session.execute(
+                delete(RequestKey).where(RequestKey.key == key, RequestKey.article_id == article_id)
+            )
+            await session.commit()
+
+    def _is_live(self, key: str, expires_at: Optional[datetime], status: Optional[str]) -> bool:
+        if expires_at is not None and expires_at <= datetime.utcnow():
+            return False
+        if key.startswith("flight:"):
+            # 任务已结束或文章已删除
+            return status is not None and status not in TERMINAL_STATUSES
+        return True
+
+    async def _maybe_prune(self):
+        """定期清理过期的幂等键和已结束任务的单飞键"""
+        self._writes += 1
+        if self._writes % DEDUP_PRUNE_EVERY:
+            return
+        async with async_session() as session:
+            await session.execute(
+                delete(RequestKey).where(RequestKey.expires_at < datetime.utcnow())
+            )
+            await session.execute(
+                delete(RequestKey).where(
+                    RequestKey.key.like("flight:%"),
+                    RequestKey.article_id.in_(
+                        select(Article.id).where(Article.status.in_(TERMINAL_STATUSES))
+                    )
+                )
+            )
+            await session.commit()
+
+
+# 全局去重器
+request_dedup = RequestDeduplicator()
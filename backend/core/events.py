@@ -0,0 +1,149 @@
+"""
+任务状态事件总线
+进程内发布/订阅，可选 Redis 后端以支持多个 uvicorn worker
+"""
+
+import os
+import json
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Set, Any, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+USE_REDIS = os.getenv("USE_REDIS", "false").lower() == "true"
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# Redis 频道前缀
+CHANNEL_PREFIX = "aiwriter:status:"
+
+# 每个订阅者的缓冲上限（慢消费者丢弃最旧事件）
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# 终止状态：收到后订阅端可以结束
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+class EventBus:
+    """状态事件总线"""
+
+    def __init__(self):
+        """初始化"""
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._redis = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """启动（启用 Redis 时建立订阅监听）"""
+        if not USE_REDIS:
+            print("✅ Event bus: in-process")
+            return
+
+        try:
+            import redis.asyncio as redis
+
+            self._redis = redis.from_url(REDIS_URL, decode_responses=True)
+            self._pubsub = self._redis.pubsub()
+            await self._pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+            self._listener = asyncio.create_task(self._listen())
+            print(f"✅ Event bus: Redis ({REDIS_URL})")
+        except Exception as e:
+            print(f"⚠️  Redis 事件总线不可用，回退到进程内: {e}")
+            self._redis = None
+            self._pubsub = None
+
+    @property
+    def distributed(self) -> bool:
+        """是否已连上 Redis（跨进程推送）"""
+        return self._redis is not None
+
+    async def stop(self):
+        """关闭"""
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub:
+            await self._pubsub.close()
+            self._pubsub = None
+        if self._redis:
+            await self._redis.close()
+            self._redis = None
+
+    async def _listen(self):
+        """Redis 监听：把收到的消息分发给本进程订阅者"""
+        async for message in self._pubsub.listen():
+            if message.get("type") != "pmessage":
+                continue
+            try:
+                article_id = message["channel"][len(CHANNEL_PREFIX):]
+                self._dispatch(article_id, json.loads(message["data"]))
+            except Exception as e:
+                print(f"⚠️  Event dispatch error: {e}")
+
+    def _dispatch(self, article_id: str, event: Dict[str, Any]):
+        """分发到本进程订阅者"""
+        for queue in list(self._subscribers.get(article_id, ())):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def publish(self, article_id: str, event: Dict[str, Any]):
+        """
+        发布状态事件
+
+        Args:
+            article_id: 文章 ID
+            event: 事件内容（status/progress 等）
+        """
+        if self._redis:
+            try:
+                await self._redis.publish(
+                    f"{CHANNEL_PREFIX}{article_id}",
+                    json.dumps(event, ensure_ascii=False)
+                )
+                return
+            except Exception as e:
+                print(f"⚠️  Redis publish failed: {e}")
+
+        self._dispatch(article_id, event)
+
+    def add_subscriber(self, article_id: str) -> asyncio.Queue:
+        """注册订阅者，返回事件队列（需配对调用 remove_subscriber）"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[article_id].add(queue)
+        return queue
+
+    def remove_subscriber(self, article_id: str, queue: asyncio.Queue):
+        """注销订阅者"""
+        subscribers = self._subscribers.get(article_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[article_id]
+
+    @asynccontextmanager
+    async def subscribe(self, article_id: str):
+        """
+        订阅某篇文章的状态事件
+
+        用法：
+            async with event_bus.subscribe(article_id) as queue:
+                event = await queue.get()
+        """
+        queue = self.add_subscriber(article_id)
+        try:
+            yield queue
+        finally:
+            self.remove_subscriber(article_id, queue)
+
+
+# 全局事件总线
+event_bus = EventBus()
@@ -4,10 +4,14 @@
 """
 
 import os
-from typing import Dict, Any
-import google.generativeai as genai
+import asyncio
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
+from .http_client import get_client, APICORE_BASE
+from .research_compactor import compact_research
+from .gpt5_writer import TIER_WORDS, PartialCallback
+
 load_dotenv()
 
 
@@ -17,20 +21,26 @@ class GeminiWriter:
     def __init__(self):
         """初始化 Gemini"""
         api_key = os.getenv("GEMINI_API_KEY")
+        self.model = "gemini-pro"
+        self.temperature = 0.7
+        self.max_tokens = 8192
+        self._official_model = None
 
         # 判断 API Key 类型
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY 未设置")
         if api_key.startswith("AIzaSy"):
             # Google 官方 API
+            # google.generativeai 导入较慢，首次调用时才加载
             self.use_official = True
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
+            self.api_key = api_key
             print("✅ 使用 Google 官方 Gemini API")
         elif api_key.startswith("sk-"):
             # APICore（OpenAI 兼容格式）
             self.use_official = False
             # APICore 使用 OpenAI 格式的 API
             self.api_key = api_key
-            self.api_base = "https://api.apicore.ai/v1"
+            self.api_base = APICORE_BASE
             print("✅ 使用 APICore (OpenAI 兼容) API")
         else:
             raise ValueError("无效的 GEMINI_API_KEY 格式")
@@ -39,7 +49,8 @@ class GeminiWriter:
         self,
         topic: str,
         tier: str,
-        research_data: Dict[str, Any]
+        research_data: Dict[str, Any],
+        on_partial: Optional[PartialCallback] = None
     ) -> Dict[str, Any]:
         """
         使用 Gemini 生成文章
@@ -48,22 +59,16 @@ class GeminiWriter:
             topic: 文章主题
             tier: 字数档位
             research_data: 调研数据
+            on_partial: 部分内容回调（非流式，生成完成时回调一次）
 
         Returns:
             文章内容
         """
-        # 字数档位对应
-        tier_words = {
-            "A": 2500,
-            "B": 4000,
-            "C": 6500,
-            "D": 10000
-        }
+        target_words = TIER_WORDS.get(tier, 4000)
 
-        target_words = tier_words.get(tier, 4000)
-
-        # 构建提示词
-        prompt = self._build_prompt(topic, target_words, research_data)
+        # 压缩调研数据，构建提示词
+        research_block = compact_research(research_data, topic, tier)
+        prompt = self._build_prompt(topic, target_words, research_block)
 
         print(f"✍️  Gemini 生成文章: {topic} ({tier}档, 约{target_words}字)")
 
@@ -75,6 +80,9 @@ class GeminiWriter:
                 # 使用 APICore
                 content = await self._generate_with_apicore(prompt)
 
+            if on_partial:
+                await on_partial(content, 1.0)
+
             return {
                 "title": topic,
                 "markdown": content,
@@ -85,11 +93,21 @@ class GeminiWriter:
             print(f"❌ Gemini 生成失败: {e}")
             raise e
 
+    def build_prompt(
+        self,
+        topic: str,
+        tier: str,
+        research_data: Dict[str, Any]
+    ) -> str:
+        """按档位构建提示词（同时用于生成缓存键）"""
+        research_block = compact_research(research_data, topic, tier, log=False)
+        return self._build_prompt(topic, TIER_WORDS.get(tier, 4000), research_block)
+
     def _build_prompt(
         self,
         topic: str,
         target_words: int,
-        research_data: Dict[str, Any]
+        research_block: str
     ) -> str:
         """构建提示词"""
         return f"""请基于以下调研结果，撰写一篇关于"{topic}"的深度文章。
@@ -103,7 +121,7 @@ class GeminiWriter:
 4. 有节制：克制煽情，理性客观
 
 **调研参考**：
-{research_data}
+{research_block}
 
 **输出要求**：
 - 使用 Markdown 格式
@@ -115,13 +133,21 @@ class GeminiWriter:
 
     async def _generate_with_official_api(self, prompt: str) -> str:
         """使用 Google 官方 API 生成"""
-        response = await self.model.generate_content_async(prompt)
+        if self._official_model is None:
+            # 导入 SDK 在线程中执行，不阻塞事件循环
+            self._official_model = await asyncio.to_thread(self._load_official_model)
+        response = await self._official_model.generate_content_async(prompt)
         return response.text
 
+    def _load_official_model(self):
+        """导入 google.generativeai 并创建模型"""
+        import google.generativeai as genai
+
+        genai.configure(api_key=self.api_key)
+        return genai.GenerativeModel(self.model)
+
     async def _generate_with_apicore(self, prompt: str) -> str:
         """使用 APICore（OpenAI 兼容格式）生成"""
-        import httpx
-
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -135,16 +161,16 @@ class GeminiWriter:
                     "content": prompt
                 }
             ],
-            "temperature": 0.7,
-            "max_tokens": 8192
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
         }
 
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            response = await client.post(
-                f"{self.api_base}/chat/completions",
-                headers=headers,
-                json=data
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+        client = get_client("apicore")
+        response = await client.post(
+            "/chat/completions",
+            headers=headers,
+            json=data
+        )
+        response.raise_for_status()
+        result = response.json()
+        return result["choices"][0]["message"]["content"]
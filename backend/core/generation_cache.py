@@ -0,0 +1,225 @@
+"""
+生成结果缓存
+按 (规范化提示词, 模型, temperature, max_tokens) 的哈希寻址：
+内存 LRU 一级缓存 + 数据库持久化二级缓存，支持 TTL 和容量淘汰
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy import select, update, delete, func, bindparam
+from dotenv import load_dotenv
+
+from .database import GenerationCacheEntry, async_session
+
+load_dotenv()
+
+# 缓存配置
+GEN_CACHE_ENABLED = os.getenv("GEN_CACHE_ENABLED", "true").lower() == "true"
+GEN_CACHE_MEMORY_SIZE = int(os.getenv("GEN_CACHE_MEMORY_SIZE", "128"))  # 内存条目数
+GEN_CACHE_MAX_ROWS = int(os.getenv("GEN_CACHE_MAX_ROWS", "10000"))  # 持久化条目上限
+GEN_CACHE_TTL_SECONDS = int(os.getenv("GEN_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+GEN_CACHE_PRUNE_EVERY = 50  # 每写入 N 次清理一次持久层
+# 命中计数先记在内存，攒够条数或超过间隔（秒）后批量写入持久层
+GEN_CACHE_TOUCH_INTERVAL = float(os.getenv("GEN_CACHE_TOUCH_INTERVAL", "30"))
+GEN_CACHE_TOUCH_BATCH = 100
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化提示词：统一 Unicode 形式、合并空白"""
+    prompt = unicodedata.normalize("NFC", prompt)
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def make_cache_key(prompt: str, model: str, temperature: float, max_tokens: int) -> str:
+    """计算缓存键"""
+    material = json.dumps(
+        {
+            "prompt": normalize_prompt(prompt),
+            "model": model,
+            "temperature": round(float(temperature), 4),
+            "max_tokens": int(max_tokens)
+        },
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """两级生成缓存"""
+
+    def __init__(
+        self,
+        memory_size: int = GEN_CACHE_MEMORY_SIZE,
+        max_rows: int = GEN_CACHE_MAX_ROWS,
+        ttl_seconds: int = GEN_CACHE_TTL_SECONDS
+    ):
+        """初始化"""
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.ttl = timedelta(seconds=ttl_seconds)
+        # key -> (过期时间, 值)
+        self._memory: "OrderedDict[str, Tuple[datetime, Dict[str, Any]]]" = OrderedDict()
+        self._writes = 0
+        # key -> (未写入的命中次数, 最近命中时间)
+        self._hits: Dict[str, Tuple[int, datetime]] = {}
+        self._hits_since = time.monotonic()
+
+    def _memory_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """内存层读取（命中时移到队尾）"""
+        item = self._memory.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= datetime.utcnow():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: Dict[str, Any], expires_at: datetime):
+        """内存层写入（超出容量淘汰最久未用）"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存
+
+        Returns:
+            命中时返回缓存值，否则 None
+        """
+        value = self._memory_get(key)
+        if value is not None:
+            await self._touch(key)
+            return value
+
+        now = datetime.utcnow()
+        async with async_session() as session:
+            result = await session.execute(
+                select(GenerationCacheEntry.value, GenerationCacheEntry.expires_at)
+                .where(GenerationCacheEntry.key == key)
+            )
+            row = result.first()
+
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            return None
+
+        self._memory_put(key, value, expires_at or now + self.ttl)
+        await self._touch(key)
+        return value
+
+    async def _touch(self, key: str):
+        """记录命中（用于 LRU 淘汰和统计），攒批后由 flush_hits 写入持久层"""
+        count, _ = self._hits.get(key, (0, None))
+        if not self._hits:
+            self._hits_since = time.monotonic()
+        self._hits[key] = (count + 1, datetime.utcnow())
+        due = time.monotonic() - self._hits_since >= GEN_CACHE_TOUCH_INTERVAL
+        if due or len(self._hits) >= GEN_CACHE_TOUCH_BATCH:
+            await self.flush_hits()
+
+    async def flush_hits(self):
+        """把内存中累积的命中计数一次性写入持久层（失败时丢弃，只影响统计和淘汰顺序）"""
+        if not self._hits:
+            return
+        hits, self._hits = self._hits, {}
+        table = GenerationCacheEntry.__table__
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    update(table)
+                    .where(table.c.key == bindparam("touch_key"))
+                    .values(
+                        hit_count=table.c.hit_count + bindparam("touch_count"),
+                        last_hit_at=bindparam("touch_at")
+                    ),
+                    [
+                        {"touch_key": key, "touch_count": count, "touch_at": hit_at}
+                        for key, (count, hit_at) in hits.items()
+                    ]
+                )
+                await session.commit()
+        except Exception as e:
+            print(f"⚠️  Generation cache hit flush failed: {e}")
+
+    async def put(self, key: str, model: str, value: Dict[str, Any]):
+        """写入缓存（两级）"""
+        now = datetime.utcnow()
+        expires_at = now + self.ttl
+        self._memory_put(key, value, expires_at)
+
+        async with async_session() as session:
+            entry = await session.get(GenerationCacheEntry, key)
+            if entry is None:
+                session.add(GenerationCacheEntry(
+                    key=key,
+                    model=model,
+                    value=value,
+                    hit_count=0,
+                    created_at=now,
+                    expires_at=expires_at
+                ))
+            else:
+                entry.value = value
+                entry.expires_at = expires_at
+            await session.commit()
+
+        self._writes += 1
+        if self._writes % GEN_CACHE_PRUNE_EVERY == 0:
+            await self.prune()
+
+    async def prune(self) -> int:
+        """
+        清理持久层：删除过期条目，超出上限时按最近使用时间淘汰
+
+        Returns:
+            删除的条目数
+        """
+        # 先写入命中计数，淘汰顺序才准确
+        await self.flush_hits()
+        now = datetime.utcnow()
+        removed = 0
+        async with async_session() as session:
+            result = await session.execute(
+                delete(GenerationCacheEntry).where(GenerationCacheEntry.expires_at <= now)
+            )
+            removed += result.rowcount or 0
+
+            count = (await session.execute(
+                select(func.count()).select_from(GenerationCacheEntry)
+            )).scalar_one()
+
+            overflow = count - self.max_rows
+            if overflow > 0:
+                last_used = func.coalesce(GenerationCacheEntry.last_hit_at, GenerationCacheEntry.created_at)
+                victims = (await session.execute(
+                    select(GenerationCacheEntry.key).order_by(last_used).limit(overflow)
+                )).scalars().all()
+                result = await session.execute(
+                    delete(GenerationCacheEntry).where(GenerationCacheEntry.key.in_(victims))
+                )
+                removed += result.rowcount or 0
+
+            await session.commit()
+
+        if removed:
+            print(f"🧹 Pruned {removed} generation cache entries")
+        return removed
+
+
+# 全局生成缓存
+generation_cache = GenerationCache()
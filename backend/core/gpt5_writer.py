@@ -4,12 +4,44 @@
 """
 
 import os
-from typing import Dict, Any
-import httpx
+import json
+import time
+import asyncio
+from typing import Dict, List, Any, Optional, Callable, Awaitable
 from dotenv import load_dotenv
 
+from .http_client import get_client, APICORE_BASE, IncompleteStreamError
+from .research_compactor import compact_research, estimate_tokens
+from .sections import (
+    build_outline_prompt,
+    parse_outline,
+    build_section_prompt,
+    normalize_section,
+    stitch_sections
+)
+
 load_dotenv()
 
+# 流式生成配置
+GPT5_STREAM = os.getenv("GPT5_STREAM", "true").lower() == "true"
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "2.0"))  # 秒
+
+# 长文分段生成：先出大纲，再并发生成各章节
+SECTIONED_TIERS = set(t.strip() for t in os.getenv("SECTIONED_TIERS", "C,D").split(",") if t.strip())
+SECTION_CONCURRENCY = int(os.getenv("SECTION_CONCURRENCY", "4"))
+SECTION_WORDS = int(os.getenv("SECTION_WORDS", "1200"))  # 每章目标字数，决定章节数上限
+
+# 字数档位对应
+TIER_WORDS = {
+    "A": 2500,
+    "B": 4000,
+    "C": 6500,
+    "D": 10000
+}
+
+# 部分内容回调：(当前 markdown, 完成比例 0~1)
+PartialCallback = Callable[[str, float], Awaitable[None]]
+
 
 class GPT5Writer:
     """GPT5 文章生成器（通过 APICore）"""
@@ -20,8 +52,11 @@ class GPT5Writer:
         if not self.api_key:
             print("⚠️  GPT5_API_KEY 未设置，API 调用将失败")
             print("   请在 Railway 上添加 GPT5_API_KEY 环境变量")
-        self.api_base = "https://api.apicore.ai/v1"
+        self.api_base = APICORE_BASE
         self.model = "gpt-5"
+        self.temperature = 0.7
+        self.max_tokens = 8192
+        self.stream = GPT5_STREAM
         if self.api_key:
             print("✅ 使用 GPT5 (APICore) 生成文章")
 
@@ -29,7 +64,8 @@ class GPT5Writer:
         self,
         topic: str,
         tier: str,
-        research_data: Dict[str, Any]
+        research_data: Dict[str, Any],
+        on_partial: Optional[PartialCallback] = None
     ) -> Dict[str, Any]:
         """
         使用 GPT5 生成文章
@@ -38,27 +74,26 @@ class GPT5Writer:
             topic: 文章主题
             tier: 字数档位
             research_data: 调研数据
+            on_partial: 流式模式下的部分内容回调（已节流）
 
         Returns:
             文章内容
         """
-        # 字数档位对应
-        tier_words = {
-            "A": 2500,
-            "B": 4000,
-            "C": 6500,
-            "D": 10000
-        }
-
-        target_words = tier_words.get(tier, 4000)
+        target_words = TIER_WORDS.get(tier, 4000)
 
-        # 构建提示词
-        prompt = self._build_prompt(topic, target_words, research_data)
+        # 压缩调研数据，构建提示词
+        research_block = compact_research(research_data, topic, tier)
+        prompt = self._build_prompt(topic, target_words, research_block)
 
-        print(f"✍️  GPT5 生成文章: {topic} ({tier}档, 约{target_words}字)")
+        print(f"✍️  GPT5 生成文章: {topic} ({tier}档, 约{target_words}字, 提示词 ~{estimate_tokens(prompt)} tokens)")
 
         try:
-            content = await self._generate_with_gpt5(prompt)
+            if tier in SECTIONED_TIERS:
+                content = await self._generate_sectioned(topic, target_words, research_block, on_partial)
+            elif self.stream:
+                content = await self._stream_with_gpt5(prompt, target_words, on_partial)
+            else:
+                content = await self._generate_with_gpt5(prompt)
 
             return {
                 "title": topic,
@@ -70,11 +105,21 @@ class GPT5Writer:
             print(f"❌ GPT5 生成失败: {e}")
             raise e
 
+    def build_prompt(
+        self,
+        topic: str,
+        tier: str,
+        research_data: Dict[str, Any]
+    ) -> str:
+        """按档位构建提示词（同时用于生成缓存键）"""
+        research_block = compact_research(research_data, topic, tier, log=False)
+        return self._build_prompt(topic, TIER_WORDS.get(tier, 4000), research_block)
+
     def _build_prompt(
         self,
         topic: str,
         target_words: int,
-        research_data: Dict[str, Any]
+        research_block: str
     ) -> str:
         """构建提示词"""
         return f"""请基于以下调研结果，撰写一篇关于"{topic}"的深度文章。
@@ -88,7 +133,7 @@ class GPT5Writer:
 4. 有节制：克制煽情，理性客观
 
 **调研参考**：
-{research_data}
+{research_block}
 
 **输出要求**：
 - 使用 Markdown 格式
@@ -99,7 +144,58 @@ class GPT5Writer:
 
 请开始撰写文章。"""
 
-    async def _generate_with_gpt5(self, prompt: str) -> str:
+    async def _generate_sectioned(
+        self,
+        topic: str,
+        target_words: int,
+        research_block: str,
+        on_partial: Optional[PartialCallback] = None
+    ) -> str:
+        """
+        分段生成长文：大纲 -> 并发生成章节 -> 规范化标题、拼接去重
+
+        总耗时取决于最长的章节而不是全文长度；大纲无法解析时退回单次生成
+        """
+        max_sections = max(4, target_words // SECTION_WORDS)
+        outline_text = await self._generate_with_gpt5(
+            build_outline_prompt(topic, target_words, research_block, max_sections),
+            max_tokens=1024
+        )
+        outline = parse_outline(outline_text, max_sections)
+        if len(outline) < 2:
+            print("⚠️  大纲解析失败，退回单次生成")
+            return await self._generate_with_gpt5(self._build_prompt(topic, target_words, research_block))
+
+        print(f"🧩 分段生成: {len(outline)} 章, 并发 {SECTION_CONCURRENCY}")
+
+        section_words = max(target_words // len(outline), 300)
+        semaphore = asyncio.Semaphore(SECTION_CONCURRENCY)
+        sections: List[Optional[str]] = [None] * len(outline)
+        lock = asyncio.Lock()
+
+        async def write_section(index: int):
+            prompt = build_section_prompt(topic, outline, index, section_words, research_block)
+            async with semaphore:
+                text = await self._generate_with_gpt5(prompt)
+            sections[index] = normalize_section(outline[index]["title"], text)
+
+            if on_partial:
+                async with lock:
+                    done = [section for section in sections if section is not None]
+                    await on_partial(stitch_sections(topic, done), len(done) / len(outline))
+
+        # 任一章节失败时取消其余章节，不再继续消耗额度
+        tasks = [asyncio.create_task(write_section(i)) for i in range(len(outline))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return stitch_sections(topic, sections)
+
+    async def _generate_with_gpt5(self, prompt: str, max_tokens: Optional[int] = None) -> str:
         """使用 GPT5 API 生成"""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -114,22 +210,104 @@ class GPT5Writer:
                     "content": prompt
                 }
             ],
-            "temperature": 0.7,
-            "max_tokens": 8192,
+            "temperature": self.temperature,
+            "max_tokens": max_tokens or self.max_tokens,
             "stream": False
         }
 
-        # 增加超时时间（生成文章需要较长时间）
-        timeout = httpx.Timeout(300.0)  # 5 分钟
+        # 使用共享连接池（超时在 http_client 中配置，默认 5 分钟）
+        client = get_client("apicore")
+        response = await client.post(
+            "/chat/completions",
+            headers=headers,
+            json=data
+        )
+        response.raise_for_status()
+        result = response.json()
 
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                f"{self.api_base}/chat/completions",
+        # 返回生成的内容
+        return result["choices"][0]["message"]["content"]
+
+    async def _stream_with_gpt5(
+        self,
+        prompt: str,
+        target_words: int,
+        on_partial: Optional[PartialCallback] = None
+    ) -> str:
+        """
+        使用 GPT5 API 流式生成（SSE）
+
+        按 STREAM_FLUSH_INTERVAL 节流回调部分内容，进度按已接收字数 / 目标字数估算。
+        中途出错时先回调一次已接收内容再抛出，避免半成品丢失。
+        没有收到 [DONE] 或 finish_reason=stop 就结束的流视为被截断，抛出 IncompleteStreamError，
+        半成品不会作为结果返回（也就不会进入生成缓存）。
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream"
+        }
+
+        data = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stream": True
+        }
+
+        parts = []
+        received = 0
+        finished = False
+        last_flush = time.monotonic()
+
+        def progress() -> float:
+            return min(received / max(target_words, 1), 1.0)
+
+        client = get_client("apicore")
+        try:
+            async with client.stream(
+                "POST",
+                "/chat/completions",
                 headers=headers,
                 json=data
-            )
-            response.raise_for_status()
-            result = response.json()
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        finished = True
+                        break
+
+                    chunk = json.loads(payload)
+                    choices = chunk.get("choices") or []
+                    if choices and choices[0].get("finish_reason") == "stop":
+                        finished = True
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if not delta:
+                        continue
+
+                    parts.append(delta)
+                    received += len(delta)
+
+                    now = time.monotonic()
+                    if on_partial and now - last_flush >= STREAM_FLUSH_INTERVAL:
+                        last_flush = now
+                        await on_partial("".join(parts), progress())
+
+            if not finished:
+                raise IncompleteStreamError(f"流式响应在完成前中断（已接收 {received} 字）")
+
+        except Exception:
+            if on_partial and parts:
+                await on_partial("".join(parts), progress())
+            raise
 
-            # 返回生成的内容
-            return result["choices"][0]["message"]["content"]
+        return "".join(parts)
@@ -0,0 +1,153 @@
+"""
+共享 HTTP 客户端
+按 provider 维护进程级连接池，复用 TCP/TLS 连接
+"""
+
+import os
+import asyncio
+from typing import Dict, Optional
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# APICore 基础地址（GPT5Writer / GeminiWriter 共用）
+APICORE_BASE = "https://api.apicore.ai/v1"
+
+# 连接池配置
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "300"))  # 生成文章需要较长时间
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# 已注册的 provider -> base_url
+PROVIDERS = {
+    "apicore": APICORE_BASE,
+    "research": "",  # 调研来源使用完整 URL
+}
+
+# 进程级客户端注册表
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+# 后台预热任务
+_warm_task: Optional[asyncio.Task] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要安装 h2（httpx[http2]）"""
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _build_client(base_url: str) -> httpx.AsyncClient:
+    """创建带连接池的客户端"""
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(
+        base_url=base_url,
+        limits=limits,
+        timeout=timeout,
+        http2=_http2_available()
+    )
+
+
+def get_client(provider: str = "apicore") -> httpx.AsyncClient:
+    """
+    获取 provider 对应的共享客户端
+
+    未在 lifespan 中初始化时（如脚本直接调用）按需创建
+
+    Args:
+        provider: provider 名称
+
+    Returns:
+        共享的 httpx.AsyncClient
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        base_url = PROVIDERS.get(provider)
+        if base_url is None:
+            raise ValueError(f"未知的 provider: {provider}")
+        client = _build_client(base_url)
+        _clients[provider] = client
+    return client
+
+
+class IncompleteStreamError(httpx.RemoteProtocolError):
+    """流式响应在 [DONE] 或 finish_reason=stop 之前结束（连接被截断），按临时错误重试"""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """
+    是否为值得重试的临时错误：超时、连接错误、429 和 5xx
+
+    沿 __cause__ 检查，路由等包装后的异常同样适用
+    """
+    while exc is not None:
+        if isinstance(exc, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError)):
+            return True
+        if isinstance(exc, httpx.HTTPStatusError):
+            code = exc.response.status_code
+            return code == 429 or code >= 500
+        exc = exc.__cause__
+    return False
+
+
+async def _warm_up(provider: str, client: httpx.AsyncClient):
+    """预热：提前建立连接，失败不影响启动"""
+    try:
+        await client.get("/models", timeout=5.0)
+    except Exception as e:
+        print(f"⚠️  {provider} 连接预热失败: {e}")
+
+
+async def _warm_all(clients: Dict[str, httpx.AsyncClient]):
+    """并发预热所有客户端"""
+    await asyncio.gather(*(_warm_up(provider, client) for provider, client in clients.items()))
+
+
+async def init_http_clients(warm: Optional[bool] = None):
+    """
+    初始化所有 provider 客户端（在 lifespan 中调用）
+
+    预热在后台并发进行，不阻塞启动
+    """
+    global _warm_task
+    if warm is None:
+        warm = os.getenv("HTTP_WARMUP", "true").lower() == "true"
+
+    to_warm = {}
+    for provider in PROVIDERS:
+        client = get_client(provider)
+        if warm and PROVIDERS[provider]:
+            to_warm[provider] = client
+
+    if to_warm and _warm_task is None:
+        _warm_task = asyncio.create_task(_warm_all(to_warm))
+
+    print(f"✅ HTTP clients initialized (http2={_http2_available()}, max_connections={HTTP_MAX_CONNECTIONS})")
+
+
+async def close_http_clients():
+    """关闭所有客户端（在 lifespan 关闭时调用），先取消未完成的预热"""
+    global _warm_task
+    if _warm_task is not None:
+        _warm_task.cancel()
+        await asyncio.gather(_warm_task, return_exceptions=True)
+        _warm_task = None
+    for client in _clients.values():
+        if not client.is_closed:
+            await client.aclose()
+    _clients.clear()
+    print("✅ HTTP clients closed")
@@ -0,0 +1,398 @@
+"""
+持久化任务队列
+基于 jobs 表实现认领/租约/心跳，配合有界 worker 池执行文章生成
+"""
+
+import os
+import socket
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+from sqlalchemy import select, update, func
+from dotenv import load_dotenv
+
+from .database import Job, Article, async_session
+from .job_state import job_states
+from .metrics import JOBS_IN_FLIGHT
+
+load_dotenv()
+
+# 队列配置
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # 每个进程的并发 worker 数
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "20"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2.0"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# 任务处理函数：handler(article_id, lease_owner=..., **payload)，抛出异常表示任务失败
+JobHandler = Callable[..., Awaitable[None]]
+
+
+class JobQueue:
+    """基于数据库的任务队列"""
+
+    def __init__(self):
+        """初始化"""
+        # 同进程入队时唤醒空闲 worker，避免等待轮询
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(self, job_id: str, payload: Dict[str, Any]):
+        """入队"""
+        async with async_session() as session:
+            now = datetime.utcnow()
+            session.add(Job(
+                id=job_id,
+                payload=payload,
+                status="queued",
+                attempts=0,
+                created_at=now,
+                updated_at=now
+            ))
+            await session.commit()
+        self._wakeup.set()
+        print(f"✅ Enqueued job {job_id}")
+
+    async def requeue(self, job_id: str, legacy_payload: Dict[str, Any]) -> Optional[bool]:
+        """
+        重试失败的文章：把文章重置为 pending 并重新排队任务，尝试次数清零，沿用原任务的参数
+
+        两步在同一事务中提交，任一步失败都整体回滚，文章不会停在没有任务的 pending；
+        检查点保留，重试从最后完成的阶段继续
+
+        Args:
+            job_id: 任务 ID（即文章 ID）
+            legacy_payload: 没有任务记录（队列上线前创建的文章）时使用的参数
+
+        Returns:
+            True 已重新排队；False 上一次执行还没有完全结束（任务仍在排队或执行中）；
+            None 文章不存在或不是失败状态
+        """
+        async with async_session() as session:
+            now = datetime.utcnow()
+            reset = await session.execute(
+                update(Article)
+                .where(Article.id == job_id, Article.status == "failed")
+                .values(status="pending", progress=0, error=None, completed_at=None)
+            )
+            if reset.rowcount == 0:
+                return None
+
+            result = await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status.in_(("done", "failed")))
+                .values(status="queued", attempts=0, error=None, updated_at=now)
+            )
+            if result.rowcount == 0:
+                if await session.get(Job, job_id) is not None:
+                    await session.rollback()
+                    return False
+                # 队列上线前创建的文章没有任务记录
+                session.add(Job(
+                    id=job_id,
+                    payload=legacy_payload,
+                    status="queued",
+                    attempts=0,
+                    created_at=now,
+                    updated_at=now
+                ))
+            await session.commit()
+        self._wakeup.set()
+        print(f"♻️  Requeued job {job_id}")
+        return True
+
+    async def claim(self, owner: str) -> Optional[Job]:
+        """
+        原子认领一个排队中的任务
+
+        先选出候选，再用带 status 条件的 UPDATE 抢占（CAS），
+        rowcount 为 1 才算认领成功，多 worker/多进程并发安全。
+        """
+        async with async_session() as session:
+            result = await session.execute(
+                select(Job.id)
+                .where(Job.status == "queued")
+                .order_by(Job.created_at)
+                .limit(JOB_WORKERS)
+            )
+            candidates = result.scalars().all()
+
+            for job_id in candidates:
+                now = datetime.utcnow()
+                claimed = await session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(
+                        status="running",
+                        attempts=Job.attempts + 1,
+                        lease_owner=owner,
+                        lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                        heartbeat_at=now,
+                        updated_at=now
+                    )
+                )
+                await session.commit()
+                if claimed.rowcount == 1:
+                    job = await session.get(Job, job_id)
+                    return job
+
+        return None
+
+    async def heartbeat(self, job_id: str, owner: str) -> bool:
+        """续约，返回 False 表示租约已丢失"""
+        async with async_session() as session:
+            now = datetime.utcnow()
+            result = await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.lease_owner == owner, Job.status == "running")
+                .values(
+                    lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                    heartbeat_at=now
+                )
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def complete(self, job_id: str, owner: str) -> bool:
+        """标记完成（仍持有租约时才生效）"""
+        return await self._finish(job_id, owner, "done")
+
+    async def fail(self, job_id: str, owner: str, error: str) -> bool:
+        """标记失败（仍持有租约时才生效）"""
+        return await self._finish(job_id, owner, "failed", error)
+
+    async def release(self, job_id: str, owner: str):
+        """释放租约并放回队列（worker 正常关闭时调用）"""
+        async with async_session() as session:
+            await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.lease_owner == owner, Job.status == "running")
+                .values(
+                    status="queued",
+                    attempts=Job.attempts - 1,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    updated_at=datetime.utcnow()
+                )
+            )
+            await session.commit()
+        print(f"↩️  Released job {job_id}")
+
+    async def _finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None) -> bool:
+        """
+        结束任务
+
+        Returns:
+            False 表示租约已丢失（任务已被回收或由其他 worker 接管），未修改
+        """
+        async with async_session() as session:
+            result = await session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.lease_owner == owner, Job.status == "running")
+                .values(
+                    status=status,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    error=error,
+                    updated_at=datetime.utcnow()
+                )
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def requeue_expired(self) -> int:
+        """
+        回收租约过期的任务（worker 崩溃/重新部署）
+
+        未超过最大尝试次数的重新排队，文章状态重置为 pending；
+        否则任务和文章都标记为失败。
+
+        Returns:
+            重新排队的任务数
+        """
+        async with async_session() as session:
+            now = datetime.utcnow()
+            result = await session.execute(
+                select(Job.id, Job.attempts)
+                .where(Job.status == "running", Job.lease_expires_at < now)
+            )
+            expired = result.all()
+            if not expired:
+                return 0
+
+            retry_ids: List[str] = [job_id for job_id, attempts in expired if attempts < JOB_MAX_ATTEMPTS]
+            dead_ids: List[str] = [job_id for job_id, attempts in expired if attempts >= JOB_MAX_ATTEMPTS]
+
+            if retry_ids:
+                await session.execute(
+                    update(Job)
+                    .where(Job.id.in_(retry_ids), Job.status == "running", Job.lease_expires_at < now)
+                    .values(status="queued", lease_owner=None, lease_expires_at=None, updated_at=now)
+                )
+                await session.execute(
+                    update(Article)
+                    .where(Article.id.in_(retry_ids))
+                    .values(status="pending", progress=0)
+                )
+
+            if dead_ids:
+                error = f"任务执行中断超过 {JOB_MAX_ATTEMPTS} 次"
+                await session.execute(
+                    update(Job)
+                    .where(Job.id.in_(dead_ids), Job.status == "running", Job.lease_expires_at < now)
+                    .values(status="failed", lease_owner=None, lease_expires_at=None, error=error, updated_at=now)
+                )
+                await session.execute(
+                    update(Article)
+                    .where(Article.id.in_(dead_ids))
+                    .values(status="failed", error=error)
+                )
+
+            await session.commit()
+
+        for job_id in retry_ids:
+            job_states.update(job_id, status="pending", progress=0)
+        for job_id in dead_ids:
+            job_states.update(job_id, status="failed", error=error)
+
+        if retry_ids:
+            self._wakeup.set()
+            print(f"♻️  Requeued {len(retry_ids)} expired jobs")
+        if dead_ids:
+            print(f"❌ Gave up on {len(dead_ids)} jobs after {JOB_MAX_ATTEMPTS} attempts")
+        return len(retry_ids)
+
+    async def counts(self) -> Dict[str, int]:
+        """排队中和执行中的任务数"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(Job.status, func.count())
+                .where(Job.status.in_(("queued", "running")))
+                .group_by(Job.status)
+            )
+            counts = {"queued": 0, "running": 0}
+            counts.update({status: count for status, count in result.all()})
+            return counts
+
+    async def wait_for_work(self, timeout: float):
+        """等待入队通知或超时"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+
+class WorkerPool:
+    """有界 worker 池"""
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        queue: Optional[JobQueue] = None,
+        concurrency: int = JOB_WORKERS
+    ):
+        """
+        Args:
+            handler: 任务处理函数 handler(article_id, **payload)
+            queue: 任务队列（默认全局队列）
+            concurrency: worker 数
+        """
+        self.handler = handler
+        self.queue = queue or job_queue
+        self.concurrency = concurrency
+        self.owner_prefix = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self.in_flight = 0
+
+    async def start(self):
+        """回收过期任务并启动 worker"""
+        await self.queue.requeue_expired()
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(f"{self.owner_prefix}:{i}"))
+            for i in range(self.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._reaper_loop()))
+        print(f"✅ Worker pool started ({self.concurrency} workers)")
+
+    async def stop(self):
+        """停止 worker，正在执行的任务释放回队列"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        print("✅ Worker pool stopped")
+
+    async def _worker_loop(self, owner: str):
+        """单个 worker：认领 -> 执行（带心跳） -> 结束"""
+        while not self._stopping:
+            try:
+                job = await self.queue.claim(owner)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Claim error: {e}")
+                job = None
+
+            if job is None:
+                await self.queue.wait_for_work(JOB_POLL_INTERVAL)
+                continue
+
+            await self._run(job, owner)
+
+    async def _run(self, job: Job, owner: str):
+        """执行一个任务（租约丢失时取消处理函数，避免与接管的 worker 重复生成）"""
+        task = asyncio.create_task(self.handler(job.id, lease_owner=owner, **job.payload))
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job.id, owner, task))
+        self.in_flight += 1
+        JOBS_IN_FLIGHT.inc()
+        try:
+            await task
+            await self.queue.complete(job.id, owner)
+        except asyncio.CancelledError:
+            if heartbeat.done() and not heartbeat.cancelled() and heartbeat.result():
+                # 租约丢失导致的取消：任务已归其他 worker，不再修改任务行
+                print(f"⚠️  Abandoned job {job.id} after losing its lease")
+                return
+            await asyncio.shield(self.queue.release(job.id, owner))
+            raise
+        except Exception as e:
+            print(f"❌ Job {job.id} failed: {e}")
+            await self.queue.fail(job.id, owner, str(e))
+        finally:
+            self.in_flight -= 1
+            JOBS_IN_FLIGHT.dec()
+            heartbeat.cancel()
+
+    async def _heartbeat_loop(self, job_id: str, owner: str, task: asyncio.Task) -> bool:
+        """
+        定期续约，租约丢失时取消处理任务
+
+        Returns:
+            True 表示租约已丢失
+        """
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                if not await self.queue.heartbeat(job_id, owner):
+                    print(f"⚠️  Lost lease on job {job_id}, cancelling")
+                    task.cancel()
+                    return True
+            except Exception as e:
+                print(f"⚠️  Heartbeat error for job {job_id}: {e}")
+
+    async def _reaper_loop(self):
+        """定期回收其他 worker 遗留的过期任务"""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS)
+            try:
+                await self.queue.requeue_expired()
+            except Exception as e:
+                print(f"⚠️  Requeue error: {e}")
+
+
+# 全局任务队列
+job_queue = JobQueue()
@@ -0,0 +1,126 @@
+"""
+任务状态注册表
+流水线在写数据库的同时更新内存中的任务状态，本进程正在执行的任务的状态查询直接走内存。
+其他进程执行的任务收不到更新，只短暂缓存（刚创建时的 pending），之后回退到数据库。
+失败的任务可能被任一进程重试，同样只短暂缓存；只有本进程完成的任务长时间缓存
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 本进程完成的任务在内存中保留的时间（秒），之后回退到数据库
+JOB_STATE_TTL = float(os.getenv("JOB_STATE_TTL", "300"))
+# 其他进程的任务、失败的任务在内存中保留的时间（秒）
+JOB_STATE_REMOTE_TTL = float(os.getenv("JOB_STATE_REMOTE_TTL", "2"))
+JOB_STATE_MAX_ENTRIES = int(os.getenv("JOB_STATE_MAX_ENTRIES", "10000"))
+
+# 状态接口返回的字段
+STATUS_FIELDS = ("id", "topic", "tier", "status", "progress", "created_at", "completed_at", "error")
+
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+class JobStateRegistry:
+    """进程内任务状态表"""
+
+    def __init__(
+        self,
+        ttl: float = JOB_STATE_TTL,
+        remote_ttl: float = JOB_STATE_REMOTE_TTL,
+        max_entries: int = JOB_STATE_MAX_ENTRIES
+    ):
+        """初始化"""
+        self.ttl = ttl
+        self.remote_ttl = remote_ttl
+        self.max_entries = max_entries
+        # article_id -> (过期时间 或 None 表示本进程执行中, 状态, 是否本进程执行)
+        self._states: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def track(self, state: Dict[str, Any], owned: bool = False):
+        """
+        登记任务的完整状态
+
+        Args:
+            state: 至少包含 STATUS_FIELDS 中的字段
+            owned: 是否由本进程执行（worker 开始执行时为 True；创建、重试时为 False，
+                   此时只保留 remote_ttl 秒，避免读到其他进程执行的任务的过时状态）
+        """
+        entry = {field: state.get(field) for field in STATUS_FIELDS}
+        self._states[entry["id"]] = (self._expiry(entry["status"], owned), entry, owned)
+        self._states.move_to_end(entry["id"])
+        self._evict()
+
+    def update(self, article_id: str, **fields):
+        """合并更新已登记任务的状态（未登记的忽略）"""
+        item = self._states.get(article_id)
+        if item is None:
+            return
+        _, current, owned = item
+        entry = {**current, **{k: v for k, v in fields.items() if k in STATUS_FIELDS and v is not None}}
+        self._states[article_id] = (self._expiry(entry["status"], owned), entry, owned)
+
+    def disown(self, article_id: str):
+        """本进程不再执行该任务（结束、取消或丢失租约），未结束的状态改为短暂保留"""
+        item = self._states.get(article_id)
+        if item is None:
+            return
+        expires_at, entry, _ = item
+        if entry["status"] not in TERMINAL_STATUSES:
+            expires_at = self._expiry(entry["status"], False)
+        self._states[article_id] = (expires_at, entry, False)
+
+    def get(self, article_id: str) -> Optional[Dict[str, Any]]:
+        """读取状态，未登记或已过期返回 None"""
+        item = self._states.get(article_id)
+        if item is None:
+            return None
+        expires_at, entry, _ = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._states[article_id]
+            return None
+        return dict(entry)
+
+    def get_many(self, article_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量读取，只返回命中的"""
+        found = {}
+        for article_id in article_ids:
+            state = self.get(article_id)
+            if state is not None:
+                found[article_id] = state
+        return found
+
+    def active_count(self) -> int:
+        """本进程正在执行的任务数"""
+        return sum(1 for expires_at, _, _ in self._states.values() if expires_at is None)
+
+    def _expiry(self, status: Optional[str], owned: bool) -> Optional[float]:
+        """
+        本进程执行中的任务不过期；本进程完成的任务保留 ttl 秒；其余保留 remote_ttl 秒
+
+        其他进程登记的结束状态可能已经过时，失败的任务随时可能在其他进程被重试，
+        长时间缓存会在重试后继续返回 failed
+        """
+        if owned and status == "completed":
+            return time.monotonic() + self.ttl
+        if owned and status not in TERMINAL_STATUSES:
+            return None
+        return time.monotonic() + self.remote_ttl
+
+    def _evict(self):
+        """超出容量时优先淘汰最早登记的已结束任务"""
+        if len(self._states) <= self.max_entries:
+            return
+        for article_id, (expires_at, _, _) in list(self._states.items()):
+            if len(self._states) <= self.max_entries:
+                break
+            if expires_at is not None:
+                del self._states[article_id]
+
+
+# 全局任务状态表
+job_states = JobStateRegistry()
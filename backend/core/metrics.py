@@ -0,0 +1,195 @@
+"""
+Prometheus 指标
+流水线阶段、写作提供方、任务队列、数据库和 HTTP 请求的延迟与计数，在 /metrics 以文本格式暴露。
+多个 uvicorn worker 时设置 PROMETHEUS_MULTIPROC_DIR，各进程写入该目录，抓取时汇总
+"""
+
+import os
+import time
+from typing import Any, Tuple
+from dotenv import load_dotenv
+
+# prometheus_client 导入时读取 PROMETHEUS_MULTIPROC_DIR，须先加载 .env
+load_dotenv()
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true" and prometheus_client is not None
+# 多进程模式目录（每次部署启动前需清空）
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
+# 延迟分桶（秒）
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _NoopMetric:
+    """未安装 prometheus_client 或关闭指标时的空实现"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float):
+        pass
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+
+def _metric(kind: str, name: str, documentation: str, labels: Tuple[str, ...] = (), **kwargs) -> Any:
+    if not METRICS_ENABLED:
+        return _NoopMetric()
+    cls = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}[kind]
+    return cls(name, documentation, labels, **kwargs)
+
+
+# 流水线阶段（outcome: ok / error / cancelled）
+STAGE_DURATION = _metric(
+    "histogram", "aiwriter_stage_duration_seconds", "流水线阶段耗时（含重试）",
+    ("stage", "outcome"), buckets=STAGE_BUCKETS
+)
+
+# 写作提供方
+PROVIDER_DURATION = _metric(
+    "histogram", "aiwriter_provider_request_duration_seconds", "写作提供方单次调用耗时",
+    ("provider", "tier", "outcome"), buckets=STAGE_BUCKETS
+)
+PROVIDER_REQUESTS = _metric(
+    "counter", "aiwriter_provider_requests_total", "写作提供方调用次数",
+    ("provider", "outcome")
+)
+PROVIDER_TOKENS = _metric(
+    "counter", "aiwriter_provider_tokens_total", "写作提供方 token 数（按字符估算）",
+    ("provider", "direction")
+)
+
+# 任务队列（抓取时由 /metrics 从数据库读取并设置）
+QUEUE_JOBS = _metric(
+    "gauge", "aiwriter_queue_jobs", "队列中的任务数",
+    ("state",), multiprocess_mode="livemostrecent"
+)
+JOBS_IN_FLIGHT = _metric(
+    "gauge", "aiwriter_jobs_in_flight", "本进程 worker 正在执行的任务数（多进程时求和）",
+    multiprocess_mode="livesum"
+)
+
+# PDF（只计实际渲染，磁盘文件命中不计）
+PDF_RENDERS = _metric("counter", "aiwriter_pdf_renders_total", "PDF 实际渲染次数")
+
+# 数据库
+DB_QUERY_DURATION = _metric(
+    "histogram", "aiwriter_db_query_duration_seconds", "单条 SQL 执行耗时",
+    ("operation",), buckets=DB_BUCKETS
+)
+DB_SESSION_DURATION = _metric(
+    "histogram", "aiwriter_db_session_duration_seconds", "连接从连接池取出到归还的时间（一次会话）",
+    buckets=DB_BUCKETS
+)
+
+# HTTP（route 为路由模板，避免文章 ID 撑爆标签）
+HTTP_DURATION = _metric(
+    "histogram", "aiwriter_http_request_duration_seconds", "HTTP 请求耗时（到响应体发送完毕）",
+    ("method", "route", "status"), buckets=HTTP_BUCKETS
+)
+
+
+def instrument_engine(engine):
+    """
+    给 SQLAlchemy 引擎挂上计时事件
+
+    Args:
+        engine: AsyncEngine 或同步 Engine
+    """
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_started")
+        if started:
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+            DB_QUERY_DURATION.labels(operation).observe(time.perf_counter() - started.pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            DB_QUERY_DURATION.labels("ERROR").observe(time.perf_counter() - started.pop())
+
+    @event.listens_for(sync_engine.pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out"] = time.perf_counter()
+
+    @event.listens_for(sync_engine.pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("checked_out", None)
+        if started is not None:
+            DB_SESSION_DURATION.observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """按路由模板记录 HTTP 请求耗时（ASGI 中间件，流式响应计到最后一块发送完）"""
+
+    def __init__(self, app):
+        """初始化"""
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_DURATION.labels(scope["method"], route, str(status)).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    生成 Prometheus 文本格式
+
+    Returns:
+        (内容, Content-Type)
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """进程退出时清理多进程模式下的 live* 指标文件"""
+    if METRICS_ENABLED and PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
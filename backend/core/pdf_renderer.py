@@ -0,0 +1,280 @@
+"""
+PDF 渲染
+在进程池中用 reportlab 把 Markdown 排版成 PDF，结果按内容哈希写入磁盘目录，重复下载直接复用文件
+"""
+
+import os
+import re
+import uuid
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+import aiofiles
+from dotenv import load_dotenv
+
+from .metrics import PDF_RENDERS
+
+load_dotenv()
+
+# PDF 渲染进程数
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+# PDF 产物目录（按内容哈希寻址）
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "./data/pdf")
+# 中文字体（reportlab 内置 CID 字体，无需额外字体文件）
+PDF_FONT = os.getenv("PDF_FONT", "STSong-Light")
+
+
+def _escape(text: str) -> str:
+    """转义 reportlab Paragraph 的标记字符"""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+# 行内代码、链接（只保留文字）、加粗/斜体标记
+_INLINE_TOKEN = re.compile(r"`([^`]+)`|\[([^\]]+)\]\([^)]+\)|\*{1,3}")
+
+
+def _inline(text: str) -> str:
+    """
+    行内 Markdown：加粗、斜体、行内代码、链接
+
+    加粗/斜体标记按栈配对：遇到同类开标记就闭合，夹在中间还没配对的标记按原文输出，
+    生成的标签总是正确嵌套（交错的 **a *b** c* 不会产生 reportlab 无法解析的标签）
+    """
+    # 输出片段：已转义的文本，或 int 表示 markers 中的标记
+    parts: List = []
+    # [标签, "open"/"close"/None（未配对，按原文输出）]
+    markers: List[list] = []
+    stack: List[int] = []
+    pos = 0
+    for match in _INLINE_TOKEN.finditer(text):
+        parts.append(_escape(text[pos:match.start()]))
+        pos = match.end()
+        literal = match.group(1) if match.group(1) is not None else match.group(2)
+        if literal is not None:
+            parts.append(_escape(literal))
+            continue
+
+        token = match.group(0)
+        if token == "***":
+            # 加粗 + 斜体：闭合时先关内层的斜体
+            tags = ["i", "b"] if stack and markers[stack[-1]][0] == "i" else ["b", "i"]
+        else:
+            tags = ["b"] if token == "**" else ["i"]
+        for tag in tags:
+            index = len(markers)
+            markers.append([tag, None])
+            parts.append(index)
+            opener = next((depth for depth in range(len(stack) - 1, -1, -1) if markers[stack[depth]][0] == tag), None)
+            if opener is None:
+                stack.append(index)
+            else:
+                markers[stack[opener]][1] = "open"
+                markers[index][1] = "close"
+                del stack[opener:]
+    parts.append(_escape(text[pos:]))
+
+    out = []
+    for part in parts:
+        if isinstance(part, str):
+            out.append(part)
+            continue
+        tag, role = markers[part]
+        if role == "open":
+            out.append(f"<{tag}>")
+        elif role == "close":
+            out.append(f"</{tag}>")
+        else:
+            out.append("**" if tag == "b" else "*")
+    return "".join(out)
+
+
+def render_pdf_bytes(title: str, markdown: str, font: str = PDF_FONT) -> bytes:
+    """
+    Markdown 排版为 PDF（在子进程中执行）
+
+    只支持文章里用到的子集：标题、段落、列表、引用、代码块、图片（以链接文字呈现）
+
+    Args:
+        title: 文章标题（写入 PDF 元数据）
+        markdown: Markdown 正文
+        font: 字体名
+
+    Returns:
+        PDF 文件内容
+    """
+    from io import BytesIO
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Preformatted
+
+    if font not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(UnicodeCIDFont(font))
+
+    base = getSampleStyleSheet()
+    styles = {
+        "h1": ParagraphStyle("h1", parent=base["Heading1"], fontName=font, leading=28),
+        "h2": ParagraphStyle("h2", parent=base["Heading2"], fontName=font, leading=22),
+        "h3": ParagraphStyle("h3", parent=base["Heading3"], fontName=font, leading=18),
+        "body": ParagraphStyle("body", parent=base["BodyText"], fontName=font, fontSize=11, leading=18, wordWrap="CJK"),
+        "quote": ParagraphStyle("quote", parent=base["BodyText"], fontName=font, fontSize=11, leading=18,
+                                leftIndent=8 * mm, textColor="#555555", wordWrap="CJK"),
+        "code": ParagraphStyle("code", parent=base["Code"], fontName=font, fontSize=9, leading=13),
+    }
+
+    story = []
+    paragraph: List[str] = []
+    code: Optional[List[str]] = None
+
+    def inline_paragraph(text: str, style, prefix: str = "") -> Paragraph:
+        try:
+            return Paragraph(prefix + _inline(text), style)
+        except ValueError:
+            # reportlab 仍无法解析行内标记时退回纯文本，不让整篇 PDF 失败
+            return Paragraph(prefix + _escape(text), style)
+
+    def flush_paragraph():
+        if paragraph:
+            story.append(inline_paragraph(" ".join(paragraph), styles["body"]))
+            story.append(Spacer(1, 3 * mm))
+            paragraph.clear()
+
+    for line in markdown.splitlines():
+        stripped = line.strip()
+
+        if stripped.startswith("```"):
+            if code is None:
+                flush_paragraph()
+                code = []
+            else:
+                story.append(Preformatted("\n".join(code), styles["code"]))
+                story.append(Spacer(1, 3 * mm))
+                code = None
+            continue
+        if code is not None:
+            code.append(line)
+            continue
+
+        if not stripped:
+            flush_paragraph()
+            continue
+
+        heading = re.match(r"^(#{1,6})\s+(.*)$", stripped)
+        image = re.match(r"^!\[([^\]]*)\]\(([^)]+)\)$", stripped)
+        item = re.match(r"^([-*+]|\d+[.)])\s+(.*)$", stripped)
+
+        if heading:
+            flush_paragraph()
+            level = min(len(heading.group(1)), 3)
+            story.append(inline_paragraph(heading.group(2), styles[f"h{level}"]))
+        elif image:
+            flush_paragraph()
+            story.append(Paragraph(_escape(f"[{image.group(1) or '配图'}] {image.group(2)}"), styles["quote"]))
+        elif item:
+            flush_paragraph()
+            bullet = item.group(1) if item.group(1)[0].isdigit() else "•"
+            story.append(inline_paragraph(item.group(2), styles["body"], prefix=f"{_escape(bullet)} "))
+        elif stripped.startswith(">"):
+            flush_paragraph()
+            story.append(inline_paragraph(stripped.lstrip("> "), styles["quote"]))
+        else:
+            paragraph.append(stripped)
+
+    flush_paragraph()
+    if code:
+        story.append(Preformatted("\n".join(code), styles["code"]))
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        title=title,
+        leftMargin=20 * mm,
+        rightMargin=20 * mm,
+        topMargin=20 * mm,
+        bottomMargin=20 * mm
+    )
+    doc.build(story)
+    return buffer.getvalue()
+
+
+class PDFRenderer:
+    """进程池 PDF 渲染器 + 磁盘产物缓存"""
+
+    def __init__(self, cache_dir: str = PDF_CACHE_DIR, workers: int = PDF_WORKERS):
+        """初始化"""
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 同一内容并发下载只渲染一次
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def path_for(self, digest: str) -> str:
+        """内容哈希对应的文件路径（按前两位分目录）"""
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.pdf")
+
+    async def render(self, digest: str, title: str, markdown: str) -> str:
+        """
+        获取 PDF 文件路径，磁盘上没有时在进程池中渲染
+
+        Args:
+            digest: 内容哈希
+            title: 文章标题
+            markdown: Markdown 正文
+
+        Returns:
+            PDF 文件路径
+        """
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            return path
+
+        inflight = self._inflight.get(digest)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            await self._render_to(path, title, markdown)
+            future.set_result(path)
+            return path
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(digest, None)
+
+    async def _render_to(self, path: str, title: str, markdown: str):
+        """在进程池中渲染并原子写入文件"""
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self._pool(), render_pdf_bytes, title, markdown)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再改名，其他进程不会读到写了一半的 PDF
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        async with aiofiles.open(tmp_path, "wb") as f:
+            await f.write(data)
+        os.replace(tmp_path, path)
+
+        PDF_RENDERS.inc()
+        print(f"✅ Rendered PDF {os.path.basename(path)} ({len(data)} bytes)")
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """首次渲染时才启动进程池"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局 PDF 渲染器
+pdf_renderer = PDFRenderer()
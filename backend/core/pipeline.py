@@ -0,0 +1,220 @@
+"""
+文章生成流水线
+按依赖关系声明阶段，依赖满足即并发执行，并汇总各阶段进度
+"""
+
+import time
+import asyncio
+import random
+from typing import Dict, List, Any, Optional, Callable, Awaitable, Iterable
+
+from .metrics import STAGE_DURATION
+from .tracing import span
+
+# 进度回调：(当前状态, 总进度 0~100, 各阶段状态)
+ProgressCallback = Callable[[str, int, Dict[str, str]], Awaitable[None]]
+
+# 阶段执行函数：接收已完成阶段的结果，返回本阶段结果
+StageRunner = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+# 阶段完成回调：(阶段名, 结果)，用于保存检查点
+StageCallback = Callable[[str, Any], Awaitable[None]]
+
+
+class Stage:
+    """流水线阶段"""
+
+    def __init__(
+        self,
+        name: str,
+        run: StageRunner,
+        deps: Iterable[str] = (),
+        weight: int = 0,
+        status: Optional[str] = None,
+        retries: int = 0
+    ):
+        """
+        Args:
+            name: 阶段名（结果以该名字存入 results）
+            run: 执行函数
+            deps: 依赖的阶段名
+            weight: 在总进度中占的百分点
+            status: 运行时对外展示的文章状态（默认同 name）
+            retries: 遇到临时错误时的最多重试次数
+        """
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.weight = weight
+        self.status = status or name
+        self.retries = retries
+
+
+class Pipeline:
+    """阶段 DAG 执行器"""
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        on_progress: Optional[ProgressCallback] = None,
+        base_progress: int = 0,
+        completed: Optional[Dict[str, Any]] = None,
+        on_stage_done: Optional[StageCallback] = None,
+        is_transient: Optional[Callable[[BaseException], bool]] = None,
+        retry_backoff: float = 1.0
+    ):
+        """
+        Args:
+            stages: 阶段列表（声明顺序即状态展示的优先顺序）
+            on_progress: 进度回调
+            base_progress: 起始进度
+            completed: 已有检查点的阶段结果，这些阶段直接视为完成
+            on_stage_done: 阶段完成回调
+            is_transient: 判断异常是否可重试
+            retry_backoff: 首次重试前的等待秒数（之后指数增长）
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = [stage.name for stage in stages]
+        self.on_progress = on_progress
+        self.base_progress = base_progress
+        self.on_stage_done = on_stage_done
+        self.is_transient = is_transient
+        self.retry_backoff = retry_backoff
+        self.state: Dict[str, str] = {name: "pending" for name in self.order}
+        self.fractions: Dict[str, float] = {name: 0.0 for name in self.order}
+        self.completed = {name: value for name, value in (completed or {}).items() if name in self.stages}
+        for name in self.completed:
+            self.state[name] = "done"
+            self.fractions[name] = 1.0
+        self._validate()
+
+    def _validate(self):
+        """检查未知依赖和环"""
+        for stage in self.stages.values():
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"阶段 {stage.name} 依赖未知阶段 {dep}")
+
+        visited: Dict[str, int] = {}  # 0 = 访问中, 1 = 已完成
+
+        def visit(name: str):
+            if visited.get(name) == 1:
+                return
+            if visited.get(name) == 0:
+                raise ValueError(f"阶段依赖存在环: {name}")
+            visited[name] = 0
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visited[name] = 1
+
+        for name in self.order:
+            visit(name)
+
+    @property
+    def progress(self) -> int:
+        """总进度"""
+        done = sum(self.stages[name].weight * self.fractions[name] for name in self.order)
+        return min(self.base_progress + int(done), 100)
+
+    @property
+    def status(self) -> str:
+        """当前状态：声明顺序中最靠后的运行中阶段"""
+        running = [name for name in self.order if self.state[name] == "running"]
+        if running:
+            return self.stages[running[-1]].status
+        finished = [name for name in self.order if self.state[name] == "done"]
+        return self.stages[finished[-1]].status if finished else "pending"
+
+    async def report(self, name: str, fraction: float):
+        """
+        上报阶段内部进度
+
+        Args:
+            name: 阶段名
+            fraction: 完成比例 0~1
+        """
+        self.fractions[name] = max(0.0, min(fraction, 1.0))
+        await self._notify()
+
+    async def _notify(self):
+        """触发进度回调"""
+        if self.on_progress:
+            await self.on_progress(self.status, self.progress, dict(self.state))
+
+    async def _run_stage(self, stage: Stage, deps: Dict[str, Any]) -> Any:
+        """执行单个阶段，临时错误按指数退避（带抖动）重试"""
+        attempt = 0
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            with span(f"stage.{stage.name}") as stage_span:
+                while True:
+                    try:
+                        result = await stage.run(deps)
+                        outcome = "ok"
+                        return result
+                    except asyncio.CancelledError:
+                        outcome = "cancelled"
+                        raise
+                    except Exception as e:
+                        if attempt >= stage.retries or not (self.is_transient and self.is_transient(e)):
+                            raise
+                        delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.8, 1.2)
+                        attempt += 1
+                        stage_span.set_attribute("retries", attempt)
+                        print(f"🔁 阶段 {stage.name} 临时错误，{delay:.1f}s 后第 {attempt} 次重试: {e}")
+                        await asyncio.sleep(delay)
+        finally:
+            STAGE_DURATION.labels(stage.name, outcome).observe(time.perf_counter() - start)
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        执行流水线
+
+        已有检查点的阶段跳过；任一阶段失败时取消其余运行中的阶段并抛出该异常
+
+        Returns:
+            各阶段结果
+        """
+        results: Dict[str, Any] = dict(self.completed)
+        running: Dict[asyncio.Task, str] = {}
+
+        async def start_ready():
+            for name in self.order:
+                stage = self.stages[name]
+                if self.state[name] != "pending":
+                    continue
+                if all(self.state[dep] == "done" for dep in stage.deps):
+                    self.state[name] = "running"
+                    deps = {dep: results[dep] for dep in stage.deps}
+                    running[asyncio.create_task(self._run_stage(stage, deps))] = name
+            await self._notify()
+
+        await start_ready()
+
+        try:
+            while running:
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                finished = []
+                for task in done:
+                    name = running.pop(task)
+                    if task.exception() is not None:
+                        self.state[name] = "failed"
+                        raise task.exception()
+                    results[name] = task.result()
+                    self.state[name] = "done"
+                    self.fractions[name] = 1.0
+                    finished.append(name)
+                # 先启动后续阶段并上报新状态，再回调保存检查点，
+                # 阶段切换可以和检查点合并成一次写入
+                await start_ready()
+                if self.on_stage_done:
+                    for name in finished:
+                        await self.on_stage_done(name, results[name])
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        return results
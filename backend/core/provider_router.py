@@ -0,0 +1,335 @@
+"""
+写作模型路由
+按各提供方的延迟和错误率（EWMA）选择模型，出错时故障转移，
+首选方超过自身 p95 延迟仍未返回时可对冲请求第二个提供方
+"""
+
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple
+from dotenv import load_dotenv
+
+from .research_compactor import compact_research, estimate_tokens
+from .metrics import METRICS_ENABLED, PROVIDER_DURATION, PROVIDER_REQUESTS, PROVIDER_TOKENS
+from .tracing import span
+
+load_dotenv()
+
+# 提供方及优先顺序，例如 gpt5,gemini；测试时可用 mock:延迟秒数:错误率
+WRITER_PROVIDERS = [p.strip() for p in os.getenv("WRITER_PROVIDERS", "gpt5,gemini").split(",") if p.strip()]
+
+# EWMA 平滑系数
+ROUTER_EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.3"))
+# 错误率在排序中的权重：score = 延迟 * (1 + 权重 * 错误率)
+ROUTER_ERROR_WEIGHT = float(os.getenv("ROUTER_ERROR_WEIGHT", "4.0"))
+# 连续失败 N 次后暂停使用该提供方（秒）
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_COOLDOWN_SECONDS = float(os.getenv("ROUTER_COOLDOWN_SECONDS", "60"))
+
+# 对冲请求：首选方超过 p95 仍未返回时并发请求下一个提供方（会增加调用成本）
+ROUTER_HEDGE = os.getenv("ROUTER_HEDGE", "false").lower() == "true"
+ROUTER_HEDGE_MIN_SAMPLES = int(os.getenv("ROUTER_HEDGE_MIN_SAMPLES", "20"))  # 样本不足时不对冲
+ROUTER_LATENCY_WINDOW = int(os.getenv("ROUTER_LATENCY_WINDOW", "200"))  # 计算 p95 的样本窗口
+
+
+class ProviderStats:
+    """单个提供方的延迟和错误率统计（延迟按档位分开，各档位耗时差异很大）"""
+
+    def __init__(self, alpha: float = ROUTER_EWMA_ALPHA, window: int = ROUTER_LATENCY_WINDOW):
+        """初始化"""
+        self.alpha = alpha
+        self.window = window
+        self.latency: Dict[str, float] = {}
+        self.samples: Dict[str, deque] = {}
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+    def record_success(self, tier: str, seconds: float):
+        """记录一次成功"""
+        self.calls += 1
+        previous = self.latency.get(tier)
+        self.latency[tier] = seconds if previous is None else self.alpha * seconds + (1 - self.alpha) * previous
+        self.samples.setdefault(tier, deque(maxlen=self.window)).append(seconds)
+        self.error_rate = (1 - self.alpha) * self.error_rate
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        """记录一次失败，连续失败过多时进入冷却"""
+        self.calls += 1
+        self.failures += 1
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= ROUTER_FAILURE_THRESHOLD:
+            self.cooldown_until = time.monotonic() + ROUTER_COOLDOWN_SECONDS
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def score(self, tier: str) -> float:
+        """越小越优先；没有样本的档位排在有样本的之后（样本来自故障转移和对冲）"""
+        latency = self.latency.get(tier)
+        if latency is None:
+            return float("inf")
+        return latency * (1 + ROUTER_ERROR_WEIGHT * self.error_rate)
+
+    def p95(self, tier: str) -> Optional[float]:
+        """该档位的 p95 延迟，样本不足返回 None"""
+        samples = self.samples.get(tier)
+        if not samples or len(samples) < ROUTER_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": {tier: round(value, 3) for tier, value in self.latency.items()},
+            "error_rate": round(self.error_rate, 4),
+            "calls": self.calls,
+            "failures": self.failures,
+            "available": self.available()
+        }
+
+
+class MockWriter:
+    """本地模拟提供方（测试故障转移和对冲用）"""
+
+    def __init__(self, name: str = "mock", latency: float = 1.0, error_rate: float = 0.0):
+        """
+        Args:
+            name: 提供方名称
+            latency: 模拟耗时（秒，实际在 ±20% 内抖动）
+            error_rate: 模拟失败概率
+        """
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.model = name
+        self.temperature = 0.7
+        self.max_tokens = 8192
+
+    def build_prompt(self, topic: str, tier: str, research_data: Dict[str, Any]) -> str:
+        research_block = compact_research(research_data, topic, tier, log=False)
+        return f"{topic}\n{tier}\n{research_block}"
+
+    async def generate_article(
+        self,
+        topic: str,
+        tier: str,
+        research_data: Dict[str, Any],
+        on_partial=None
+    ) -> Dict[str, Any]:
+        steps = 4
+        markdown = f"# {topic}\n\n"
+        for step in range(steps):
+            await asyncio.sleep(self.latency * random.uniform(0.8, 1.2) / steps)
+            if random.random() < self.error_rate / steps:
+                raise RuntimeError(f"{self.name} 模拟失败")
+            markdown += f"## 第 {step + 1} 部分\n\n{self.name} 生成的关于{topic}的内容。\n\n"
+            if on_partial:
+                await on_partial(markdown, (step + 1) / steps)
+        return {"title": topic, "markdown": markdown, "word_count": len(markdown)}
+
+
+class ProviderRouter:
+    """
+    写作模型路由
+
+    对外与单个 Writer 接口一致（generate_article / build_prompt / model 等），
+    缓存键使用首选提供方的提示词和参数
+    """
+
+    def __init__(self, providers: List[Tuple[str, Any]], hedge: bool = ROUTER_HEDGE):
+        """
+        Args:
+            providers: [(名称, writer)]，按优先顺序
+            hedge: 是否启用对冲请求
+        """
+        if not providers:
+            raise ValueError("至少需要一个写作提供方")
+        self.providers = providers
+        self.hedge = hedge
+        self.stats: Dict[str, ProviderStats] = {name: ProviderStats() for name, _ in providers}
+
+        # 缓存键按首选提供方计算，只有首选提供方的结果才写缓存
+        self.primary = providers[0][0]
+        primary = providers[0][1]
+        self.model = getattr(primary, "model", providers[0][0])
+        self.temperature = getattr(primary, "temperature", 0.7)
+        self.max_tokens = getattr(primary, "max_tokens", 8192)
+
+    def build_prompt(self, topic: str, tier: str, research_data: Dict[str, Any]) -> str:
+        """首选提供方的提示词（用于生成缓存键）"""
+        return self.providers[0][1].build_prompt(topic, tier, research_data)
+
+    def ranked(self, tier: str) -> List[Tuple[str, Any]]:
+        """
+        按得分排序的可用提供方
+
+        得分相同时保持配置顺序；全部处于冷却时仍按顺序返回全部，宁可重试也不直接失败
+        """
+        available = [(name, writer) for name, writer in self.providers if self.stats[name].available()]
+        if not available:
+            return list(self.providers)
+        order = {name: index for index, (name, _) in enumerate(self.providers)}
+        return sorted(available, key=lambda item: (self.stats[item[0]].score(tier), order[item[0]]))
+
+    async def generate_article(
+        self,
+        topic: str,
+        tier: str,
+        research_data: Dict[str, Any],
+        on_partial=None
+    ) -> Dict[str, Any]:
+        """
+        生成文章：按排序依次尝试，失败转移到下一个；启用对冲时首选方超过 p95 后并发请求下一个
+
+        Returns:
+            文章内容（provider 字段记录实际使用的提供方）
+        """
+        candidates = self.ranked(tier)
+        errors = []
+        last_error: Optional[BaseException] = None
+
+        # 流式部分内容只转发给最先开始输出的那次调用，避免两路内容交替覆盖
+        stream_owner: List[str] = []
+
+        def partial_for(name: str):
+            if on_partial is None:
+                return None
+
+            async def forward(markdown: str, fraction: float):
+                if not stream_owner:
+                    stream_owner.append(name)
+                if stream_owner[0] == name:
+                    await on_partial(markdown, fraction)
+
+            return forward
+
+        async def attempt(name: str, writer: Any) -> Dict[str, Any]:
+            start = time.monotonic()
+            if METRICS_ENABLED:
+                PROVIDER_TOKENS.labels(name, "prompt").inc(
+                    estimate_tokens(writer.build_prompt(topic, tier, research_data))
+                )
+            try:
+                with span(f"provider.{name}", provider=name, tier=tier) as provider_span:
+                    result = await writer.generate_article(
+                        topic, tier, research_data, on_partial=partial_for(name)
+                    )
+                    provider_span.set_attribute("words", result.get("word_count", 0))
+            except asyncio.CancelledError:
+                self._observe(name, tier, "cancelled", time.monotonic() - start)
+                raise
+            except Exception:
+                self.stats[name].record_failure()
+                self._observe(name, tier, "error", time.monotonic() - start)
+                # 输出中的一路失败后，让接替的提供方继续推送部分内容
+                if stream_owner and stream_owner[0] == name:
+                    stream_owner.clear()
+                raise
+            elapsed = time.monotonic() - start
+            self.stats[name].record_success(tier, elapsed)
+            self._observe(name, tier, "ok", elapsed)
+            if METRICS_ENABLED:
+                PROVIDER_TOKENS.labels(name, "completion").inc(estimate_tokens(result.get("markdown", "")))
+            return {**result, "provider": name}
+
+        index = 0
+        while index < len(candidates):
+            name, writer = candidates[index]
+            index += 1
+
+            primary = asyncio.create_task(attempt(name, writer))
+            running = {primary: name}
+
+            # 对冲：等到首选方的 p95，仍未完成则加入下一个提供方
+            delay = self.stats[name].p95(tier) if self.hedge and index < len(candidates) else None
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    hedge_name, hedge_writer = candidates[index]
+                    index += 1
+                    print(f"🔀 {name} 超过 p95 ({delay:.1f}s)，对冲请求 {hedge_name}")
+                    running[asyncio.create_task(attempt(hedge_name, hedge_writer))] = hedge_name
+
+            try:
+                while running:
+                    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task_name = running.pop(task)
+                        if task.exception() is None:
+                            if len(self.providers) > 1:
+                                print(f"✅ 写作提供方: {task_name}")
+                            return task.result()
+                        last_error = task.exception()
+                        errors.append(f"{task_name}: {last_error}")
+                        print(f"⚠️  写作提供方 {task_name} 失败: {task.exception()}")
+            finally:
+                # 取消输掉的那一路
+                for task in running:
+                    task.cancel()
+                if running:
+                    await asyncio.gather(*running, return_exceptions=True)
+
+        raise RuntimeError("所有写作提供方均失败: " + "; ".join(errors)) from last_error
+
+    def _observe(self, name: str, tier: str, outcome: str, seconds: float):
+        """记录调用指标"""
+        PROVIDER_DURATION.labels(name, tier, outcome).observe(seconds)
+        PROVIDER_REQUESTS.labels(name, outcome).inc()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """各提供方统计"""
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+
+def _build_provider(spec: str) -> Tuple[str, Any]:
+    """按名称创建提供方"""
+    if spec.startswith("mock"):
+        # mock[:延迟秒数[:错误率]]
+        parts = spec.split(":")
+        latency = float(parts[1]) if len(parts) > 1 else 1.0
+        error_rate = float(parts[2]) if len(parts) > 2 else 0.0
+        return spec, MockWriter(spec, latency, error_rate)
+    if spec == "gpt5":
+        from .gpt5_writer import GPT5Writer
+        return spec, GPT5Writer()
+    if spec == "gemini":
+        from .gemini_writer import GeminiWriter
+        return spec, GeminiWriter()
+    raise ValueError(f"未知的写作提供方: {spec}")
+
+
+def build_default_router() -> ProviderRouter:
+    """按 WRITER_PROVIDERS 创建路由，初始化失败（如缺少 API Key）的提供方跳过"""
+    providers = []
+    for spec in WRITER_PROVIDERS:
+        try:
+            providers.append(_build_provider(spec))
+        except Exception as e:
+            print(f"⚠️  写作提供方 {spec} 不可用: {e}")
+
+    if not providers:
+        # 保持原有行为：至少有 GPT5（缺少 Key 时调用才会失败）
+        providers.append(_build_provider("gpt5"))
+
+    print(f"✅ 写作提供方: {', '.join(name for name, _ in providers)}{'（对冲已启用）' if ROUTER_HEDGE else ''}")
+    return ProviderRouter(providers)
+
+
+# 全局路由（统计需要跨任务累积）
+_router: Optional[ProviderRouter] = None
+
+
+def get_router() -> ProviderRouter:
+    """获取全局路由，首次调用时创建"""
+    global _router
+    if _router is None:
+        _router = build_default_router()
+    return _router
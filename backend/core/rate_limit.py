@@ -0,0 +1,265 @@
+"""
+准入控制
+按客户端的令牌桶限流（内存或 Redis 后端）+ 全局在途任务上限
+"""
+
+import os
+import time
+import hashlib
+import ipaddress
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from fastapi import Request
+from dotenv import load_dotenv
+
+from .events import USE_REDIS, REDIS_URL
+
+load_dotenv()
+
+# 每个客户端：突发上限和每小时补充的令牌数
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_PER_HOUR = float(os.getenv("RATE_LIMIT_PER_HOUR", "20"))
+# memory / redis（默认跟随 USE_REDIS）
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "redis" if USE_REDIS else "memory").lower()
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))  # 内存后端最多跟踪的客户端数
+
+# 全局在途任务上限（排队 + 执行中），超过后拒绝新任务
+MAX_JOBS_IN_FLIGHT = int(os.getenv("MAX_JOBS_IN_FLIGHT", "50"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "30"))  # 秒
+
+# 部署在反向代理后（Railway 等）时从 X-Forwarded-For 取客户端 IP。
+# 只有直连地址属于 TRUSTED_PROXIES 时才读该头，并从右往左跳过可信代理，
+# 第一个不可信的地址即客户端（最左边的条目可由客户端伪造，不会被直接采用）
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "true").lower() == "true"
+# 默认是回环、私有网段和运营商级 NAT 网段（Railway 等平台的边缘代理从内网连入）
+TRUSTED_PROXIES = os.getenv(
+    "TRUSTED_PROXIES",
+    "127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,100.64.0.0/10,::1/128,fc00::/7"
+)
+
+REDIS_KEY_PREFIX = "aiwriter:ratelimit:"
+
+# 原子地补充并扣减令牌，返回 {是否通过, 需要等待的毫秒数}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  wait = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return {allowed, wait}
+"""
+
+
+def _parse_networks(value: str) -> List[ipaddress._BaseNetwork]:
+    """解析逗号分隔的网段，无效条目跳过"""
+    networks = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            print(f"⚠️  忽略无效的可信代理网段: {item}")
+    return networks
+
+
+_trusted_networks = _parse_networks(TRUSTED_PROXIES)
+
+
+def is_trusted_proxy(address: str) -> bool:
+    """地址是否属于 TRUSTED_PROXIES"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_networks)
+
+
+def client_ip(request: Request) -> str:
+    """
+    客户端 IP
+
+    直连地址是可信代理时，从 X-Forwarded-For 右侧跳过可信代理取第一个其他地址；
+    否则（或未开启、没有该头）使用直连地址
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not TRUST_PROXY_HEADERS or not is_trusted_proxy(peer):
+        return peer
+
+    forwarded = request.headers.get("x-forwarded-for", "")
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop[:45]
+    return hops[0][:45] if hops else peer
+
+
+def client_fingerprint(request: Request) -> str:
+    """客户端指纹：IP + User-Agent + Accept-Language 的哈希"""
+    material = "|".join([
+        client_ip(request),
+        request.headers.get("user-agent", ""),
+        request.headers.get("accept-language", "")
+    ])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def rate_limit_key(request: Request) -> str:
+    """
+    限流键
+
+    一般按客户端 IP；解析出的地址仍是可信代理（代理没有转发客户端地址）时，
+    改按客户端指纹，避免所有用户共用代理 IP 的令牌桶
+    """
+    ip = client_ip(request)
+    if is_trusted_proxy(ip):
+        return "fp:" + client_fingerprint(request)
+    return ip
+
+
+class MemoryTokenBucket:
+    """进程内令牌桶（单进程部署）"""
+
+    def __init__(self, capacity: int, per_second: float, max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        """初始化"""
+        self.capacity = capacity
+        self.per_second = per_second
+        self.max_clients = max_clients
+        # client -> (令牌数, 上次更新时间)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, client: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        扣减令牌
+
+        Returns:
+            (是否通过, 需要等待的秒数)
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(client, (float(self.capacity), now))
+        tokens = min(self.capacity, tokens + (now - updated_at) * self.per_second)
+
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[client] = (tokens, now)
+        self._buckets.move_to_end(client)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+        return allowed, 0.0 if allowed else (cost - tokens) / self.per_second
+
+    async def close(self):
+        pass
+
+
+class RedisTokenBucket:
+    """Redis 令牌桶（多进程/多实例共享）"""
+
+    def __init__(self, capacity: int, per_second: float, url: str = REDIS_URL):
+        """初始化"""
+        import redis.asyncio as redis
+
+        self.capacity = capacity
+        self.per_second = per_second
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, client: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """扣减令牌，返回 (是否通过, 需要等待的秒数)"""
+        allowed, wait_ms = await self._script(
+            keys=[f"{REDIS_KEY_PREFIX}{client}"],
+            args=[self.capacity, self.per_second, time.time(), cost]
+        )
+        return bool(allowed), int(wait_ms) / 1000
+
+    async def close(self):
+        await self._redis.close()
+
+
+class AdmissionController:
+    """准入控制：客户端限流 + 全局在途上限"""
+
+    def __init__(self):
+        """初始化"""
+        self.limiter = None
+        self.rejected = 0
+
+    def _get_limiter(self):
+        """首次使用时创建限流后端，Redis 不可用时回退到内存"""
+        if self.limiter is None:
+            per_second = RATE_LIMIT_PER_HOUR / 3600
+            if RATE_LIMIT_BACKEND == "redis":
+                try:
+                    self.limiter = RedisTokenBucket(RATE_LIMIT_BURST, per_second)
+                    print(f"✅ Rate limiter: Redis ({REDIS_URL})")
+                except Exception as e:
+                    print(f"⚠️  Redis 限流不可用，回退到内存: {e}")
+            if self.limiter is None:
+                self.limiter = MemoryTokenBucket(RATE_LIMIT_BURST, per_second)
+        return self.limiter
+
+    async def check_client(self, client: str) -> Optional[int]:
+        """
+        客户端限流
+
+        Returns:
+            被限流时返回 Retry-After 秒数，否则 None
+        """
+        if not RATE_LIMIT_ENABLED:
+            return None
+        try:
+            allowed, wait = await self._get_limiter().acquire(client)
+        except Exception as e:
+            # 限流后端故障时放行，不影响正常生成
+            print(f"⚠️  Rate limiter error: {e}")
+            return None
+        if allowed:
+            return None
+        self.rejected += 1
+        return max(1, int(wait + 0.999))
+
+    def check_capacity(self, in_flight: int) -> Optional[int]:
+        """
+        全局在途上限
+
+        Args:
+            in_flight: 当前排队和执行中的任务数
+
+        Returns:
+            超限时返回 Retry-After 秒数，否则 None
+        """
+        if in_flight < MAX_JOBS_IN_FLIGHT:
+            return None
+        self.rejected += 1
+        return ADMISSION_RETRY_AFTER
+
+    async def close(self):
+        """关闭限流后端"""
+        if self.limiter is not None:
+            await self.limiter.close()
+            self.limiter = None
+
+
+def saturation(in_flight: int) -> float:
+    """在途任务占上限的比例"""
+    return in_flight / MAX_JOBS_IN_FLIGHT if MAX_JOBS_IN_FLIGHT > 0 else 0.0
+
+
+# 全局准入控制
+admission = AdmissionController()
@@ -0,0 +1,236 @@
+"""
+输出格式渲染
+下载时按需从已保存的 Markdown 渲染，结果放入按 (文章, 格式, 内容哈希) 寻址的有界缓存
+"""
+
+import os
+import html
+import json
+import gzip
+import hashlib
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple, Callable, Awaitable, Union
+from dotenv import load_dotenv
+
+from .pdf_renderer import pdf_renderer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+# 渲染缓存总大小上限（字节）
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 小于该大小的下载不压缩
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+# 格式 -> (文件名后缀, Content-Type)
+FORMATS = {
+    "markdown": (".md", "text/markdown"),
+    "html": (".html", "text/html"),
+    "xiaohongshu": ("_xiaohongshu.txt", "text/plain"),
+    "pdf": (".pdf", "application/pdf"),
+}
+
+
+def content_hash(content: Dict[str, Any]) -> str:
+    """内容哈希（Markdown + 图片），内容变化后缓存自然失效"""
+    material = json.dumps(
+        [content.get("title", ""), content.get("markdown", ""), content.get("images") or []],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _gzip(data: bytes) -> bytes:
+    # mtime=0 保证同一内容压缩结果稳定
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=11)
+
+
+# Content-Encoding -> 压缩函数，按优先级排列；brotli 是可选依赖
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {}
+if brotli is not None:
+    COMPRESSORS["br"] = _brotli
+COMPRESSORS["gzip"] = _gzip
+
+
+def markdown_to_html(markdown: str) -> str:
+    """Markdown 转 HTML"""
+    try:
+        import markdown as markdown_lib
+        return markdown_lib.markdown(markdown)
+    except ImportError:
+        # 简单转换（正文来自模型输出，先转义，不能原样嵌入 HTML）
+        replaced = html.escape(markdown).replace('\n', '<br>')
+        return f"<div>{replaced}</div>"
+
+
+def to_xiaohongshu_format(markdown: str, images: List[str]) -> str:
+    """转换为小红书格式"""
+    # 移除 Markdown 语法
+    content = markdown
+    content = content.replace("#", "")
+    content = content.replace("*", "")
+    content = content.replace("```", "")
+
+    # 添加表情符号
+    content = "✨ " + content
+
+    # 添加图片链接
+    if images:
+        content += "\n\n图片：\n" + "\n".join(images)
+
+    # 添加话题标签
+    content += "\n\n#AI写作 #科技分享"
+
+    return content
+
+
+# 缓存值：渲染出的文本，或压缩后的字节
+CacheValue = Union[str, bytes]
+
+
+def _cost(value: CacheValue) -> int:
+    return len(value) if isinstance(value, bytes) else len(value.encode("utf-8"))
+
+
+class RenderCache:
+    """按字节数限制的 LRU 渲染缓存"""
+
+    def __init__(self, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        """初始化"""
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: "OrderedDict[Tuple[str, str, str], CacheValue]" = OrderedDict()
+        # 同一 key 并发请求只渲染一次
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[CacheValue]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple[str, str, str], value: CacheValue):
+        cost = _cost(value)
+        if cost > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= _cost(old)
+        self._items[key] = value
+        self.size += cost
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= _cost(evicted)
+
+    async def get_or_create(
+        self,
+        key: Tuple[str, str, str],
+        factory: Callable[[], Awaitable[CacheValue]]
+    ) -> CacheValue:
+        """命中直接返回；未命中时调用 factory 渲染并缓存"""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await factory()
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+# 全局渲染缓存
+render_cache = RenderCache()
+
+
+async def _render(fmt: str, content: Dict[str, Any]) -> str:
+    """实际渲染"""
+    markdown = content.get("markdown", "")
+    if fmt == "html":
+        return await asyncio.to_thread(markdown_to_html, markdown)
+    if fmt == "xiaohongshu":
+        return to_xiaohongshu_format(markdown, content.get("images") or [])
+    raise ValueError(f"不支持的格式: {fmt}")
+
+
+async def render(article_id: str, fmt: str, content: Dict[str, Any]) -> str:
+    """
+    渲染指定格式（带缓存）
+
+    Args:
+        article_id: 文章 ID
+        fmt: 格式（见 FORMATS）
+        content: 已保存的文章内容
+
+    Returns:
+        渲染结果（pdf 返回磁盘文件路径）
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的格式: {fmt}")
+    if fmt == "markdown":
+        return content.get("markdown", "")
+
+    digest = content_hash(content)
+    if fmt == "pdf":
+        # PDF 较大，只缓存在磁盘上
+        return await pdf_renderer.render(
+            digest,
+            content.get("title", "Untitled"),
+            content.get("markdown", "")
+        )
+
+    key = (article_id, fmt, digest)
+    return await render_cache.get_or_create(key, lambda: _render(fmt, content))
+
+
+async def render_encoded(
+    article_id: str,
+    fmt: str,
+    content: Dict[str, Any],
+    encoding: str = "identity"
+) -> bytes:
+    """
+    渲染文本格式并按 Content-Encoding 压缩（压缩结果同样缓存）
+
+    Args:
+        article_id: 文章 ID
+        fmt: 文本格式（pdf 走磁盘文件，不经过这里）
+        content: 已保存的文章内容
+        encoding: identity / gzip / br
+
+    Returns:
+        响应体字节
+    """
+    data = (await render(article_id, fmt, content)).encode("utf-8")
+    if encoding == "identity":
+        return data
+    if encoding not in COMPRESSORS:
+        raise ValueError(f"不支持的压缩方式: {encoding}")
+
+    key = (article_id, f"{fmt}+{encoding}", content_hash(content))
+    return await render_cache.get_or_create(
+        key,
+        lambda: asyncio.to_thread(COMPRESSORS[encoding], data)
+    )
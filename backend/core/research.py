@@ -0,0 +1,236 @@
+"""
+多源调研引擎
+每个来源一个 fetcher，并发执行、各自限时，结果按 URL 合并去重
+"""
+
+import os
+import json
+import time
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any, Optional
+from urllib.parse import urlsplit, urlunsplit
+from dotenv import load_dotenv
+
+from .http_client import get_client
+
+load_dotenv()
+
+# 来源 -> 结果字段（与 AIWriter.research 的返回结构一致）
+SOURCES = {
+    "web": "web_results",
+    "wechat": "wechat_results",
+    "xiaohongshu": "xiaohongshu_results",
+    "academic": "academic_results",
+}
+
+# 调研配置
+# http：只启用配置了 RESEARCH_{SOURCE}_URL 的来源，都未配置时调研结果为空；
+# fixture：本地夹具（内容和链接是虚构的，只用于测试和压测，不能用于生产）
+RESEARCH_BACKEND = os.getenv("RESEARCH_BACKEND", "http")
+RESEARCH_TIMEOUT = float(os.getenv("RESEARCH_TIMEOUT", "10"))  # 单个来源的默认时限（秒）
+RESEARCH_MAX_RESULTS = int(os.getenv("RESEARCH_MAX_RESULTS", "10"))  # 每个来源最多保留条数
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "research")
+
+
+def _source_setting(name: str, source: str, default: str = "") -> str:
+    """按来源读取配置，如 RESEARCH_WEB_URL / RESEARCH_WEB_TIMEOUT"""
+    return os.getenv(f"RESEARCH_{source.upper()}_{name}", default)
+
+
+def normalize_url(url: str) -> str:
+    """URL 去重键：忽略协议、大小写主机名、结尾斜杠和锚点"""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/")
+    return urlunsplit(("", parts.netloc.lower(), path, parts.query, ""))
+
+
+class ResearchFetcher(ABC):
+    """调研来源基类"""
+
+    def __init__(self, source: str, timeout: Optional[float] = None):
+        """
+        Args:
+            source: 来源名（见 SOURCES）
+            timeout: 本来源的时限（秒）
+        """
+        self.source = source
+        self.result_key = SOURCES[source]
+        self.timeout = timeout or float(_source_setting("TIMEOUT", source, str(RESEARCH_TIMEOUT)))
+
+    @abstractmethod
+    async def fetch(self, topic: str) -> List[Dict[str, Any]]:
+        """
+        获取调研结果
+
+        Returns:
+            [{"title", "url", "snippet"}, ...]
+        """
+
+
+class HTTPSearchFetcher(ResearchFetcher):
+    """
+    通用 HTTP 搜索来源
+
+    GET {url}?q=<topic>，响应为结果数组或 {"results": [...]}，
+    每项含 title / url(link) / snippet(content)
+    """
+
+    def __init__(self, source: str, url: str, timeout: Optional[float] = None):
+        super().__init__(source, timeout)
+        self.url = url
+        self.api_key = _source_setting("API_KEY", source) or None
+
+    async def fetch(self, topic: str) -> List[Dict[str, Any]]:
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        client = get_client("research")
+        response = await client.get(self.url, params={"q": topic}, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        items = data.get("results", []) if isinstance(data, dict) else data
+
+        return [
+            {
+                "title": item.get("title", ""),
+                "url": item.get("url") or item.get("link", ""),
+                "snippet": item.get("snippet") or item.get("content", "")
+            }
+            for item in items[:RESEARCH_MAX_RESULTS]
+        ]
+
+
+class FixtureFetcher(ResearchFetcher):
+    """
+    本地夹具来源（离线测试/压测用，结果是虚构的）
+
+    创建时读取 fixtures/research/{source}.json，{topic} 会被替换为主题；
+    delay 可模拟慢来源（RESEARCH_{SOURCE}_DELAY）
+    """
+
+    def __init__(
+        self,
+        source: str,
+        fixture_dir: str = FIXTURE_DIR,
+        delay: Optional[float] = None,
+        timeout: Optional[float] = None
+    ):
+        super().__init__(source, timeout)
+        self.path = os.path.join(fixture_dir, f"{source}.json")
+        self.delay = delay if delay is not None else float(_source_setting("DELAY", source, "0"))
+        # 只在创建时读一次文件，fetch 时不做同步 IO
+        self.items: List[Dict[str, Any]] = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.items = json.load(f)[:RESEARCH_MAX_RESULTS]
+
+    async def fetch(self, topic: str) -> List[Dict[str, Any]]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        return [
+            {key: str(value).replace("{topic}", topic) for key, value in item.items()}
+            for item in self.items
+        ]
+
+
+class ResearchEngine:
+    """并发调研引擎"""
+
+    def __init__(self, fetchers: List[ResearchFetcher]):
+        """
+        Args:
+            fetchers: 调研来源列表
+        """
+        self.fetchers = fetchers
+
+    async def _run_fetcher(self, fetcher: ResearchFetcher, topic: str) -> Dict[str, Any]:
+        """执行单个来源，超时/失败返回空结果而不是抛出"""
+        start = time.monotonic()
+        try:
+            results = await asyncio.wait_for(fetcher.fetch(topic), timeout=fetcher.timeout)
+            status = "ok"
+        except asyncio.TimeoutError:
+            results, status = [], "timeout"
+            print(f"⚠️  调研来源 {fetcher.source} 超时 ({fetcher.timeout}s)")
+        except Exception as e:
+            results, status = [], "error"
+            print(f"⚠️  调研来源 {fetcher.source} 失败: {e}")
+
+        return {
+            "fetcher": fetcher,
+            "results": results,
+            "status": status,
+            "elapsed": round(time.monotonic() - start, 3)
+        }
+
+    async def research(self, topic: str) -> Dict[str, Any]:
+        """
+        并发执行所有来源并合并结果
+
+        Returns:
+            {"topic", "web_results", ..., "sources": {来源: {status, count, elapsed}}}
+        """
+        outcomes = await asyncio.gather(*(self._run_fetcher(f, topic) for f in self.fetchers))
+
+        merged: Dict[str, Any] = {"topic": topic}
+        for key in SOURCES.values():
+            merged[key] = []
+        merged["sources"] = {}
+
+        seen = set()
+        for outcome in outcomes:
+            fetcher = outcome["fetcher"]
+            kept = []
+            for item in outcome["results"]:
+                url = item.get("url", "")
+                key = normalize_url(url) if url else None
+                if key and key in seen:
+                    continue
+                if key:
+                    seen.add(key)
+                kept.append(item)
+
+            merged[fetcher.result_key].extend(kept)
+            merged["sources"][fetcher.source] = {
+                "status": outcome["status"],
+                "count": len(kept),
+                "elapsed": outcome["elapsed"]
+            }
+
+        return merged
+
+
+def build_default_engine() -> ResearchEngine:
+    """
+    按环境变量构建调研引擎
+
+    默认（http）只启用配置了 RESEARCH_{SOURCE}_URL 的来源，都未配置时不调研；
+    RESEARCH_BACKEND=fixture 时使用本地夹具（仅测试/压测）。
+    """
+    fetchers: List[ResearchFetcher] = []
+    for source in SOURCES:
+        if RESEARCH_BACKEND == "fixture":
+            fetchers.append(FixtureFetcher(source))
+            continue
+        url = _source_setting("URL", source)
+        if url:
+            fetchers.append(HTTPSearchFetcher(source, url))
+    if RESEARCH_BACKEND == "fixture":
+        print("⚠️ 调研使用本地夹具，结果是虚构的，仅用于测试/压测")
+    elif not fetchers:
+        print("⚠️ 未配置调研来源（RESEARCH_{SOURCE}_URL），调研结果为空")
+    return ResearchEngine(fetchers)
+
+
+if __name__ == "__main__":
+    # 离线压测：python -m core.research "主题"
+    import sys
+
+    async def _bench(topic: str):
+        engine = ResearchEngine([FixtureFetcher(source) for source in SOURCES])
+        start = time.monotonic()
+        result = await engine.research(topic)
+        print(json.dumps(result["sources"], ensure_ascii=False, indent=2))
+        print(f"⏱  {time.monotonic() - start:.3f}s")
+
+    asyncio.run(_bench(sys.argv[1] if len(sys.argv) > 1 else "AI 写作"))
@@ -0,0 +1,166 @@
+"""
+调研结果压缩
+在构建提示词前把调研数据压缩到按档位配置的 token 预算内：
+估算 token、按来源配额、截断摘要、去除近似重复、按与主题的相关度排序
+"""
+
+import os
+import re
+from typing import Dict, List, Any, Set, Union
+from dotenv import load_dotenv
+
+from .research import SOURCES
+
+load_dotenv()
+
+# 各档位调研块 token 预算，格式 A:800,B:1200,...
+RESEARCH_TOKEN_BUDGETS = {
+    tier: int(budget)
+    for tier, budget in (
+        item.split(":") for item in os.getenv("RESEARCH_TOKEN_BUDGETS", "A:800,B:1200,C:2000,D:3000").split(",")
+    )
+}
+
+# 各来源占预算的比例（未用完的额度会让给其他来源）
+SOURCE_QUOTAS = {
+    "web": 0.4,
+    "academic": 0.25,
+    "wechat": 0.2,
+    "xiaohongshu": 0.15,
+}
+
+SNIPPET_MAX_CHARS = int(os.getenv("RESEARCH_SNIPPET_MAX_CHARS", "200"))
+NEAR_DUPLICATE_THRESHOLD = 0.8  # 3-gram Jaccard 相似度
+
+_CJK = re.compile(r"[㐀-鿿豈-﫿　-〿＀-￯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 数：中日韩字符约 1 token/字，其余约 4 字符/token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _shingles(text: str) -> Set[str]:
+    """字符 3-gram（忽略空白和标点）"""
+    text = re.sub(r"[\s\W_]+", "", text.lower())
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _relevance(topic_terms: Set[str], item: Dict[str, Any]) -> float:
+    """相关度：主题 2-gram 在标题/摘要中的覆盖率，标题加权"""
+    if not topic_terms:
+        return 0.0
+    title = item.get("title", "").lower()
+    snippet = item.get("snippet", "").lower()
+    title_hits = sum(1 for term in topic_terms if term in title)
+    snippet_hits = sum(1 for term in topic_terms if term in snippet)
+    return (2 * title_hits + snippet_hits) / (3 * len(topic_terms))
+
+
+def _topic_terms(topic: str) -> Set[str]:
+    """主题关键片段：英文单词 + 中文 2-gram"""
+    topic = topic.lower()
+    terms = set(re.findall(r"[a-z0-9]{2,}", topic))
+    for run in re.findall(r"[㐀-鿿]+", topic):
+        if len(run) == 1:
+            terms.add(run)
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _truncate(text: str, limit: int = SNIPPET_MAX_CHARS) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _format_item(source: str, item: Dict[str, Any]) -> str:
+    line = f"- [{source}] {_truncate(item.get('title', ''), 80)}"
+    snippet = _truncate(item.get("snippet", ""))
+    if snippet:
+        line += f"：{snippet}"
+    if item.get("url"):
+        line += f"（{item['url']}）"
+    return line
+
+
+def compact_research(
+    research_data: Union[Dict[str, Any], str],
+    topic: str,
+    tier: str,
+    log: bool = True
+) -> str:
+    """
+    压缩调研数据为提示词中的调研块
+
+    Args:
+        research_data: AIWriter.research 的结果（已是字符串时原样返回）
+        topic: 文章主题
+        tier: 字数档位（决定 token 预算）
+        log: 是否打印压缩前后的大小
+
+    Returns:
+        结构化调研块（每条一行）
+    """
+    if isinstance(research_data, str):
+        return research_data
+
+    budget = RESEARCH_TOKEN_BUDGETS.get(tier, 1200)
+    terms = _topic_terms(topic)
+
+    # 每个来源：去重、排序
+    seen: List[Set[str]] = []
+    ranked: Dict[str, List[str]] = {}
+    for source, key in SOURCES.items():
+        candidates = sorted(
+            research_data.get(key, []),
+            key=lambda item: _relevance(terms, item),
+            reverse=True
+        )
+        lines = []
+        for item in candidates:
+            shingles = _shingles(item.get("title", "") + item.get("snippet", ""))
+            if any(_jaccard(shingles, other) >= NEAR_DUPLICATE_THRESHOLD for other in seen):
+                continue
+            seen.append(shingles)
+            lines.append(_format_item(source, item))
+        ranked[source] = lines
+
+    # 按来源配额填充，剩余额度再按来源顺序补齐
+    selected: Dict[str, List[str]] = {source: [] for source in SOURCES}
+    used = 0
+    for source in SOURCES:
+        quota = int(budget * SOURCE_QUOTAS.get(source, 0))
+        spent = 0
+        while ranked[source]:
+            cost = estimate_tokens(ranked[source][0]) + 1
+            if spent + cost > quota:
+                break
+            selected[source].append(ranked[source].pop(0))
+            spent += cost
+        used += spent
+
+    for source in SOURCES:
+        while ranked[source]:
+            cost = estimate_tokens(ranked[source][0]) + 1
+            if used + cost > budget:
+                break
+            selected[source].append(ranked[source].pop(0))
+            used += cost
+
+    lines = [line for source in SOURCES for line in selected[source]]
+    block = "\n".join(lines) if lines else "（暂无调研结果）"
+
+    if log:
+        before = estimate_tokens(str(research_data))
+        print(f"📉 调研压缩: ~{before} -> ~{estimate_tokens(block)} tokens (预算 {budget}, {len(lines)} 条)")
+
+    return block
@@ -0,0 +1,141 @@
+"""
+长文分段生成工具
+大纲提示词/解析、分节提示词、拼接时的标题规范化和段落去重
+"""
+
+import re
+import json
+from typing import Dict, List, Any
+
+
+def build_outline_prompt(topic: str, target_words: int, research_block: str, max_sections: int) -> str:
+    """构建大纲提示词（要求返回 JSON）"""
+    return f"""请为一篇关于"{topic}"的深度文章设计大纲，全文约{target_words}字。
+
+**调研参考**：
+{research_block}
+
+**输出要求**：
+- 只输出 JSON 数组，不要任何解释
+- 数组包含 {max(3, max_sections // 2)}~{max_sections} 个章节，第一个为开头，最后一个为结尾
+- 每个元素格式：{{"title": "章节标题", "points": ["要点1", "要点2"]}}"""
+
+
+def parse_outline(text: str, max_sections: int) -> List[Dict[str, Any]]:
+    """
+    解析大纲
+
+    优先按 JSON 解析（兼容 ```json 代码块），失败时退回到 Markdown 标题/列表行
+
+    Returns:
+        [{"title": ..., "points": [...]}, ...]
+    """
+    match = re.search(r"\[.*\]", text, re.S)
+    if match:
+        try:
+            items = json.loads(match.group(0))
+            sections = [
+                {
+                    "title": str(item.get("title", "")).strip(),
+                    "points": [str(p) for p in item.get("points", [])]
+                }
+                for item in items
+                if isinstance(item, dict) and str(item.get("title", "")).strip()
+            ]
+            if sections:
+                return sections[:max_sections]
+        except (ValueError, AttributeError):
+            pass
+
+    sections = []
+    for line in text.splitlines():
+        heading = re.match(r"^\s*(?:#{1,3}\s+|\d+[.、]\s*|[-*]\s+)(.+)$", line)
+        if heading:
+            sections.append({"title": heading.group(1).strip(), "points": []})
+    return sections[:max_sections]
+
+
+def build_section_prompt(
+    topic: str,
+    outline: List[Dict[str, Any]],
+    index: int,
+    section_words: int,
+    research_block: str
+) -> str:
+    """构建单个章节的提示词（共享完整大纲作为上下文）"""
+    outline_text = "\n".join(
+        f"{i + 1}. {item['title']}" + (f"（{'；'.join(item['points'])}）" if item["points"] else "")
+        for i, item in enumerate(outline)
+    )
+    section = outline[index]
+    if index == 0:
+        position = "这是文章的开头章节，负责引入主题。"
+    elif index == len(outline) - 1:
+        position = "这是文章的结尾章节，负责总结全文。"
+    else:
+        position = "这是文章的中间章节，不要写开头引入或全文总结。"
+
+    return f"""你正在撰写一篇关于"{topic}"的深度文章，全文大纲如下：
+
+{outline_text}
+
+现在只撰写第 {index + 1} 章「{section['title']}」，约{section_words}字。{position}
+
+**写作原则**：
+1. 说人话：用通俗的语言解释复杂概念
+2. 有温度：使用第一人称，加入个人见解
+3. 有洞察：深入分析技术原理和趋势
+4. 有节制：克制煽情，理性客观
+
+**调研参考**：
+{research_block}
+
+**输出要求**：
+- 使用 Markdown 格式，以「## {section['title']}」开头
+- 小节使用 ###，不要使用 # 或其他 ## 标题
+- 不要重复其他章节的内容
+
+请开始撰写本章。"""
+
+
+def normalize_section(title: str, markdown: str) -> str:
+    """
+    规范化章节标题
+
+    去掉模型自带的开头 #/## 标题，统一加上「## 章节标题」，
+    正文中的 #/## 降级为 ###
+    """
+    lines = markdown.strip().splitlines()
+    while lines and (not lines[0].strip() or re.match(r"^#{1,2}\s", lines[0])):
+        lines.pop(0)
+
+    body = [re.sub(r"^#{1,2}(\s)", r"###\1", line) for line in lines]
+    return f"## {title}\n\n" + "\n".join(body).strip()
+
+
+def _paragraph_key(paragraph: str) -> str:
+    """段落去重键：去掉空白和标点"""
+    return re.sub(r"[\s\W_]+", "", paragraph).lower()
+
+
+def stitch_sections(title: str, sections: List[str]) -> str:
+    """
+    拼接章节并去除重复段落
+
+    标题行和很短的段落不参与去重，避免误删列表项、小节标题
+    """
+    seen = set()
+    output = [f"# {title}"]
+    for section in sections:
+        kept = []
+        for paragraph in re.split(r"\n\s*\n", section):
+            key = _paragraph_key(paragraph)
+            if paragraph.lstrip().startswith("#") or len(key) < 20:
+                kept.append(paragraph)
+                continue
+            if key in seen:
+                continue
+            seen.add(key)
+            kept.append(paragraph)
+        output.append("\n\n".join(kept))
+    return "\n\n".join(output) + "\n"
@@ -3,13 +3,137 @@
 使用数据库持久化存储
 """
 
-from typing import Dict, List, Optional, Any
-from sqlalchemy import select, update, delete
+from typing import Dict, List, Optional, Any, Tuple
+from sqlalchemy import select, update, delete, func, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 import os
+import re
+import time
+import json
+import base64
+import asyncio
 
-from .database import Article, get_session, init_db
+from .database import Article, ArticleContent, Job, get_session, init_db
+from .tracing import add_timing
+from .renderer import content_hash
+
+# 流式生成时部分内容写库的最小间隔（秒）；第一段立即写入，实时内容走事件推送
+PARTIAL_SAVE_INTERVAL = float(os.getenv("PARTIAL_SAVE_INTERVAL", "5.0"))
+
+# 列表摘要长度
+EXCERPT_LENGTH = 160
+
+# 列表总数缓存时间（秒）
+LIST_TOTAL_CACHE_SECONDS = float(os.getenv("LIST_TOTAL_CACHE_SECONDS", "30"))
+
+# 列表接口只查询的摘要列
+SUMMARY_COLUMNS = (
+    Article.id,
+    Article.topic,
+    Article.tier,
+    Article.status,
+    Article.progress,
+    Article.title,
+    Article.excerpt,
+    Article.cover_image,
+    Article.created_at,
+    Article.completed_at,
+    Article.error,
+)
+
+
+def build_summary(content: Dict[str, Any]) -> Dict[str, Any]:
+    """从最终内容计算列表摘要（标题、摘要、封面图）和下载用的内容哈希"""
+    markdown = content.get("markdown", "") or ""
+    plain = re.sub(r"!\[[^\]]*\]\([^)]*\)", "", markdown)  # 图片
+    plain = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", plain)  # 链接
+    plain = re.sub(r"^\s*#{1,6}\s.*$", "", plain, flags=re.M)  # 标题行
+    plain = re.sub(r"[*_`>#-]+", "", plain)
+    plain = re.sub(r"\s+", " ", plain).strip()
+
+    images = content.get("images") or []
+    return {
+        "title": (content.get("title") or "")[:255] or None,
+        "excerpt": plain[:EXCERPT_LENGTH],
+        "cover_image": images[0] if images else None,
+        "content_hash": content_hash(content)
+    }
+
+
+def encode_cursor(created_at: datetime, article_id: str) -> str:
+    """编码分页游标 (created_at, id)"""
+    raw = json.dumps([created_at.isoformat(), article_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解码分页游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, article_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(article_id)
+    except Exception as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+
+# 状态接口只查询的列
+STATUS_COLUMNS = (
+    Article.id,
+    Article.topic,
+    Article.tier,
+    Article.status,
+    Article.progress,
+    Article.created_at,
+    Article.completed_at,
+    Article.error,
+)
+
+
+def _status_to_dict(row) -> Dict[str, Any]:
+    """状态行转换为字典"""
+    return {
+        "id": row.id,
+        "topic": row.topic,
+        "tier": row.tier,
+        "status": row.status,
+        "progress": row.progress,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "completed_at": row.completed_at.isoformat() if row.completed_at else None,
+        "error": row.error
+    }
+
+
+async def _upsert_contents(session: AsyncSession, article_id: str, **values):
+    """写入内容表（不存在则插入）"""
+    result = await session.execute(
+        update(ArticleContent)
+        .where(ArticleContent.article_id == article_id)
+        .values(updated_at=datetime.utcnow(), **values)
+    )
+    if result.rowcount == 0:
+        session.add(ArticleContent(article_id=article_id, updated_at=datetime.utcnow(), **values))
+
+
+def _summary_to_dict(row) -> Dict[str, Any]:
+    """摘要行转换为字典"""
+    return {
+        "id": row.id,
+        "topic": row.topic,
+        "tier": row.tier,
+        "status": row.status,
+        "progress": row.progress,
+        "title": row.title,
+        "excerpt": row.excerpt,
+        "cover_image": row.cover_image,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "completed_at": row.completed_at.isoformat() if row.completed_at else None,
+        "error": row.error
+    }
+
+
+class LeaseLostError(RuntimeError):
+    """任务租约已被回收或由其他 worker 接管"""
 
 
 class Storage:
@@ -18,10 +142,12 @@ class Storage:
     def __init__(self):
         """初始化存储"""
         self.use_database = True
+        # status -> (过期时间, 总数)
+        self._total_cache: Dict[Optional[str], Tuple[float, int]] = {}
         print("✅ Using Database storage (SQLite/PostgreSQL)")
 
-    async def create_article(self, article_id: str, data: Dict[str, Any]):
-        """创建文章记录"""
+    async def create_article(self, article_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """创建文章记录，返回初始状态"""
         async with async_session() as session:
             article = Article(
                 id=article_id,
@@ -29,20 +155,97 @@ class Storage:
                 tier=data.get("tier"),
                 status=data.get("status", "pending"),
                 progress=data.get("progress", 0),
-                created_at=datetime.utcnow()
+                created_at=datetime.utcnow(),
+                ip_address=data.get("ip_address"),
+                user_fingerprint=data.get("user_fingerprint")
             )
             session.add(article)
             await session.commit()
             print(f"✅ Created article {article_id}")
+            return _status_to_dict(article)
 
     async def get_article(self, article_id: str) -> Optional[Dict[str, Any]]:
-        """获取文章"""
+        """获取文章（含内容表）"""
         async with async_session() as session:
             result = await session.execute(
-                select(Article).where(Article.id == article_id)
+                select(Article, ArticleContent)
+                .outerjoin(ArticleContent, ArticleContent.article_id == Article.id)
+                .where(Article.id == article_id)
             )
-            article = result.scalar_one_or_none()
-            return article.to_dict() if article else None
+            row = result.first()
+            return row[0].to_dict(row[1]) if row else None
+
+    async def get_metadata(self, article_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取文章元数据（只查询 extra_metadata 列）
+
+        Returns:
+            元数据（没有时为空字典），文章不存在返回 None
+        """
+        async with async_session() as session:
+            result = await session.execute(
+                select(Article.id, ArticleContent.extra_metadata)
+                .outerjoin(ArticleContent, ArticleContent.article_id == Article.id)
+                .where(Article.id == article_id)
+            )
+            row = result.first()
+            return (row.extra_metadata or {}) if row else None
+
+    async def get_download_info(self, article_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取下载需要的文章字段（只查询状态、主题和内容哈希，不读内容）
+
+        Returns:
+            {"status", "topic", "content_hash"}，文章不存在返回 None
+        """
+        async with async_session() as session:
+            result = await session.execute(
+                select(Article.status, Article.topic, Article.content_hash).where(Article.id == article_id)
+            )
+            row = result.first()
+            return dict(row._mapping) if row else None
+
+    async def get_content(self, article_id: str) -> Optional[Dict[str, Any]]:
+        """获取文章内容（只查询 content 列），没有内容返回 None"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(ArticleContent.content).where(ArticleContent.article_id == article_id)
+            )
+            return result.scalar_one_or_none()
+
+    async def get_status(self, article_id: str) -> Optional[Dict[str, Any]]:
+        """获取文章状态（只查询状态列）"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(*STATUS_COLUMNS).where(Article.id == article_id)
+            )
+            row = result.first()
+            return _status_to_dict(row) if row else None
+
+    async def get_statuses(self, article_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取文章状态"""
+        if not article_ids:
+            return {}
+        async with async_session() as session:
+            result = await session.execute(
+                select(*STATUS_COLUMNS).where(Article.id.in_(article_ids))
+            )
+            return {row.id: _status_to_dict(row) for row in result.all()}
+
+    def job(self, article_id: str, lease_owner: Optional[str] = None) -> "JobUnitOfWork":
+        """
+        获取任务级工作单元（一次生成任务复用一个 Session）
+
+        用法：
+            async with storage.job(article_id, lease_owner=owner) as job:
+                await job.update_status(status="writing", progress=40)
+                await job.complete(content)
+
+        Args:
+            article_id: 文章 ID
+            lease_owner: 任务租约持有者，检查点和最终写入会先确认租约仍然有效
+        """
+        return JobUnitOfWork(article_id, lease_owner=lease_owner)
 
     async def update_status(
         self,
@@ -52,7 +255,12 @@ class Storage:
         completed_at: Optional[str] = None,
         error: Optional[str] = None
     ):
-        """更新状态"""
+        """
+        直接更新状态（不经过工作单元）
+
+        只用于没有任务在执行时的状态修正，如入队失败、重试未能重新入队；
+        任务执行中的写入一律走 storage.job()，由租约保护
+        """
         async with async_session() as session:
             # 构建更新数据
             update_data = {}
@@ -74,45 +282,107 @@ class Storage:
                 await session.commit()
                 print(f"✅ Updated article {article_id}: {update_data}")
 
-    async def save_content(self, article_id: str, content: Dict[str, Any]):
-        """保存文章内容"""
-        async with async_session() as session:
-            await session.execute(
-                update(Article)
-                .where(Article.id == article_id)
-                .values(content=content)
-            )
-            await session.commit()
-            print(f"✅ Saved content for article {article_id}")
-
     async def list_articles(
         self,
-        page: int = 1,
         limit: int = 20,
-        status: Optional[str] = None
-    ) -> List[Dict[str, Any]]:
-        """获取文章列表"""
+        status: Optional[str] = None,
+        cursor: Optional[str] = None,
+        page: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        获取文章列表（只查询摘要列）
+
+        按 (created_at, id) 倒序做游标分页；未传 cursor 时兼容 page 参数
+
+        Returns:
+            {"articles": [...], "next_cursor": str | None}
+        """
         async with async_session() as session:
-            query = select(Article)
+            query = select(*SUMMARY_COLUMNS)
 
             # 状态过滤
             if status:
                 query = query.where(Article.status == status)
 
-            # 按创建时间倒序
-            query = query.order_by(Article.created_at.desc())
+            # 游标：取严格位于上一页最后一条之后的记录
+            if cursor:
+                created_at, article_id = decode_cursor(cursor)
+                query = query.where(or_(
+                    Article.created_at < created_at,
+                    and_(Article.created_at == created_at, Article.id < article_id)
+                ))
+            elif page and page > 1:
+                query = query.offset((page - 1) * limit)
 
-            # 分页
-            query = query.limit(limit).offset((page - 1) * limit)
+            # 按创建时间倒序
+            query = query.order_by(Article.created_at.desc(), Article.id.desc()).limit(limit)
 
             result = await session.execute(query)
-            articles = result.scalars().all()
+            rows = result.all()
+
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+        return {
+            "articles": [_summary_to_dict(row) for row in rows],
+            "next_cursor": next_cursor
+        }
+
+    async def count_articles(self, status: Optional[str] = None) -> int:
+        """文章总数（短时缓存，避免每次翻页都 COUNT 全表）"""
+        cached = self._total_cache.get(status)
+        now = time.monotonic()
+        if cached and cached[0] > now:
+            return cached[1]
+
+        async with async_session() as session:
+            query = select(func.count()).select_from(Article)
+            if status:
+                query = query.where(Article.status == status)
+            total = (await session.execute(query)).scalar_one()
 
-            return [article.to_dict() for article in articles]
+        self._total_cache[status] = (now + LIST_TOTAL_CACHE_SECONDS, total)
+        return total
+
+    async def backfill_summaries(self, batch_size: int = 100) -> int:
+        """为历史已完成文章补算列表摘要和内容哈希"""
+        filled = 0
+        while True:
+            async with async_session() as session:
+                result = await session.execute(
+                    select(Article.id, ArticleContent.content)
+                    .outerjoin(ArticleContent, ArticleContent.article_id == Article.id)
+                    .where(
+                        Article.status == "completed",
+                        or_(Article.excerpt.is_(None), Article.content_hash.is_(None))
+                    )
+                    .limit(batch_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+
+                for article_id, content in rows:
+                    await session.execute(
+                        update(Article)
+                        .where(Article.id == article_id)
+                        .values(**build_summary(content or {}))
+                    )
+                await session.commit()
+                filled += len(rows)
+
+        if filled:
+            print(f"✅ Backfilled summaries for {filled} articles")
+        return filled
 
     async def delete_article(self, article_id: str):
         """删除文章"""
         async with async_session() as session:
+            await session.execute(
+                delete(ArticleContent).where(ArticleContent.article_id == article_id)
+            )
             await session.execute(
                 delete(Article).where(Article.id == article_id)
             )
@@ -120,6 +390,215 @@ class Storage:
             print(f"✅ Deleted article {article_id}")
 
 
+class JobUnitOfWork:
+    """
+    任务级工作单元
+
+    整个生成任务复用同一个 Session。状态和进度变化只记在内存里（实时状态走
+    job_states 和事件总线），不单独写库，随下一次检查点、部分内容或最终写入一起提交，
+    阶段切换因此和检查点落在同一个事务里。元数据同样累积后随写入提交；
+    最终内容、摘要、元数据、trace 和 completed 状态在同一事务中提交，
+    读者不会看到没有内容的 completed。
+    """
+
+    def __init__(self, article_id: str, lease_owner: Optional[str] = None):
+        """初始化"""
+        self.article_id = article_id
+        self.lease_owner = lease_owner
+        self.session: Optional[AsyncSession] = None
+        # 流水线阶段并发执行，Session 不能并发使用
+        self._lock = asyncio.Lock()
+        self._pending: Dict[str, Any] = {}
+        self._metadata: Dict[str, Any] = {}
+        # 内容表中已保存的检查点和元数据（load_checkpoints 读入后在内存中合并，写入前不再查询）
+        self._checkpoints: Optional[Dict[str, Any]] = None
+        self._stored_metadata: Optional[Dict[str, Any]] = None
+        self._last_partial: Optional[float] = None
+        self.writes = 0
+
+    async def __aenter__(self) -> "JobUnitOfWork":
+        self.session = async_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                await self.flush()
+        finally:
+            await self.session.close()
+            self.session = None
+
+    async def _write(
+        self,
+        article_values: Optional[Dict[str, Any]] = None,
+        content_values: Optional[Dict[str, Any]] = None,
+        guarded: bool = False
+    ):
+        """
+        在同一事务中写文章表和内容表，顺带提交合并中的状态和元数据
+
+        Args:
+            guarded: 先在同一事务中确认租约仍归本 worker（锁住任务行），否则回滚并抛出 LeaseLostError
+        """
+        started = time.monotonic()
+        # 先取走合并中的更新：写库期间其他阶段记录的新状态留给下一次写入
+        pending, metadata = self._pending, self._metadata
+        self._pending, self._metadata = {}, {}
+        article_values = {**pending, **(article_values or {})}
+        content_values = dict(content_values or {})
+        try:
+            if metadata:
+                content_values.setdefault("extra_metadata", {**(await self._stored()), **metadata})
+            if not article_values and not content_values:
+                return
+
+            if guarded and self.lease_owner:
+                held = await self.session.execute(
+                    update(Job)
+                    .where(Job.id == self.article_id, Job.lease_owner == self.lease_owner, Job.status == "running")
+                    .values(heartbeat_at=datetime.utcnow())
+                )
+                if held.rowcount != 1:
+                    await self.session.rollback()
+                    raise LeaseLostError(f"任务 {self.article_id} 的租约已丢失，放弃写入")
+            if article_values:
+                await self.session.execute(
+                    update(Article)
+                    .where(Article.id == self.article_id)
+                    .values(**article_values)
+                )
+            if content_values:
+                await _upsert_contents(self.session, self.article_id, **content_values)
+            await self.session.commit()
+        except LeaseLostError:
+            # 任务已归别的 worker，合并中的状态不再属于本 worker，丢弃
+            raise
+        except BaseException:
+            # 没写成功，放回去，和写库期间新记录的更新合并
+            self._pending = {**pending, **self._pending}
+            self._metadata = {**metadata, **self._metadata}
+            raise
+
+        if "extra_metadata" in content_values:
+            self._stored_metadata = content_values["extra_metadata"]
+        # 计入当前 span 的数据库耗时（见 core.tracing）
+        add_timing("db", time.monotonic() - started)
+        self.writes += 1
+
+    async def update_status(self, status: Optional[str] = None, progress: Optional[int] = None):
+        """记录状态变化（不单独写库，见类说明）"""
+        if status is not None:
+            self._pending["status"] = status
+        if progress is not None:
+            self._pending["progress"] = progress
+
+    async def save_partial(self, title: str, markdown: str):
+        """
+        保存部分内容，顺带写入合并中的状态
+
+        按 PARTIAL_SAVE_INTERVAL 节流，跳过的部分内容不补写（写作完成后检查点会保存全文）
+        """
+        now = time.monotonic()
+        if self._last_partial is not None and now - self._last_partial < PARTIAL_SAVE_INTERVAL:
+            return
+        self._last_partial = now
+        async with self._lock:
+            await self._write(content_values={"content": {
+                "title": title,
+                "markdown": markdown,
+                "partial": True
+            }})
+
+    def update_metadata(self, metadata: Dict[str, Any]):
+        """累积元数据（随下一次写入提交）"""
+        self._metadata.update(metadata)
+
+    async def _stored(self) -> Dict[str, Any]:
+        """已保存的元数据（load_checkpoints 已读入时不再查询）"""
+        if self._stored_metadata is None:
+            result = await self.session.execute(
+                select(ArticleContent.extra_metadata).where(ArticleContent.article_id == self.article_id)
+            )
+            self._stored_metadata = result.scalar_one_or_none() or {}
+        return self._stored_metadata
+
+    async def flush(self):
+        """写入所有合并中的更新"""
+        async with self._lock:
+            await self._write(guarded=True)
+
+    async def complete(
+        self,
+        content: Dict[str, Any],
+        completed_at: datetime,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """原子提交：最终内容 + 摘要 + 元数据 + completed 状态（一次写入）"""
+        async with self._lock:
+            self._pending = {}
+            self._metadata.update(metadata or {})
+            await self._write(
+                {
+                    "status": "completed",
+                    "progress": 100,
+                    "completed_at": completed_at,
+                    **build_summary(content)
+                },
+                {
+                    "content": content,
+                    # 最终内容已包含草稿和配图，检查点不再需要
+                    "checkpoints": None
+                },
+                guarded=True
+            )
+        print(f"✅ Saved content for article {self.article_id} ({self.writes} DB writes)")
+
+    async def load_checkpoints(self) -> Dict[str, Any]:
+        """读取已保存的阶段检查点 {阶段名: 结果}（同时读入已有元数据）"""
+        async with self._lock:
+            result = await self.session.execute(
+                select(ArticleContent.research_data, ArticleContent.checkpoints, ArticleContent.extra_metadata)
+                .where(ArticleContent.article_id == self.article_id)
+            )
+            row = result.first()
+        if row is None:
+            self._checkpoints, self._stored_metadata = {}, {}
+            return {}
+        research_data, checkpoints, metadata = row
+        self._checkpoints = dict(checkpoints or {})
+        self._stored_metadata = dict(metadata or {})
+        completed = dict(self._checkpoints)
+        if research_data is not None:
+            completed["research"] = research_data
+        return completed
+
+    async def checkpoint(self, stage: str, result: Any):
+        """
+        立即保存阶段结果（独立提交，任务之后失败也不会丢），合并中的状态一并写入
+
+        research 写入 research_data 列，其余阶段合并进 checkpoints
+        """
+        async with self._lock:
+            if stage == "research":
+                await self._write(content_values={"research_data": result}, guarded=True)
+                return
+            if self._checkpoints is None:
+                current = await self.session.execute(
+                    select(ArticleContent.checkpoints).where(ArticleContent.article_id == self.article_id)
+                )
+                self._checkpoints = dict(current.scalar_one_or_none() or {})
+            checkpoints = {**self._checkpoints, stage: result}
+            await self._write(content_values={"checkpoints": checkpoints}, guarded=True)
+            self._checkpoints = checkpoints
+
+    async def fail(self, error: str, metadata: Optional[Dict[str, Any]] = None):
+        """标记失败（保留已写入的部分内容）"""
+        async with self._lock:
+            await self.session.rollback()
+            self._metadata.update(metadata or {})
+            await self._write({"status": "failed", "error": error}, guarded=True)
+
+
 # 全局存储实例
 storage = Storage()
 
@@ -130,4 +609,5 @@ from .database import async_session
 async def initialize_storage():
     """初始化存储（创建数据库表）"""
     await init_db()
+    await storage.backfill_summaries()
     print("✅ Database initialized")
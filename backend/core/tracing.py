@@ -0,0 +1,283 @@
+"""
+任务级链路追踪
+轻量 span 记录（开始/结束时间、属性、错误），按任务汇总成一条 trace，
+紧凑格式存入 extra_metadata，可选导出为 OTLP/JSON 文件供本地工具加载
+"""
+
+import os
+import json
+import time
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Any, Optional, Iterator
+import aiofiles
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# 单个任务最多记录的 span 数，超出的只计数
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200"))
+# OTLP/JSON 导出文件（每行一个 ExportTraceServiceRequest，留空不导出）
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ai-writer-backend")
+
+# 紧凑格式版本和每个 span 的字段顺序
+TRACE_FORMAT_VERSION = 1
+SPAN_FIELDS = ["name", "parent", "start_ms", "duration_ms", "status", "attributes", "error"]
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_export_lock = asyncio.Lock()
+
+
+class Span:
+    """一个计时区间"""
+
+    __slots__ = ("trace", "index", "name", "parent", "start", "end", "status", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        """初始化"""
+        self.trace = trace
+        self.index = -1
+        self.name = name
+        self.parent = parent.index if parent is not None else -1
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.status = "ok"
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_timing(self, key: str, seconds: float):
+        """累加一类操作的次数和耗时（如 db），不单独建 span"""
+        self.attributes[f"{key}.count"] = self.attributes.get(f"{key}.count", 0) + 1
+        self.attributes[f"{key}.ms"] = round(self.attributes.get(f"{key}.ms", 0) + seconds * 1000, 1)
+
+    def record_error(self, exc: BaseException):
+        if isinstance(exc, asyncio.CancelledError):
+            self.status = "cancelled"
+            return
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {exc}"[:500]
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+
+
+class _NoopSpan:
+    """未启用追踪或不在任务内时的空 span"""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def add_timing(self, key: str, seconds: float):
+        pass
+
+    def record_error(self, exc: BaseException):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """一次任务执行的全部 span"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        """初始化并创建根 span"""
+        self.trace_id = os.urandom(16).hex()
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.root = self.add(Span(self, name, None, attributes))
+
+    def add(self, span: Span) -> Optional[Span]:
+        """登记 span，超过上限返回 None"""
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return None
+        span.index = len(self.spans)
+        self.spans.append(span)
+        return span
+
+    def to_compact(self, closing: bool = False) -> Dict[str, Any]:
+        """
+        紧凑格式（存库用）
+
+        时间为相对 trace 开始的毫秒数，parent 为父 span 下标（根为 -1），
+        字段顺序见 SPAN_FIELDS
+
+        Args:
+            closing: 未结束的 span 按此刻结束、保留当前状态（随任务最终写入保存时用），
+                否则标记为 unfinished
+        """
+        now = time.perf_counter()
+        spans = []
+        for span in self.spans:
+            end = span.end if span.end is not None else now
+            spans.append([
+                span.name,
+                span.parent,
+                round((span.start - self.origin) * 1000, 1),
+                round((end - span.start) * 1000, 1),
+                span.status if span.end is not None or closing else "unfinished",
+                span.attributes or None,
+                span.error
+            ])
+        return {
+            "v": TRACE_FORMAT_VERSION,
+            "trace_id": self.trace_id,
+            "start": round(self.started_at, 3),
+            "dropped": self.dropped,
+            "spans": spans
+        }
+
+
+def current_span():
+    """当前 span（不在任务内时返回空 span）"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def add_timing(key: str, seconds: float):
+    """把一次操作的耗时累加到当前 span"""
+    span = _current_span.get()
+    if span is not None:
+        span.add_timing(key, seconds)
+
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Optional[Trace]]:
+    """
+    开始一条 trace，块内（包括其中创建的 asyncio 任务）的 span 都归入它
+
+    Returns:
+        Trace，未启用追踪时为 None
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+    trace = Trace(name, attributes)
+    token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.record_error(e)
+        raise
+    finally:
+        trace.root.finish()
+        _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """
+    记录一个子 span（异常会记录后继续抛出）
+
+    用法：
+        with span("aiwriter.write", tier=tier) as s:
+            s.set_attribute("provider", name)
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    child = parent.trace.add(Span(parent.trace, name, parent, attributes))
+    if child is None:
+        yield NOOP_SPAN
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_error(e)
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def expand_trace(compact: Dict[str, Any]) -> Dict[str, Any]:
+    """紧凑格式展开为便于阅读的结构（API 返回用）"""
+    spans = []
+    for index, values in enumerate(compact.get("spans", [])):
+        span_dict = dict(zip(SPAN_FIELDS, values))
+        span_dict["id"] = index
+        spans.append(span_dict)
+    root = spans[0] if spans else {}
+    return {
+        "trace_id": compact.get("trace_id"),
+        "start": compact.get("start"),
+        "duration_ms": root.get("duration_ms"),
+        "status": root.get("status"),
+        "dropped": compact.get("dropped", 0),
+        "spans": spans
+    }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, str):
+        return {"stringValue": value}
+    return {"stringValue": json.dumps(value, ensure_ascii=False)}
+
+
+def to_otlp(compact: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    紧凑格式转为 OTLP/JSON（ExportTraceServiceRequest）
+
+    span ID 由下标生成（在同一 trace 内唯一）
+    """
+    start_ns = int(compact["start"] * 1e9)
+    spans = []
+    for index, values in enumerate(compact.get("spans", [])):
+        item = dict(zip(SPAN_FIELDS, values))
+        begin = start_ns + int(item["start_ms"] * 1e6)
+        otlp_span = {
+            "traceId": compact["trace_id"],
+            "spanId": f"{index + 1:016x}",
+            "name": item["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(begin),
+            "endTimeUnixNano": str(begin + int(item["duration_ms"] * 1e6)),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in (item["attributes"] or {}).items()
+            ],
+            "status": {"code": 2, "message": item["error"] or ""} if item["status"] == "error" else {"code": 1}
+        }
+        if item["parent"] >= 0:
+            otlp_span["parentSpanId"] = f"{item['parent'] + 1:016x}"
+        spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "aiwriter"}, "spans": spans}]
+        }]
+    }
+
+
+async def export_trace(compact: Dict[str, Any]):
+    """追加写入 OTLP/JSON 文件（TRACE_EXPORT_FILE 未设置时跳过）"""
+    if not TRACE_EXPORT_FILE:
+        return
+    line = json.dumps(to_otlp(compact), ensure_ascii=False, separators=(",", ":")) + "\n"
+    async with _export_lock:
+        async with aiofiles.open(TRACE_EXPORT_FILE, "a", encoding="utf-8") as f:
+            await f.write(line)
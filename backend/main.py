@@ -3,29 +3,102 @@ AI Writer FastAPI Backend
 智能写作系统后端服务
 """
 
-from fastapi import FastAPI
+import time
+
+# 冷启动计时起点（放在其他导入之前）
+BOOT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import os
+import asyncio
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
 from api import generate, status, articles
 from core.storage import initialize_storage
+from core.http_client import init_http_clients, close_http_clients
+from core.events import event_bus
+from core.job_queue import WorkerPool, job_queue
+from core.rate_limit import admission, saturation
+from core.pdf_renderer import pdf_renderer
+from core.database import compress_legacy_json
+from core.aiwriter import init_ai_writer, close_ai_writer
+from core.provider_router import get_router
+from core.metrics import METRICS_ENABLED, QUEUE_JOBS, MetricsMiddleware, render_metrics, mark_process_dead
 
 # 加载环境变量
 load_dotenv()
 
+# 是否在 API 进程内运行 worker（默认部署方式）。
+# 设为 false 时任务由独立的 worker.py 执行，需要 USE_REDIS=true 才能实时推送状态
+RUN_WORKERS = os.getenv("RUN_WORKERS", "true").lower() == "true"
+
+# 在途任务达到上限的该比例时，就绪检查（/ready）返回 503 让负载均衡摘流
+HEALTH_SHED_THRESHOLD = float(os.getenv("HEALTH_SHED_THRESHOLD", "1.0"))
+
+# 冷启动目标（导入 + lifespan 初始化，秒），超过时打印警告
+COLD_START_TARGET = float(os.getenv("COLD_START_TARGET", "2.0"))
+
+IMPORTS_DONE = time.perf_counter()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """启动和关闭事件"""
     print("🚀 AI Writer Backend Starting...")
+    startup_began = time.perf_counter()
 
     # 初始化数据库
     await initialize_storage()
 
+    # 后台压缩旧的未压缩大字段
+    compress_task = asyncio.create_task(compress_legacy_json())
+
+    # 初始化共享 HTTP 连接池
+    await init_http_clients()
+
+    # 启动状态事件总线
+    await event_bus.start()
+
+    # 写作提供方和调研引擎进程内只创建一次，图片 SDK 在后台预加载
+    init_ai_writer()
+
+    # 启动任务 worker 池
+    worker_pool = None
+    if RUN_WORKERS:
+        worker_pool = WorkerPool(generate.process_article_generation)
+        await worker_pool.start()
+    elif not event_bus.distributed:
+        print("⚠️  RUN_WORKERS=false 但未连接 Redis，状态推送只能按 STATUS_RECHECK_INTERVAL 轮询数据库")
+    app.state.worker_pool = worker_pool
+
+    # 冷启动耗时：模块导入 + 启动初始化
+    ready = time.perf_counter()
+    app.state.startup = {
+        "imports": round(IMPORTS_DONE - BOOT_STARTED, 3),
+        "init": round(ready - startup_began, 3),
+        "total": round(ready - BOOT_STARTED, 3)
+    }
+    if app.state.startup["total"] > COLD_START_TARGET:
+        print(f"⚠️  Cold start {app.state.startup['total']:.2f}s exceeds target {COLD_START_TARGET:.1f}s: {app.state.startup}")
+    else:
+        print(f"✅ Ready in {app.state.startup['total']:.2f}s (imports {app.state.startup['imports']:.2f}s, init {app.state.startup['init']:.2f}s)")
+
     yield
     print("👋 AI Writer Backend Shutting down...")
 
+    if worker_pool:
+        await worker_pool.stop()
+    compress_task.cancel()
+    await close_ai_writer()
+    await event_bus.stop()
+    await admission.close()
+    await close_http_clients()
+    pdf_renderer.shutdown()
+    mark_process_dead()
+
 # 创建 FastAPI 应用
 app = FastAPI(
     title="AI Writer API",
@@ -45,8 +118,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 前端以 blob 下载时需要读取文件名和 ETag
+    expose_headers=["Content-Disposition", "ETag"],
 )
 
+# 请求耗时指标
+app.add_middleware(MetricsMiddleware)
+
 # 注册路由
 app.include_router(generate.router, prefix="/api", tags=["generate"])
 app.include_router(status.router, prefix="/api", tags=["status"])
@@ -61,14 +139,62 @@ async def root():
         "status": "running"
     }
 
+async def _queue_status() -> Optional[Dict[str, Any]]:
+    """队列深度和饱和度（数据库不可用时返回 None）"""
+    try:
+        counts = await job_queue.counts()
+    except Exception as e:
+        print(f"⚠️ 读取队列深度失败: {e}")
+        return None
+    return {
+        "queued": counts["queued"],
+        "running": counts["running"],
+        "saturation": round(saturation(counts["queued"] + counts["running"]), 3)
+    }
+
 @app.get("/health")
-async def health_check():
-    """健康检查"""
+async def health_check(request: Request):
+    """存活检查（进程能响应就返回 200，队列信息仅供参考）"""
+    worker_pool = request.app.state.worker_pool
     return {
         "status": "healthy",
-        "service": "ai-writer-backend"
+        "service": "ai-writer-backend",
+        "queue": await _queue_status(),
+        "workers": {
+            "concurrency": worker_pool.concurrency,
+            "in_flight": worker_pool.in_flight
+        } if worker_pool else None,
+        "providers": get_router().snapshot(),
+        "rejected": admission.rejected,
+        "startup_seconds": request.app.state.startup["total"]
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """就绪检查（数据库不可用或饱和度达到 HEALTH_SHED_THRESHOLD 时返回 503）"""
+    queue = await _queue_status()
+    if queue is None:
+        status = "unavailable"
+    elif queue["saturation"] >= HEALTH_SHED_THRESHOLD:
+        status = "saturated"
+    else:
+        status = "ready"
+    return JSONResponse(
+        {"status": status, "queue": queue},
+        status_code=200 if status == "ready" else 503
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 指标（队列深度在抓取时从数据库读取）"""
+    if not METRICS_ENABLED:
+        return Response(status_code=404)
+    counts = await job_queue.counts()
+    QUEUE_JOBS.labels("queued").set(counts["queued"])
+    QUEUE_JOBS.labels("running").set(counts["running"])
+    data, content_type = render_metrics()
+    return Response(data, headers={"Content-Type": content_type})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
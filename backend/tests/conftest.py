@@ -0,0 +1,47 @@
+"""
+测试公共配置
+core.database 在导入时读取 DATABASE_URL，必须在导入任何 core 模块之前指向临时 SQLite
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp(prefix="aiwriter-test-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import Base, engine, init_db  # noqa: E402
+
+
+def _run(coro):
+    """在新事件循环中执行协程，结束前释放连接池（连接不能跨事件循环复用）"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def run():
+    """执行协程"""
+    return _run
+
+
+@pytest.fixture
+def db():
+    """清空并重建所有表"""
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await init_db()
+
+    _run(reset())
+    return _run
@@ -0,0 +1,83 @@
+"""JSON 列压缩：编解码往返、旧行兼容和后台迁移"""
+
+import json
+
+import pytest
+from sqlalchemy import select, text, cast, Text
+
+from core import codec
+from core.codec import PREFIX, JSON_COMPRESS_MIN_BYTES, decode_json, encode_json, is_compressed
+from core.database import ArticleContent, async_session, compress_legacy_json
+from core.storage import storage
+
+LARGE = {"title": "标题", "markdown": "这是一段重复的正文。" * 200, "images": ["https://example.com/1.png"]}
+SMALL = {"web_results": []}
+
+
+@pytest.mark.parametrize("name", ["zstd", "zlib"])
+def test_round_trip(monkeypatch, name):
+    monkeypatch.setattr(codec, "JSON_CODEC", name)
+    encoded = encode_json(LARGE)
+
+    assert is_compressed(encoded)
+    assert encoded.startswith(f"{PREFIX}{name}:")
+    assert len(encoded) < len(json.dumps(LARGE, ensure_ascii=False).encode("utf-8"))
+    assert decode_json(encoded) == LARGE
+
+
+def test_small_and_legacy_values_pass_through(monkeypatch):
+    assert encode_json(SMALL) == SMALL
+    assert encode_json(None) is None
+    assert decode_json(LARGE) == LARGE
+
+    monkeypatch.setattr(codec, "JSON_CODEC", "none")
+    assert encode_json(LARGE) == LARGE
+
+
+async def _raw(article_id: str):
+    async with async_session() as session:
+        result = await session.execute(
+            select(cast(ArticleContent.content, Text), cast(ArticleContent.research_data, Text))
+            .where(ArticleContent.article_id == article_id)
+        )
+        return result.first()
+
+
+def test_compressed_column_round_trip(db):
+    async def scenario():
+        await storage.create_article("a", {"topic": "t", "tier": "A"})
+        async with storage.job("a") as job:
+            await job.checkpoint("research", SMALL)
+            await job.save_partial(title="标题", markdown=LARGE["markdown"])
+        return await _raw("a"), await storage.get_article("a")
+
+    (raw_content, raw_research), article = db(scenario())
+
+    assert json.loads(raw_content).startswith(PREFIX)
+    assert json.loads(raw_research) == SMALL
+    assert article["content"]["markdown"] == LARGE["markdown"]
+    assert article["research_data"] == SMALL
+
+
+def test_compress_legacy_rows(db):
+    async def scenario():
+        await storage.create_article("legacy", {"topic": "t", "tier": "A"})
+        # 直接写入未压缩的旧格式
+        async with async_session() as session:
+            await session.execute(
+                text("INSERT INTO article_contents (article_id, content, research_data) VALUES (:id, :content, :research)"),
+                {"id": "legacy", "content": json.dumps(LARGE), "research": json.dumps(SMALL)}
+            )
+            await session.commit()
+
+        first = await compress_legacy_json(pause=0)
+        second = await compress_legacy_json(pause=0)
+        return first, second, await _raw("legacy"), await storage.get_article("legacy")
+
+    first, second, (raw_content, raw_research), article = db(scenario())
+
+    assert len(json.dumps(SMALL)) < JSON_COMPRESS_MIN_BYTES
+    assert (first, second) == (1, 0)
+    assert json.loads(raw_content).startswith(PREFIX)
+    assert json.loads(raw_research) == SMALL
+    assert article["content"] == LARGE
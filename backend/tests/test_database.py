@@ -0,0 +1,76 @@
+"""数据库：旧版表结构迁移"""
+
+import json
+
+from sqlalchemy import inspect, text
+
+from core.database import Base, engine, init_db
+from core.storage import storage
+
+# 基线版本的 articles 表（大字段还在热表里，没有摘要列）
+BASELINE_ARTICLES = """
+CREATE TABLE articles (
+    id VARCHAR NOT NULL PRIMARY KEY,
+    topic VARCHAR(255) NOT NULL,
+    tier VARCHAR(10) NOT NULL,
+    status VARCHAR(20),
+    progress INTEGER,
+    content JSON,
+    research_data JSON,
+    extra_metadata JSON,
+    created_at DATETIME,
+    completed_at DATETIME,
+    error TEXT,
+    ip_address VARCHAR(45),
+    user_fingerprint VARCHAR(64)
+)
+"""
+
+CONTENT = {"title": "量子计算", "markdown": "# 量子计算\n\n正文"}
+RESEARCH = {"topic": "量子计算", "web_results": []}
+METADATA = {"word_count": 6}
+
+
+def _legacy_values(sync_conn):
+    """旧列的剩余值（列已删除时为空）"""
+    columns = {column["name"] for column in inspect(sync_conn).get_columns("articles")}
+    legacy = [name for name in ("content", "research_data", "extra_metadata") if name in columns]
+    if not legacy:
+        return []
+    return [list(row) for row in sync_conn.execute(text(f"SELECT {', '.join(legacy)} FROM articles"))]
+
+
+def test_migrate_legacy_content(run):
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.execute(text("DROP TABLE IF EXISTS articles"))
+            await conn.execute(text(BASELINE_ARTICLES))
+            await conn.execute(
+                text(
+                    "INSERT INTO articles (id, topic, tier, status, progress, content, research_data, "
+                    "extra_metadata, created_at) VALUES ('legacy', '量子计算', 'B', 'completed', 100, "
+                    ":content, :research, :metadata, '2024-01-01 00:00:00')"
+                ),
+                {
+                    "content": json.dumps(CONTENT, ensure_ascii=False),
+                    "research": json.dumps(RESEARCH, ensure_ascii=False),
+                    "metadata": json.dumps(METADATA)
+                }
+            )
+
+        await init_db()
+        # 再次启动不应重复迁移或报错
+        await init_db()
+
+        async with engine.connect() as conn:
+            leftover = await conn.run_sync(_legacy_values)
+        return await storage.get_article("legacy"), leftover
+
+    article, leftover = run(scenario())
+
+    assert article["status"] == "completed"
+    assert article["content"] == CONTENT
+    assert article["research_data"] == RESEARCH
+    assert article["metadata"] == METADATA
+    assert all(value is None for row in leftover for value in row)
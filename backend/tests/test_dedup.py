@@ -0,0 +1,50 @@
+"""请求去重：并发占用同一个键"""
+
+import asyncio
+
+from core.dedup import RequestDeduplicator, flight_key, idempotency_key
+from core.storage import storage
+
+
+def test_concurrent_claims_have_one_winner(db):
+    dedup = RequestDeduplicator()
+    key = flight_key("digest")
+    article_ids = [f"article-{i}" for i in range(5)]
+
+    async def scenario():
+        for article_id in article_ids:
+            await storage.create_article(article_id, {"topic": "t", "tier": "A"})
+        results = await asyncio.gather(*(dedup.claim(key, article_id, "digest") for article_id in article_ids))
+        return results, await dedup.lookup(key)
+
+    results, current = db(scenario())
+
+    owners = {owner for owner, _ in results}
+    assert len(owners) == 1
+    assert owners <= set(article_ids)
+    assert current == (owners.pop(), "digest")
+
+
+def test_finished_flight_is_taken_over(db):
+    dedup = RequestDeduplicator()
+    key = flight_key("digest")
+
+    async def scenario():
+        await storage.create_article("old", {"topic": "t", "tier": "A", "status": "completed"})
+        await storage.create_article("new", {"topic": "t", "tier": "A"})
+        await dedup.claim(key, "old", "digest")
+        return await dedup.claim(key, "new", "digest")
+
+    assert db(scenario()) == ("new", "digest")
+
+
+def test_idempotency_key_replays_owner(db):
+    dedup = RequestDeduplicator()
+    key = idempotency_key("client-key")
+
+    async def scenario():
+        await storage.create_article("first", {"topic": "t", "tier": "A", "status": "completed"})
+        await dedup.claim(key, "first", "digest-a")
+        return await dedup.claim(key, "second", "digest-b")
+
+    assert db(scenario()) == ("first", "digest-a")
@@ -0,0 +1,94 @@
+"""下载：压缩协商和 ETag，协商缓存命中时不读取内容"""
+
+import gzip
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from api import articles
+from api.articles import _negotiate_encoding, download_article
+from core.database import Article, async_session
+from core.renderer import content_hash
+from core.storage import storage
+
+LONG_MARKDOWN = "# 标题\n\n" + "这是一段足够长、值得压缩的正文。\n\n" * 200
+
+
+async def _completed(article_id: str, markdown: str) -> dict:
+    content = {"title": "标题", "markdown": markdown, "images": []}
+    await storage.create_article(article_id, {"topic": "主题", "tier": "A"})
+    async with storage.job(article_id) as job:
+        await job.complete(content, datetime.utcnow())
+    return content
+
+
+async def _body(response) -> bytes:
+    return b"".join([chunk async for chunk in response.body_iterator])
+
+
+def test_negotiate_encoding():
+    assert _negotiate_encoding(None) == "identity"
+    assert _negotiate_encoding("gzip, deflate") == "gzip"
+    assert _negotiate_encoding("gzip;q=0, identity") == "identity"
+    assert _negotiate_encoding("*") in ("br", "gzip")
+
+
+def test_download_is_compressed_and_revalidated(db, monkeypatch):
+    async def scenario():
+        content = await _completed("a", LONG_MARKDOWN)
+        first = await download_article("a", "markdown", accept_encoding="gzip", if_none_match=None)
+        body = await _body(first)
+
+        async def no_content(article_id):
+            raise AssertionError("304 不应读取内容")
+
+        monkeypatch.setattr(articles.storage, "get_content", no_content)
+        again = await download_article("a", "markdown", accept_encoding="gzip", if_none_match=first.headers["etag"])
+        return content, first, body, again
+
+    content, first, body, again = db(scenario())
+
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["etag"] == f'"{content_hash(content)[:32]}-markdown-gzip"'
+    assert gzip.decompress(body).decode("utf-8") == LONG_MARKDOWN
+    assert again.status_code == 304
+    assert again.headers["etag"] == first.headers["etag"]
+
+
+def test_small_download_is_not_compressed(db):
+    async def scenario():
+        await _completed("a", "# 短文")
+        response = await download_article("a", "markdown", accept_encoding="gzip", if_none_match=None)
+        return response, await _body(response)
+
+    response, body = db(scenario())
+
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"].endswith('-markdown"')
+    assert body.decode("utf-8") == "# 短文"
+
+
+def test_legacy_article_without_stored_hash(db):
+    async def scenario():
+        content = await _completed("a", "# 旧文章")
+        async with async_session() as session:
+            await session.execute(update(Article).where(Article.id == "a").values(content_hash=None))
+            await session.commit()
+        etag = f'"{content_hash(content)[:32]}-markdown"'
+        return await download_article("a", "markdown", accept_encoding=None, if_none_match=etag)
+
+    assert db(scenario()).status_code == 304
+
+
+def test_download_requires_completed_article(db):
+    async def scenario():
+        await storage.create_article("a", {"topic": "主题", "tier": "A"})
+        with pytest.raises(HTTPException) as pending:
+            await download_article("a", "markdown", accept_encoding=None, if_none_match=None)
+        with pytest.raises(HTTPException) as missing:
+            await download_article("missing", "markdown", accept_encoding=None, if_none_match=None)
+        return pending.value.status_code, missing.value.status_code
+
+    assert db(scenario()) == (400, 404)
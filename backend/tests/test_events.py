@@ -0,0 +1,72 @@
+"""事件总线：进程内分发、慢消费者和 Redis 消息转发"""
+
+import json
+
+from core import events
+from core.events import CHANNEL_PREFIX, EventBus
+
+
+def test_publish_reaches_only_matching_subscribers(run):
+    bus = EventBus()
+
+    async def scenario():
+        async with bus.subscribe("a") as first, bus.subscribe("a") as second, bus.subscribe("b") as other:
+            await bus.publish("a", {"id": "a", "status": "writing"})
+            received = [first.get_nowait(), second.get_nowait()]
+            return received, other.empty()
+
+    received, other_empty = run(scenario())
+
+    assert received == [{"id": "a", "status": "writing"}] * 2
+    assert other_empty
+    # 退出后注销
+    assert dict(bus._subscribers) == {}
+
+
+def test_slow_subscriber_drops_oldest_events(run, monkeypatch):
+    monkeypatch.setattr(events, "SUBSCRIBER_QUEUE_SIZE", 2)
+    bus = EventBus()
+
+    async def scenario():
+        async with bus.subscribe("a") as queue:
+            for progress in (10, 20, 30):
+                await bus.publish("a", {"progress": progress})
+            return [queue.get_nowait()["progress"] for _ in range(queue.qsize())]
+
+    assert run(scenario()) == [20, 30]
+
+
+def test_redis_unavailable_falls_back_to_in_process(run, monkeypatch):
+    monkeypatch.setattr(events, "USE_REDIS", True)
+    monkeypatch.setattr(events, "REDIS_URL", "redis://127.0.0.1:1")
+    bus = EventBus()
+
+    async def scenario():
+        await bus.start()
+        async with bus.subscribe("a") as queue:
+            await bus.publish("a", {"status": "completed"})
+            event = queue.get_nowait()
+        await bus.stop()
+        return bus.distributed, event
+
+    assert run(scenario()) == (False, {"status": "completed"})
+
+
+def test_redis_messages_are_dispatched_locally(run):
+    bus = EventBus()
+
+    class FakePubSub:
+        async def listen(self):
+            yield {"type": "psubscribe", "channel": f"{CHANNEL_PREFIX}*", "data": 1}
+            yield {"type": "pmessage", "channel": f"{CHANNEL_PREFIX}a", "data": "not json"}
+            yield {"type": "pmessage", "channel": f"{CHANNEL_PREFIX}a", "data": json.dumps({"status": "writing"})}
+
+    bus._pubsub = FakePubSub()
+
+    async def scenario():
+        async with bus.subscribe("a") as queue:
+            await bus._listen()
+            return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    # 解析失败的消息跳过，不影响后续消息
+    assert run(scenario()) == [{"status": "writing"}]
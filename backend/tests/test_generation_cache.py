@@ -0,0 +1,82 @@
+"""生成缓存：键规范化、两级读取、命中计数批量写入和淘汰"""
+
+from sqlalchemy import select
+
+from core.database import GenerationCacheEntry, async_session
+from core.generation_cache import GenerationCache, make_cache_key
+
+
+async def _hits(key: str):
+    async with async_session() as session:
+        row = (await session.execute(
+            select(GenerationCacheEntry.hit_count, GenerationCacheEntry.last_hit_at)
+            .where(GenerationCacheEntry.key == key)
+        )).first()
+    return tuple(row) if row else None
+
+
+def test_cache_key_ignores_whitespace_but_not_parameters():
+    base = make_cache_key("写一篇  文章\n关于 AI", "gpt-5", 0.7, 8192)
+    assert make_cache_key("写一篇 文章 关于 AI ", "gpt-5", 0.7, 8192) == base
+    assert make_cache_key("写一篇 文章 关于 AI", "gpt-5", 0.8, 8192) != base
+    assert make_cache_key("写一篇 文章 关于 AI", "gemini", 0.7, 8192) != base
+
+
+def test_memory_hits_are_counted_in_batches(db):
+    cache = GenerationCache(memory_size=4)
+
+    async def scenario():
+        await cache.put("k", "gpt-5", {"markdown": "# t"})
+        values = [await cache.get("k") for _ in range(3)]
+        before_flush = await _hits("k")
+        await cache.flush_hits()
+        return values, before_flush, await _hits("k")
+
+    values, before_flush, after_flush = db(scenario())
+
+    assert values == [{"markdown": "# t"}] * 3
+    # 内存命中不逐次写库
+    assert before_flush == (0, None)
+    assert after_flush[0] == 3
+    assert after_flush[1] is not None
+
+
+def test_database_tier_serves_after_memory_eviction(db):
+    cache = GenerationCache(memory_size=1)
+
+    async def scenario():
+        await cache.put("a", "gpt-5", {"markdown": "a"})
+        await cache.put("b", "gpt-5", {"markdown": "b"})
+        # a 已被挤出内存，从数据库读取
+        return await cache.get("a"), await cache.get("missing")
+
+    assert db(scenario()) == ({"markdown": "a"}, None)
+
+
+def test_expired_entries_are_misses(db):
+    cache = GenerationCache(ttl_seconds=-1)
+
+    async def scenario():
+        await cache.put("k", "gpt-5", {"markdown": "# t"})
+        return await cache.get("k"), await cache.prune()
+
+    assert db(scenario()) == (None, 1)
+
+
+def test_prune_evicts_least_recently_hit(db):
+    cache = GenerationCache(memory_size=8, max_rows=2)
+
+    async def scenario():
+        for key in ("old", "hot", "new"):
+            await cache.put(key, "gpt-5", {"markdown": key})
+        await cache.get("old")
+        # prune 先写入命中计数，old 刚被命中，淘汰的是 hot
+        removed = await cache.prune()
+        return removed, await _hits("old"), await _hits("hot"), await _hits("new")
+
+    removed, old, hot, new = db(scenario())
+
+    assert removed == 1
+    assert old[0] == 1
+    assert hot is None
+    assert new is not None
@@ -0,0 +1,55 @@
+"""GPT5 流式生成：被截断的流按临时错误处理，不返回半成品"""
+
+import json
+
+import httpx
+import pytest
+
+from core import gpt5_writer
+from core.gpt5_writer import GPT5Writer
+from core.http_client import IncompleteStreamError, is_transient
+
+
+def _sse(*chunks: dict, done: bool) -> bytes:
+    lines = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks]
+    if done:
+        lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode()
+
+
+def _delta(text: str, finish_reason=None) -> dict:
+    return {"choices": [{"delta": {"content": text}, "finish_reason": finish_reason}]}
+
+
+def _writer(monkeypatch, body: bytes) -> GPT5Writer:
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+    )
+    client = httpx.AsyncClient(transport=transport, base_url="https://api.example.com")
+    monkeypatch.setattr(gpt5_writer, "get_client", lambda provider="apicore": client)
+    monkeypatch.setattr(gpt5_writer, "STREAM_FLUSH_INTERVAL", 0)
+    return GPT5Writer()
+
+
+@pytest.mark.parametrize("body", [
+    _sse(_delta("第一段"), _delta("第二段"), done=True),
+    _sse(_delta("第一段"), _delta("第二段", finish_reason="stop"), done=False),
+])
+def test_complete_stream_returns_content(run, monkeypatch, body):
+    writer = _writer(monkeypatch, body)
+    assert run(writer._stream_with_gpt5("prompt", 100)) == "第一段第二段"
+
+
+def test_truncated_stream_raises_transient_error(run, monkeypatch):
+    writer = _writer(monkeypatch, _sse(_delta("第一段"), _delta("第二"), done=False))
+    partials = []
+
+    async def on_partial(markdown: str, fraction: float):
+        partials.append(markdown)
+
+    with pytest.raises(IncompleteStreamError) as caught:
+        run(writer._stream_with_gpt5("prompt", 100, on_partial))
+
+    assert is_transient(caught.value)
+    # 已接收的内容仍通过回调保存
+    assert partials[-1] == "第一段第二"
@@ -0,0 +1,53 @@
+"""HTTP 客户端：后台并发预热，不阻塞启动"""
+
+import asyncio
+import time
+
+from core import http_client
+
+
+def test_warm_up_runs_concurrently_in_background(run, monkeypatch):
+    monkeypatch.setattr(http_client, "PROVIDERS", {"a": "https://a.example.com", "b": "https://b.example.com", "research": ""})
+    warmed = []
+
+    async def slow_warm_up(provider, client):
+        await asyncio.sleep(0.5)
+        warmed.append(provider)
+
+    monkeypatch.setattr(http_client, "_warm_up", slow_warm_up)
+
+    async def scenario():
+        start = time.perf_counter()
+        await http_client.init_http_clients(warm=True)
+        init_seconds = time.perf_counter() - start
+        pending = list(warmed)
+        await http_client._warm_task
+        warm_seconds = time.perf_counter() - start
+        await http_client.close_http_clients()
+        return init_seconds, pending, warm_seconds
+
+    init_seconds, pending, warm_seconds = run(scenario())
+
+    # 启动不等待预热
+    assert pending == []
+    assert init_seconds < 0.5
+    # 两个 provider 并发预热，总耗时约等于一个
+    assert warm_seconds < 0.9
+    assert sorted(warmed) == ["a", "b"]
+
+
+def test_close_cancels_pending_warm_up(run, monkeypatch):
+    monkeypatch.setattr(http_client, "PROVIDERS", {"a": "https://a.example.com"})
+
+    async def hung_warm_up(provider, client):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(http_client, "_warm_up", hung_warm_up)
+
+    async def scenario():
+        await http_client.init_http_clients(warm=True)
+        task = http_client._warm_task
+        await http_client.close_http_clients()
+        return task.cancelled(), http_client._warm_task
+
+    assert run(scenario()) == (True, None)
@@ -0,0 +1,52 @@
+"""配图：卡住的同步图片客户端不会让后续图片一直等待"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core import aiwriter
+from core.aiwriter import AIWriter
+
+
+def test_hung_provider_falls_back_to_placeholders(run, monkeypatch):
+    monkeypatch.setattr(aiwriter, "IMAGE_TIMEOUT", 0.1)
+    monkeypatch.setattr(aiwriter, "_image_semaphore", asyncio.Semaphore(2))
+    executor = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(aiwriter, "_image_executor", executor)
+
+    hang = threading.Event()
+    writer = AIWriter.__new__(AIWriter)
+
+    def hung(topic, context):
+        hang.wait(10)
+        return "https://example.com/late.png"
+
+    def quick(topic, context):
+        return f"https://example.com/{topic}.png"
+
+    async def scenario():
+        start = time.perf_counter()
+        # 前两张占住全部名额后超时，第三张等不到名额
+        hung_results = await asyncio.gather(*(writer._generate_one_image(hung, i, "t", "") for i in range(3)))
+        elapsed = time.perf_counter() - start
+        held = aiwriter._image_semaphore._value
+
+        hang.set()
+        await asyncio.sleep(0.2)
+        freed = aiwriter._image_semaphore._value
+        recovered = await writer._generate_one_image(quick, 0, "ok", "")
+        return hung_results, elapsed, held, freed, recovered
+
+    try:
+        hung_results, elapsed, held, freed, recovered = run(scenario())
+    finally:
+        hang.set()
+        executor.shutdown(wait=True)
+
+    assert all("placeholder" in url for url in hung_results)
+    assert elapsed < 1
+    # 超时的线程仍在执行，名额不提前归还
+    assert held == 0
+    assert freed == 2
+    assert recovered == "https://example.com/ok.png"
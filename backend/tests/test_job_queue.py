@@ -0,0 +1,122 @@
+"""任务队列：认领和租约回收"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from core.database import Job, async_session
+from core.job_queue import JOB_MAX_ATTEMPTS, job_queue
+from core.storage import storage
+
+
+async def _expire(job_id: str, **values):
+    """把任务的租约改为已过期"""
+    async with async_session() as session:
+        await session.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1), **values)
+        )
+        await session.commit()
+
+
+async def _job(job_id: str) -> Job:
+    async with async_session() as session:
+        return await session.get(Job, job_id)
+
+
+def test_concurrent_claims_take_each_job_once(db):
+    async def scenario():
+        for i in range(3):
+            await job_queue.enqueue(f"job-{i}", {"topic": "t", "tier": "A"})
+
+        claimed = await asyncio.gather(*(job_queue.claim(f"worker-{i}") for i in range(6)))
+        jobs = [job for job in claimed if job is not None]
+        return jobs, [await _job(f"job-{i}") for i in range(3)]
+
+    jobs, rows = db(scenario())
+
+    assert len(jobs) == 3
+    owners = {job.id: job.lease_owner for job in jobs}
+    assert sorted(owners) == ["job-0", "job-1", "job-2"]
+    assert len(set(owners.values())) == 3
+    for row in rows:
+        assert row.status == "running"
+        assert row.attempts == 1
+        assert row.lease_owner == owners[row.id]
+
+
+def test_claim_returns_none_when_queue_is_empty(db):
+    assert db(job_queue.claim("worker")) is None
+
+
+def test_requeue_expired(db):
+    async def scenario():
+        for job_id in ("retry", "dead", "alive"):
+            await storage.create_article(job_id, {"topic": "t", "tier": "A", "status": "writing"})
+            await job_queue.enqueue(job_id, {"topic": "t", "tier": "A"})
+            await job_queue.claim(f"owner-{job_id}")
+
+        await _expire("retry")
+        await _expire("dead", attempts=JOB_MAX_ATTEMPTS)
+
+        requeued = await job_queue.requeue_expired()
+        stale_heartbeat = await job_queue.heartbeat("retry", "owner-retry")
+        jobs = {job_id: await _job(job_id) for job_id in ("retry", "dead", "alive")}
+        articles = {job_id: await storage.get_status(job_id) for job_id in ("retry", "dead", "alive")}
+        return requeued, stale_heartbeat, jobs, articles
+
+    requeued, stale_heartbeat, jobs, articles = db(scenario())
+
+    assert requeued == 1
+    assert stale_heartbeat is False
+
+    assert jobs["retry"].status == "queued"
+    assert jobs["retry"].lease_owner is None
+    assert articles["retry"]["status"] == "pending"
+
+    assert jobs["dead"].status == "failed"
+    assert articles["dead"]["status"] == "failed"
+    assert articles["dead"]["error"]
+
+    assert jobs["alive"].status == "running"
+    assert jobs["alive"].lease_owner == "owner-alive"
+
+
+def test_requeue_resets_article_with_job(db):
+    async def scenario():
+        for job_id in ("failed", "running", "legacy", "broken"):
+            await storage.create_article(job_id, {"topic": "t", "tier": "A", "status": "failed"})
+        await job_queue.enqueue("failed", {"topic": "t", "tier": "A"})
+        await job_queue.claim("owner")
+        await job_queue.fail("failed", "owner", "boom")
+        await job_queue.enqueue("running", {"topic": "t", "tier": "A"})
+        await job_queue.claim("owner")
+
+        outcomes = {
+            "failed": await job_queue.requeue("failed", {}),
+            "running": await job_queue.requeue("running", {}),
+            "legacy": await job_queue.requeue("legacy", {"topic": "t", "tier": "A"}),
+            "missing": await job_queue.requeue("missing", {}),
+        }
+        try:
+            # 排队失败（参数无法序列化）时文章重置一起回滚
+            await job_queue.requeue("broken", {"topic": object()})
+        except Exception:
+            outcomes["broken"] = "raised"
+        jobs = {job_id: await _job(job_id) for job_id in ("failed", "running", "legacy", "broken")}
+        articles = {job_id: await storage.get_status(job_id) for job_id in ("failed", "running", "legacy", "broken")}
+        return outcomes, jobs, articles
+
+    outcomes, jobs, articles = db(scenario())
+
+    assert outcomes == {"failed": True, "running": False, "legacy": True, "missing": None, "broken": "raised"}
+    assert (jobs["failed"].status, jobs["failed"].attempts) == ("queued", 0)
+    assert jobs["legacy"].status == "queued"
+    assert jobs["running"].status == "running"
+    assert jobs["broken"] is None
+    assert articles["failed"]["status"] == "pending"
+    assert articles["legacy"]["status"] == "pending"
+    assert articles["running"]["status"] == "failed"
+    assert articles["broken"]["status"] == "failed"
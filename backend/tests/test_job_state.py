@@ -0,0 +1,47 @@
+"""任务状态表：结束状态的缓存时长"""
+
+from core.job_state import JobStateRegistry
+
+
+def _state(article_id: str, status: str) -> dict:
+    return {"id": article_id, "topic": "t", "tier": "A", "status": status, "progress": 0}
+
+
+def test_owned_job_stays_until_finished(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("core.job_state.time.monotonic", lambda: now[0])
+    registry = JobStateRegistry(ttl=300, remote_ttl=2)
+
+    registry.track(_state("a", "writing"), owned=True)
+    now[0] += 1000
+    assert registry.get("a")["status"] == "writing"
+
+    registry.update("a", status="completed", progress=100)
+    registry.disown("a")
+    now[0] += 299
+    assert registry.get("a")["status"] == "completed"
+
+
+def test_failed_job_expires_quickly_for_retry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("core.job_state.time.monotonic", lambda: now[0])
+    registry = JobStateRegistry(ttl=300, remote_ttl=2)
+
+    registry.track(_state("a", "writing"), owned=True)
+    registry.update("a", status="failed", error="boom")
+    registry.disown("a")
+    assert registry.get("a")["status"] == "failed"
+    # 其他进程重试后，这里不能继续返回 failed
+    now[0] += 3
+    assert registry.get("a") is None
+
+
+def test_remote_terminal_state_is_not_cached_long(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("core.job_state.time.monotonic", lambda: now[0])
+    registry = JobStateRegistry(ttl=300, remote_ttl=2)
+
+    registry.track(_state("a", "pending"))
+    registry.update("a", status="completed")
+    now[0] += 3
+    assert registry.get("a") is None
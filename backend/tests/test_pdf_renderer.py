@@ -0,0 +1,58 @@
+"""PDF 渲染：行内标记配对、解析失败降级和磁盘缓存"""
+
+import asyncio
+
+import pytest
+
+from core import pdf_renderer as pdf_module
+from core.pdf_renderer import PDFRenderer, _inline, render_pdf_bytes
+
+NESTED = "# 标题\n\n**加粗里有 *斜体* 和 `代码`** 以及 *斜体里 **加粗** 结束*\n\n- 列表 **a *b** c*\n\n> 引用 ***两者***"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("a **b** c *d* e", "a <b>b</b> c <i>d</i> e"),
+    ("*a **b** c*", "<i>a <b>b</b> c</i>"),
+    ("***x***", "<b><i>x</i></b>"),
+    # 交错的标记：先闭合的一对生效，中间未配对的按原文输出
+    ("**a *b** c*", "<b>a *b</b> c*"),
+    ("5 * 3 = 15", "5 * 3 = 15"),
+    ("**未闭合", "**未闭合"),
+    ("`**代码**` 和 [**链接**](https://example.com)", "**代码** 和 **链接**"),
+    ("a < b & c", "a &lt; b &amp; c"),
+])
+def test_inline_markup_is_well_nested(text, expected):
+    assert _inline(text) == expected
+
+
+def test_nested_emphasis_renders():
+    assert render_pdf_bytes("标题", NESTED).startswith(b"%PDF")
+
+
+def test_unparseable_markup_falls_back_to_plain_text(monkeypatch):
+    monkeypatch.setattr(pdf_module, "_inline", lambda text: "<b>未闭合")
+    assert render_pdf_bytes("标题", "**正文**").startswith(b"%PDF")
+
+
+def test_render_writes_once_to_disk_cache(tmp_path, monkeypatch):
+    renderer = PDFRenderer(cache_dir=str(tmp_path))
+    calls = []
+
+    async def fake_render_to(path, title, markdown):
+        calls.append(path)
+        await asyncio.sleep(0.01)
+        with open(path, "wb") as f:
+            f.write(render_pdf_bytes(title, markdown))
+
+    monkeypatch.setattr(renderer, "_render_to", fake_render_to)
+
+    async def scenario():
+        (tmp_path / "ab").mkdir()
+        first = await asyncio.gather(*(renderer.render("ab" * 32, "标题", NESTED) for _ in range(3)))
+        again = await renderer.render("ab" * 32, "标题", NESTED)
+        return first, again
+
+    first, again = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert set(first) == {again} == {renderer.path_for("ab" * 32)}
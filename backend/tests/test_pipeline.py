@@ -0,0 +1,52 @@
+"""流水线：从检查点恢复"""
+
+from typing import Any, Dict, List
+
+from core.pipeline import Pipeline, Stage
+
+
+def _stages(calls: List[str]) -> List[Stage]:
+    def runner(name: str):
+        async def run(deps: Dict[str, Any]) -> Any:
+            calls.append(name)
+            return {"stage": name, "deps": sorted(deps)}
+        return run
+
+    return [
+        Stage("research", runner("research"), weight=20),
+        Stage("write", runner("write"), deps=["research"], weight=50),
+        Stage("images", runner("images"), deps=["research"], weight=20),
+        Stage("integrate", runner("integrate"), deps=["write", "images"], weight=10),
+    ]
+
+
+def test_resume_skips_completed_stages(run):
+    calls: List[str] = []
+    saved: List[str] = []
+
+    async def on_stage_done(name: str, result: Any):
+        saved.append(name)
+
+    completed = {"research": "cached research", "write": "cached article", "unknown": "ignored"}
+    pipeline = Pipeline(_stages(calls), completed=completed, on_stage_done=on_stage_done)
+
+    assert pipeline.progress == 70
+    results = run(pipeline.run())
+
+    assert sorted(calls) == ["images", "integrate"]
+    assert sorted(saved) == ["images", "integrate"]
+    assert results["research"] == "cached research"
+    assert results["write"] == "cached article"
+    assert results["integrate"] == {"stage": "integrate", "deps": ["images", "write"]}
+    assert "unknown" not in results
+    assert pipeline.progress == 100
+
+
+def test_fully_completed_pipeline_runs_nothing(run):
+    calls: List[str] = []
+    completed = {name: name for name in ("research", "write", "images", "integrate")}
+
+    results = run(Pipeline(_stages(calls), completed=completed).run())
+
+    assert calls == []
+    assert results == completed
@@ -0,0 +1,90 @@
+"""写作模型路由：故障转移、冷却、按延迟排序和对冲请求"""
+
+import asyncio
+import time
+
+import pytest
+
+from core import provider_router
+from core.provider_router import MockWriter, ProviderRouter
+
+
+class FailingWriter(MockWriter):
+    """总是失败的提供方"""
+
+    async def generate_article(self, topic, tier, research_data, on_partial=None):
+        raise RuntimeError(f"{self.name} 不可用")
+
+
+def test_failover_to_next_provider(run):
+    router = ProviderRouter([("down", FailingWriter("down")), ("up", MockWriter("up", latency=0.01))])
+
+    result = run(router.generate_article("主题", "A", {}))
+
+    assert result["provider"] == "up"
+    assert router.stats["down"].failures == 1
+    assert router.stats["up"].calls == 1
+
+
+def test_failing_provider_cools_down(run, monkeypatch):
+    monkeypatch.setattr(provider_router, "ROUTER_FAILURE_THRESHOLD", 1)
+    router = ProviderRouter([("down", FailingWriter("down")), ("up", MockWriter("up", latency=0.01))])
+
+    run(router.generate_article("主题", "A", {}))
+
+    assert [name for name, _ in router.ranked("A")] == ["up"]
+    assert router.snapshot()["down"]["available"] is False
+
+
+def test_all_providers_failing_raises(run):
+    router = ProviderRouter([("a", FailingWriter("a")), ("b", FailingWriter("b"))])
+
+    with pytest.raises(RuntimeError, match="所有写作提供方均失败"):
+        run(router.generate_article("主题", "A", {}))
+
+
+def test_ranked_by_observed_latency_per_tier():
+    router = ProviderRouter([("slow", MockWriter("slow")), ("fast", MockWriter("fast"))])
+    router.stats["slow"].record_success("A", 3.0)
+    router.stats["fast"].record_success("A", 1.0)
+
+    assert [name for name, _ in router.ranked("A")] == ["fast", "slow"]
+    # 没有样本的档位保持配置顺序
+    assert [name for name, _ in router.ranked("D")] == ["slow", "fast"]
+
+
+def test_hedge_after_primary_p95(run, monkeypatch):
+    monkeypatch.setattr(provider_router, "ROUTER_HEDGE_MIN_SAMPLES", 5)
+    router = ProviderRouter(
+        [("primary", MockWriter("primary", latency=2.0)), ("backup", MockWriter("backup", latency=0.05))],
+        hedge=True
+    )
+    for _ in range(5):
+        router.stats["primary"].record_success("A", 0.05)
+
+    partials = []
+
+    async def on_partial(markdown, fraction):
+        partials.append(markdown)
+
+    async def scenario():
+        start = time.perf_counter()
+        result = await router.generate_article("主题", "A", {}, on_partial=on_partial)
+        return result, time.perf_counter() - start
+
+    result, elapsed = run(scenario())
+
+    assert result["provider"] == "backup"
+    assert elapsed < 1.0
+    # 首选方第一段尚未输出，部分内容全部来自接手的一路
+    assert partials and all("backup" in markdown for markdown in partials)
+
+
+def test_no_hedge_without_enough_samples(run):
+    router = ProviderRouter(
+        [("primary", MockWriter("primary", latency=0.05)), ("backup", MockWriter("backup", latency=0.01))],
+        hedge=True
+    )
+
+    assert run(router.generate_article("主题", "A", {}))["provider"] == "primary"
+    assert router.stats["backup"].calls == 0
@@ -0,0 +1,87 @@
+"""准入控制：客户端识别和令牌桶"""
+
+from starlette.requests import Request
+
+from core import rate_limit
+from core.rate_limit import MemoryTokenBucket, client_ip, rate_limit_key
+
+
+def _request(peer: str, forwarded: str = None, user_agent: str = "ua") -> Request:
+    headers = [(b"user-agent", user_agent.encode())]
+    if forwarded is not None:
+        headers.append((b"x-forwarded-for", forwarded.encode()))
+    return Request({
+        "type": "http",
+        "method": "POST",
+        "path": "/api/generate",
+        "headers": headers,
+        "client": (peer, 12345),
+    })
+
+
+def test_direct_client_ignores_forwarded_header():
+    assert client_ip(_request("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+
+
+def test_trusted_proxy_uses_forwarded_client():
+    assert client_ip(_request("10.0.0.5", "198.51.100.1")) == "198.51.100.1"
+
+
+def test_spoofed_leftmost_entry_is_skipped():
+    # 客户端自己填了一个地址，代理在右侧追加了真实地址
+    assert client_ip(_request("10.0.0.5", "1.2.3.4, 198.51.100.1")) == "198.51.100.1"
+
+
+def test_chained_trusted_proxies_are_skipped():
+    assert client_ip(_request("10.0.0.5", "198.51.100.1, 100.64.0.9, 10.1.2.3")) == "198.51.100.1"
+
+
+def test_headers_ignored_when_disabled(monkeypatch):
+    monkeypatch.setattr(rate_limit, "TRUST_PROXY_HEADERS", False)
+    assert client_ip(_request("10.0.0.5", "198.51.100.1")) == "10.0.0.5"
+
+
+def test_clients_behind_the_proxy_get_separate_keys():
+    first = rate_limit_key(_request("10.0.0.5", "198.51.100.1"))
+    second = rate_limit_key(_request("10.0.0.5", "198.51.100.2"))
+    assert first == "198.51.100.1"
+    assert second == "198.51.100.2"
+
+
+def test_proxy_without_forwarded_header_keys_on_fingerprint():
+    first = rate_limit_key(_request("10.0.0.5", user_agent="browser-a"))
+    second = rate_limit_key(_request("10.0.0.5", user_agent="browser-b"))
+    assert first.startswith("fp:")
+    assert first != second
+
+
+def test_token_bucket_burst_then_refill(run, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    bucket = MemoryTokenBucket(capacity=2, per_second=0.5)
+
+    async def scenario():
+        results = [await bucket.acquire("a") for _ in range(3)]
+        other = await bucket.acquire("b")
+        now[0] += 2
+        refilled = await bucket.acquire("a")
+        return results, other, refilled
+
+    results, other, refilled = run(scenario())
+
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    assert results[2][1] == 2.0
+    assert other == (True, 0.0)
+    assert refilled == (True, 0.0)
+
+
+def test_token_bucket_evicts_oldest_clients(run):
+    bucket = MemoryTokenBucket(capacity=1, per_second=0.001, max_clients=2)
+
+    async def scenario():
+        for client in ("a", "b", "c"):
+            await bucket.acquire(client)
+        # a 已被淘汰，重新获得满桶
+        return await bucket.acquire("a")
+
+    assert run(scenario())[0] is True
@@ -0,0 +1,54 @@
+"""格式渲染：HTML 降级转义和有界渲染缓存"""
+
+import asyncio
+import sys
+
+from core.renderer import RenderCache, markdown_to_html, to_xiaohongshu_format
+
+
+def test_html_fallback_escapes_markup(monkeypatch):
+    # 模拟未安装 markdown 库
+    monkeypatch.setitem(sys.modules, "markdown", None)
+    rendered = markdown_to_html("# 标题\n<script>alert(1)</script> & 正文")
+
+    assert "<script>" not in rendered
+    assert rendered == "<div># 标题<br>&lt;script&gt;alert(1)&lt;/script&gt; &amp; 正文</div>"
+
+
+def test_xiaohongshu_format():
+    text = to_xiaohongshu_format("# 标题\n\n**重点**", ["https://example.com/1.png"])
+
+    assert text.startswith("✨  标题")
+    assert "重点" in text and "*" not in text.split("#AI写作")[0]
+    assert "https://example.com/1.png" in text
+
+
+def test_render_cache_evicts_by_bytes():
+    cache = RenderCache(max_bytes=10)
+    cache.put(("a", "html", "1"), b"12345")
+    cache.put(("b", "html", "1"), b"12345")
+    cache.get(("a", "html", "1"))
+    cache.put(("c", "html", "1"), b"12345")
+    # 太大的值不缓存
+    cache.put(("d", "html", "1"), b"x" * 11)
+
+    assert cache.get(("b", "html", "1")) is None
+    assert cache.get(("a", "html", "1")) == b"12345"
+    assert cache.get(("d", "html", "1")) is None
+    assert cache.size == 10
+
+
+def test_render_cache_renders_concurrent_requests_once(run):
+    cache = RenderCache()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "<p>x</p>"
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_create(("a", "html", "1"), factory) for _ in range(5)))
+
+    assert run(scenario()) == ["<p>x</p>"] * 5
+    assert len(calls) == 1
@@ -0,0 +1,68 @@
+"""调研压缩：token 估算、预算、去重和相关度排序"""
+
+from core import research_compactor
+from core.research_compactor import compact_research, estimate_tokens
+
+
+def _item(title: str, snippet: str = "", url: str = "") -> dict:
+    return {"title": title, "snippet": snippet, "url": url}
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("人工智能") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("AI 写作") == 2 + 1
+
+
+def test_string_research_passes_through():
+    assert compact_research("已整理的调研", "主题", "A", log=False) == "已整理的调研"
+
+
+def test_empty_research():
+    assert compact_research({}, "主题", "A", log=False) == "（暂无调研结果）"
+
+
+def test_near_duplicates_are_dropped_and_relevant_items_first():
+    data = {
+        "web_results": [
+            _item("园艺入门", "如何种植番茄"),
+            _item("人工智能写作工具对比", "几款 AI 写作工具的优缺点", "https://example.com/a"),
+            _item("人工智能写作工具对比", "几款 AI 写作工具的优缺点！", "https://example.com/b"),
+        ],
+        "academic_results": [_item("大语言模型与人工智能写作", "综述")],
+    }
+
+    block = compact_research(data, "人工智能写作", "D", log=False)
+    lines = block.splitlines()
+
+    assert len(lines) == 3
+    assert lines[0] == "- [web] 人工智能写作工具对比：几款 AI 写作工具的优缺点（https://example.com/a）"
+    assert lines[1].startswith("- [web] 园艺入门")
+    assert lines[2].startswith("- [academic] 大语言模型与人工智能写作")
+
+
+def _distinct_text(seed: int, length: int) -> str:
+    """互不相似的中文文本（避免被当作近似重复）"""
+    return "".join(chr(0x4E00 + (seed * 7919 + j * 31) % 20000) for j in range(length))
+
+
+def test_block_fits_tier_budget(monkeypatch):
+    monkeypatch.setitem(research_compactor.RESEARCH_TOKEN_BUDGETS, "A", 2000)
+    keys = ("web_results", "wechat_results", "xiaohongshu_results", "academic_results")
+    data = {
+        key: [_item(_distinct_text(k * 100 + i, 20), _distinct_text(k * 100 + i + 50, 400)) for i in range(20)]
+        for k, key in enumerate(keys)
+    }
+
+    block = compact_research(data, "主题", "A", log=False)
+    lines = block.splitlines()
+
+    assert estimate_tokens(block) <= 2000
+    assert len(lines) < 80
+    # 长摘要被截断
+    assert all(len(line) < 400 for line in lines)
+    assert any(line.endswith("…") for line in lines)
+    # 每个来源都分到了额度
+    for source in ("web", "wechat", "xiaohongshu", "academic"):
+        assert any(line.startswith(f"- [{source}]") for line in lines)
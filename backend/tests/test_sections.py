@@ -0,0 +1,50 @@
+"""长文分段：大纲解析、章节标题规范化和拼接去重"""
+
+from core.sections import build_section_prompt, normalize_section, parse_outline, stitch_sections
+
+REPEATED = "人工智能正在改变内容创作的方式，写作者需要重新思考自己的角色和价值。"
+
+
+def test_parse_outline_json_in_code_block():
+    text = '好的：\n```json\n[{"title": "开头", "points": ["背景"]}, {"title": "  "}, {"title": "结尾"}]\n```'
+
+    assert parse_outline(text, 8) == [
+        {"title": "开头", "points": ["背景"]},
+        {"title": "结尾", "points": []},
+    ]
+
+
+def test_parse_outline_falls_back_to_markdown_lines():
+    text = "# 引言\n1. 技术原理\n2、应用场景\n- 未来展望\n普通说明文字"
+
+    assert [item["title"] for item in parse_outline(text, 3)] == ["引言", "技术原理", "应用场景"]
+
+
+def test_section_prompt_marks_position():
+    outline = [{"title": t, "points": []} for t in ("开头", "中间", "结尾")]
+
+    assert "开头章节" in build_section_prompt("AI", outline, 0, 1000, "")
+    assert "中间章节" in build_section_prompt("AI", outline, 1, 1000, "")
+    assert "结尾章节" in build_section_prompt("AI", outline, 2, 1000, "")
+
+
+def test_normalize_section_headings():
+    markdown = "\n# 模型自带的标题\n## 第二个标题\n正文\n## 内部标题\n### 小节"
+
+    assert normalize_section("技术原理", markdown) == "## 技术原理\n\n正文\n### 内部标题\n### 小节"
+
+
+def test_stitch_drops_repeated_paragraphs_only():
+    sections = [
+        f"## 开头\n\n{REPEATED}\n\n- 要点",
+        f"## 中间\n\n{REPEATED}\n\n- 要点\n\n新的内容段落，讨论的是完全不同的话题和角度。",
+    ]
+
+    stitched = stitch_sections("标题", sections)
+
+    assert stitched.startswith("# 标题\n\n## 开头")
+    assert stitched.count(REPEATED) == 1
+    # 标题和很短的段落不去重
+    assert stitched.count("- 要点") == 2
+    assert "## 中间" in stitched
+    assert stitched.endswith("新的内容段落，讨论的是完全不同的话题和角度。\n")
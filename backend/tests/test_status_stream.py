@@ -0,0 +1,87 @@
+"""状态推送：任务在其他进程执行时靠重新读取状态推进"""
+
+import asyncio
+
+from sqlalchemy import update
+
+from api import status as status_api
+from api.generate import announce_partial
+from core.database import Article, async_session
+from core.events import event_bus
+from core.storage import storage
+
+
+async def _set_status(article_id: str, **values):
+    async with async_session() as session:
+        await session.execute(update(Article).where(Article.id == article_id).values(**values))
+        await session.commit()
+
+
+def test_follow_rechecks_status_without_events(db, monkeypatch):
+    monkeypatch.setattr(status_api, "STATUS_RECHECK_INTERVAL", 0.05)
+
+    async def scenario():
+        snapshot = await storage.create_article("remote", {"topic": "t", "tier": "A", "status": "writing", "progress": 40})
+        queue: asyncio.Queue = asyncio.Queue()
+        events = []
+
+        async def follow():
+            async for event in status_api._follow("remote", queue, snapshot):
+                events.append(event)
+
+        task = asyncio.create_task(follow())
+        await asyncio.sleep(0.12)
+        await _set_status("remote", status="integrating", progress=90)
+        await asyncio.sleep(0.12)
+        await _set_status("remote", status="completed", progress=100)
+        await asyncio.wait_for(task, timeout=2)
+        return events
+
+    events = [event for event in db(scenario()) if event is not None]
+
+    assert [(event["status"], event["progress"]) for event in events] == [
+        ("integrating", 90),
+        ("completed", 100),
+    ]
+
+
+def test_follow_prefers_bus_events(db, monkeypatch):
+    monkeypatch.setattr(status_api, "STATUS_RECHECK_INTERVAL", 5)
+
+    async def scenario():
+        queue: asyncio.Queue = asyncio.Queue()
+        queue.put_nowait({"id": "a", "status": "writing", "progress": 50})
+        queue.put_nowait({"id": "a", "status": "failed", "error": "boom"})
+        return [event async for event in status_api._follow("a", queue, {"status": "pending", "progress": 0})]
+
+    events = db(scenario())
+
+    assert [event["status"] for event in events] == ["writing", "failed"]
+
+
+def test_follow_ends_when_article_is_deleted(db, monkeypatch):
+    monkeypatch.setattr(status_api, "STATUS_RECHECK_INTERVAL", 0.01)
+
+    async def scenario():
+        queue: asyncio.Queue = asyncio.Queue()
+        return [event async for event in status_api._follow("missing", queue, {"status": "writing", "progress": 40})]
+
+    assert db(scenario()) == []
+
+
+def test_follow_forwards_partial_content(db, monkeypatch):
+    monkeypatch.setattr(status_api, "STATUS_RECHECK_INTERVAL", 5)
+
+    async def scenario():
+        queue = event_bus.add_subscriber("a")
+        try:
+            await announce_partial("a", "t", "# t\n\n开头")
+            await event_bus.publish("a", {"id": "a", "status": "completed", "progress": 100})
+            return [event async for event in status_api._follow("a", queue, {"status": "writing", "progress": 40})]
+        finally:
+            event_bus.remove_subscriber("a", queue)
+
+    events = db(scenario())
+
+    assert events[0]["content"] == {"title": "t", "markdown": "# t\n\n开头", "partial": True}
+    assert events[1]["status"] == "completed"
@@ -0,0 +1,59 @@
+"""任务工作单元：状态随检查点写入，整个任务只有少量写库"""
+
+from datetime import datetime
+
+import pytest
+
+from core.job_queue import job_queue
+from core.storage import LeaseLostError, storage
+
+
+def test_status_changes_fold_into_checkpoint_and_complete(db):
+    async def scenario():
+        await storage.create_article("a", {"topic": "t", "tier": "A"})
+        async with storage.job("a") as job:
+            await job.load_checkpoints()
+            for progress in (10, 20, 30):
+                await job.update_status(status="researching", progress=progress)
+            before_checkpoint = await storage.get_status("a")
+
+            await job.update_status(status="writing", progress=40)
+            await job.checkpoint("research", {"web_results": []})
+            after_checkpoint = await storage.get_status("a")
+
+            await job.save_partial(title="t", markdown="# t\n\n开头")
+            await job.save_partial(title="t", markdown="# t\n\n开头，继续")
+            job.update_metadata({"provider": "mock"})
+            await job.checkpoint("write", {"markdown": "# t"})
+            await job.complete({"title": "t", "markdown": "# t\n\n全文"}, datetime.utcnow(), metadata={"trace": {"v": 1}})
+            writes = job.writes
+
+        return before_checkpoint, after_checkpoint, writes, await storage.get_article("a"), await storage.get_metadata("a")
+
+    before_checkpoint, after_checkpoint, writes, article, metadata = db(scenario())
+
+    assert before_checkpoint["status"] == "pending"
+    assert (after_checkpoint["status"], after_checkpoint["progress"]) == ("writing", 40)
+    # 研究检查点、第一段部分内容（第二段被节流）、写作检查点、完成
+    assert writes == 4
+    assert article["status"] == "completed"
+    assert article["content"]["markdown"] == "# t\n\n全文"
+    assert metadata == {"provider": "mock", "trace": {"v": 1}}
+
+
+def test_checkpoint_after_lease_loss_is_rejected(db):
+    async def scenario():
+        await storage.create_article("a", {"topic": "t", "tier": "A"})
+        await job_queue.enqueue("a", {"topic": "t", "tier": "A"})
+        claimed = await job_queue.claim("owner-1")
+        async with storage.job("a", lease_owner="owner-2") as job:
+            await job.load_checkpoints()
+            await job.update_status(status="writing", progress=40)
+            with pytest.raises(LeaseLostError):
+                await job.checkpoint("research", {})
+        return claimed, await storage.get_status("a")
+
+    claimed, status = db(scenario())
+
+    assert claimed.lease_owner == "owner-1"
+    assert status["status"] == "pending"
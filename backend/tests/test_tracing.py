@@ -0,0 +1,91 @@
+"""链路追踪：span 树、跨任务传播、紧凑格式和 OTLP 导出"""
+
+import asyncio
+import json
+
+import pytest
+
+from core import tracing
+from core.tracing import add_timing, current_span, expand_trace, export_trace, span, start_trace, to_otlp
+
+
+def test_spans_follow_tasks_and_record_errors(run):
+    async def scenario():
+        with start_trace("job", tier="A") as trace:
+            async def stage(name: str):
+                with span(f"stage.{name}") as stage_span:
+                    add_timing("db", 0.002)
+                    add_timing("db", 0.003)
+                    stage_span.set_attribute("stage", name)
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(stage("a"), stage("b"))
+            with pytest.raises(ValueError):
+                with span("broken"):
+                    raise ValueError("bad input")
+        return trace.to_compact()
+
+    compact = run(scenario())
+    expanded = expand_trace(compact)
+    spans = {item["name"]: item for item in expanded["spans"]}
+
+    assert expanded["status"] == "ok"
+    assert spans["job"]["parent"] == -1
+    assert spans["stage.a"]["parent"] == spans["stage.b"]["parent"] == 0
+    assert spans["stage.a"]["attributes"] == {"db.count": 2, "db.ms": 5.0, "stage": "a"}
+    assert spans["broken"]["status"] == "error"
+    assert spans["broken"]["error"] == "ValueError: bad input"
+
+
+def test_unfinished_spans_when_saved_mid_run():
+    with start_trace("job") as trace:
+        with span("write"):
+            pending = trace.to_compact()
+            closing = trace.to_compact(closing=True)
+
+    assert [values[4] for values in pending["spans"]] == ["unfinished", "unfinished"]
+    assert [values[4] for values in closing["spans"]] == ["ok", "ok"]
+
+
+def test_span_limit_and_noop_outside_trace(monkeypatch):
+    assert current_span() is tracing.NOOP_SPAN
+    with span("orphan") as orphan:
+        assert orphan is tracing.NOOP_SPAN
+
+    monkeypatch.setattr(tracing, "TRACE_MAX_SPANS", 3)
+    with start_trace("job") as trace:
+        for i in range(5):
+            with span(f"s{i}"):
+                pass
+
+    assert len(trace.spans) == 3
+    assert trace.to_compact()["dropped"] == 3
+
+
+def test_otlp_export(run, tmp_path, monkeypatch):
+    with start_trace("job", tier="A", use_cache=True) as trace:
+        with pytest.raises(RuntimeError):
+            with span("provider.gpt5", words=10):
+                raise RuntimeError("timeout")
+    compact = trace.to_compact()
+
+    otlp = to_otlp(compact)
+    spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+    assert [item["spanId"] for item in spans] == ["0000000000000001", "0000000000000002"]
+    assert "parentSpanId" not in spans[0]
+    assert spans[1]["parentSpanId"] == "0000000000000001"
+    assert {item["key"]: item["value"] for item in spans[0]["attributes"]} == {
+        "tier": {"stringValue": "A"},
+        "use_cache": {"boolValue": True},
+    }
+    assert spans[1]["status"] == {"code": 2, "message": "RuntimeError: timeout"}
+    assert int(spans[1]["endTimeUnixNano"]) >= int(spans[1]["startTimeUnixNano"])
+
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_EXPORT_FILE", str(path))
+    run(export_trace(compact))
+    run(export_trace(compact))
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0]) == otlp
@@ -0,0 +1,61 @@
+"""
+AI Writer 独立 Worker
+从数据库任务队列认领并执行文章生成，可与 API 进程分开部署
+
+默认部署由 API 进程执行任务（RUN_WORKERS=true），不需要本进程。
+分开部署时 API 设置 RUN_WORKERS=false，两边都需要 USE_REDIS=true，
+状态事件经 Redis 推送给 API 进程的 SSE/WebSocket 订阅者；未连上 Redis 时拒绝启动
+"""
+
+import sys
+import asyncio
+import signal
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+from core.storage import initialize_storage
+from core.http_client import init_http_clients, close_http_clients
+from core.events import event_bus
+from core.job_queue import WorkerPool
+from core.aiwriter import init_ai_writer, close_ai_writer
+from core.metrics import mark_process_dead
+from api.generate import process_article_generation
+
+
+async def main():
+    """启动 worker 池，收到 SIGINT/SIGTERM 后优雅退出"""
+    print("🚀 AI Writer Worker Starting...")
+
+    await event_bus.start()
+    if not event_bus.distributed:
+        # 进程内事件总线收不到订阅者，API 端的实时状态会断开
+        print("❌ 独立 worker 需要 Redis 事件总线（USE_REDIS=true 且 REDIS_URL 可连接）")
+        await event_bus.stop()
+        sys.exit(1)
+
+    await initialize_storage()
+    await init_http_clients()
+    init_ai_writer()
+
+    worker_pool = WorkerPool(process_article_generation)
+    await worker_pool.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await stop.wait()
+    print("👋 AI Writer Worker Shutting down...")
+
+    await worker_pool.stop()
+    await close_ai_writer()
+    await event_bus.stop()
+    await close_http_clients()
+    mark_process_dead()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
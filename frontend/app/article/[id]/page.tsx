@@ -23,8 +23,10 @@ interface Article {
   content?: {
     title: string
     markdown: string
-    html: string
-    images: string[]
+    images?: string[]
+    formats?: string[]
+    // 写作中的部分内容（SSE 推送或已落库的半成品）
+    partial?: boolean
   }
   error?: string
 }
@@ -51,6 +53,9 @@ export default function ArticleDetailPage() {
   const router = useRouter()
   const [article, setArticle] = useState<Article | null>(null)
   const [loading, setLoading] = useState(true)
+  // 每次重试后重新订阅状态
+  const [attempt, setAttempt] = useState(0)
+  const [retrying, setRetrying] = useState(false)
 
   useEffect(() => {
     if (!params.id) return
@@ -69,25 +74,76 @@ export default function ArticleDetailPage() {
 
     fetchArticle()
 
-    // 如果未完成，轮询状态
-    const interval = setInterval(async () => {
-      try {
-        const response = await articleApi.getDetail(params.id as string)
-        const data = response.data as Article
+    let interval: ReturnType<typeof setInterval> | undefined
+
+    // 轮询（不支持 SSE 时的降级方案）
+    const startPolling = () => {
+      interval = setInterval(async () => {
+        try {
+          const response = await articleApi.getDetail(params.id as string)
+          const data = response.data as Article
 
-        setArticle(data)
+          setArticle(data)
 
-        // 如果完成或失败，停止轮询
-        if (data.status === 'completed' || data.status === 'failed') {
-          clearInterval(interval)
+          // 如果完成或失败，停止轮询
+          if (data.status === 'completed' || data.status === 'failed') {
+            clearInterval(interval)
+          }
+        } catch (error) {
+          console.error('Poll error:', error)
         }
-      } catch (error) {
-        console.error('Poll error:', error)
+      }, 3000) // 每 3 秒轮询一次
+    }
+
+    if (typeof EventSource === 'undefined') {
+      startPolling()
+      return () => clearInterval(interval)
+    }
+
+    // 通过 SSE 接收状态推送
+    const source = new EventSource(articleApi.statusEventsUrl(params.id as string))
+    let finished = false
+
+    source.onmessage = (event) => {
+      const update = JSON.parse(event.data) as Partial<Article>
+
+      setArticle((prev) => (prev ? { ...prev, ...update } : prev))
+
+      // 完成或失败后关闭连接，并重新拉取完整内容
+      if (update.status === 'completed' || update.status === 'failed') {
+        finished = true
+        source.close()
+        fetchArticle()
       }
-    }, 3000) // 每 3 秒轮询一次
+    }
 
-    return () => clearInterval(interval)
-  }, [params.id])
+    source.onerror = () => {
+      // 服务端正常结束流时也会触发 onerror，已完成则不再降级
+      source.close()
+      if (!finished) {
+        startPolling()
+      }
+    }
+
+    return () => {
+      source.close()
+      clearInterval(interval)
+    }
+  }, [params.id, attempt])
+
+  const handleRetry = async () => {
+    setRetrying(true)
+    try {
+      await articleApi.retry(params.id as string)
+      setArticle((prev) => (prev ? { ...prev, status: 'pending', progress: 0, error: undefined } : prev))
+      setAttempt((n) => n + 1)
+      toast.success('已重新排队，将从中断处继续')
+    } catch (error: any) {
+      toast.error(error.response?.data?.detail || '重试失败，请稍后再试')
+    } finally {
+      setRetrying(false)
+    }
+  }
 
   if (loading) {
     return (
@@ -114,12 +170,21 @@ export default function ArticleDetailPage() {
             <div className="text-6xl mb-4">❌</div>
             <h2 className="text-2xl font-bold mb-4 text-red-400">生成失败</h2>
             <p className="text-gray-400 mb-6">{article.error || '未知错误'}</p>
-            <button
-              onClick={() => router.push('/generate')}
-              className="text-cyber-cyan hover:underline"
-            >
-              返回重新生成
-            </button>
+            <div className="flex justify-center gap-6">
+              <button
+                onClick={handleRetry}
+                disabled={retrying}
+                className="text-cyber-cyan hover:underline disabled:opacity-50"
+              >
+                {retrying ? '重试中...' : '从中断处重试'}
+              </button>
+              <button
+                onClick={() => router.push('/generate')}
+                className="text-gray-400 hover:underline"
+              >
+                返回重新生成
+              </button>
+            </div>
           </NeonCard>
         </div>
       </div>
@@ -257,6 +322,18 @@ export default function ArticleDetailPage() {
               })}
             </div>
 
+            {/* 写作中的部分内容 */}
+            {article.content?.markdown && (
+              <div className="mt-8 pt-8 border-t border-white/10">
+                <div className="text-gray-400 mb-4">已生成内容（实时更新）</div>
+                <div className="prose prose-invert max-w-none max-h-[32rem] overflow-y-auto">
+                  <ReactMarkdown remarkPlugins={[remarkGfm]}>
+                    {article.content.markdown}
+                  </ReactMarkdown>
+                </div>
+              </div>
+            )}
+
             {/* 提示 */}
             <div className="mt-8 p-4 rounded-lg bg-cyber-dark/50 border border-white/10">
               <div className="text-sm text-gray-400">
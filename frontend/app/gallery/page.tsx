@@ -16,10 +16,9 @@ interface Article {
   progress: number
   created_at: string
   completed_at?: string
-  content?: {
-    title: string
-    images?: string[]
-  }
+  title?: string
+  excerpt?: string
+  cover_image?: string
 }
 
 export default function GalleryPage() {
@@ -131,7 +130,7 @@ export default function GalleryPage() {
 
                     {/* 标题 */}
                     <h3 className="text-xl font-bold mb-3 line-clamp-2">
-                      {article.content?.title || article.topic}
+                      {article.title || article.topic}
                     </h3>
 
                     {/* 进度条（生成中） */}
@@ -1,6 +1,6 @@
 'use client'
 
-import { useState } from 'react'
+import { useRef, useState } from 'react'
 import { motion } from 'framer-motion'
 import { useRouter } from 'next/navigation'
 import { toast } from 'sonner'
@@ -28,6 +28,8 @@ export default function GeneratePage() {
   const [tier, setTier] = useState('B')
   const [formats, setFormats] = useState(['markdown', 'pdf'])
   const [loading, setLoading] = useState(false)
+  // 同一份请求内容重试时复用幂等键，服务端会返回同一个任务
+  const idempotency = useRef<{ body: string; key: string } | null>(null)
 
   const toggleFormat = (formatId: string) => {
     setFormats(prev =>
@@ -50,12 +52,14 @@ export default function GeneratePage() {
 
     setLoading(true)
 
+    const data = { topic: topic.trim(), tier, formats }
+    const body = JSON.stringify(data)
+    if (idempotency.current?.body !== body) {
+      idempotency.current = { body, key: crypto.randomUUID() }
+    }
+
     try {
-      const response = await articleApi.generate({
-        topic: topic.trim(),
-        tier,
-        formats
-      })
+      const response = await articleApi.generate(data, idempotency.current.key)
 
       const { article_id } = response.data
 
@@ -39,21 +39,31 @@ export const articleApi = {
     topic: string
     tier: string
     formats?: string[]
-  }) =>
-    api.post('/api/generate', data),
+  }, idempotencyKey?: string) =>
+    api.post('/api/generate', data, {
+      headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : undefined
+    }),
 
   // 查询状态
   getStatus: (articleId: string) =>
     api.get(`/api/status/${articleId}`),
 
+  // 状态推送（SSE）地址
+  statusEventsUrl: (articleId: string) =>
+    `${API_URL}/api/status/${articleId}/events`,
+
   // 获取文章列表
-  getList: (params?: { page?: number; limit?: number }) =>
+  getList: (params?: { page?: number; limit?: number; status?: string; cursor?: string }) =>
     api.get('/api/articles', { params }),
 
   // 获取文章详情
   getDetail: (articleId: string) =>
     api.get(`/api/articles/${articleId}`),
 
+  // 重试失败的文章（从最后完成的阶段继续）
+  retry: (articleId: string) =>
+    api.post(`/api/articles/${articleId}/retry`),
+
   // 获取下载链接
   download: (articleId: string, format: string) =>
     api.get(`/api/articles/${articleId}/download/${format}`, {